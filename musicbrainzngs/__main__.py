@@ -0,0 +1,5 @@
+import sys
+
+from musicbrainzngs import cli
+
+sys.exit(cli.main())
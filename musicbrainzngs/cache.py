@@ -0,0 +1,203 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""Caches for web service responses. See
+:func:`musicbrainzngs.set_cache`.
+"""
+
+import hashlib
+import math
+import struct
+import threading
+import time
+from collections import deque
+
+# Stored for keys that the server answered with a 404.
+_MISSING = object()
+
+
+class MemoryCache(object):
+    """A thread-safe in-memory cache of response bodies.
+
+    At most `max_entries` responses are kept; the least recently used
+    ones are dropped first. If `ttl` is given, entries expire that many
+    seconds after they were stored.
+
+    If `soft_ttl` is given, entries older than that are still returned
+    until `ttl` expires them, but they are stale: they are fetched again
+    in the background, when the rate limiter has requests to spare.
+
+    If `negative_ttl` is given, lookups the server answered with a 404
+    are remembered for that many seconds too, and asking for them again
+    raises :class:`musicbrainzngs.NotFoundError` without a request.
+
+    Any object with the same ``get(key)`` and ``set(key, value)``
+    methods can be used as a cache instead; ``stale(key)``,
+    ``set_missing(key)`` and ``missing(key)`` are optional.
+    """
+    def __init__(self, max_entries=1024, ttl=None, negative_ttl=None,
+                 soft_ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.soft_ttl = soft_ttl
+        self.negative_ttl = negative_ttl
+        # Key -> [time stored, value, use]. `_uses` holds (use, key)
+        # pairs from least to most recently used; pairs whose use is
+        # not the entry's latest are left behind and skipped.
+        self._entries = {}
+        self._uses = deque()
+        self._use = 0
+        self._lock = threading.Lock()
+
+    def _touch(self, key, entry):
+        """Mark `entry`, stored for `key`, as the most recently used."""
+        self._use += 1
+        entry[2] = self._use
+        self._uses.append((self._use, key))
+        if len(self._uses) > 2 * self.max_entries + 16:
+            self._uses = deque(sorted((e[2], k)
+                                      for k, e in self._entries.items()))
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            use, key = self._uses.popleft()
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == use:
+                del self._entries[key]
+
+    def _get(self, key, missing):
+        """Return the entry for `key` if it is a 404 (`missing` true) or
+        a response (`missing` false) and hasn't expired, else None. Only
+        expired entries of the kind asked for are dropped."""
+        ttl = self.negative_ttl if missing else self.ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is _MISSING) != missing:
+                return None
+            if ttl is not None and time.time() - entry[0] > ttl:
+                del self._entries[key]
+                return None
+            self._touch(key, entry)
+            return entry[1]
+
+    def get(self, key):
+        """Return the value stored for `key` or None."""
+        return self._get(key, False)
+
+    def set(self, key, value):
+        with self._lock:
+            entry = self._entries[key] = [time.time(), value, None]
+            self._touch(key, entry)
+            self._evict()
+
+    def stale(self, key):
+        """Whether the value stored for `key` is older than `soft_ttl`
+        seconds."""
+        if self.soft_ttl is None:
+            return False
+        with self._lock:
+            entry = self._entries.get(key)
+        return (entry is not None and entry[1] is not _MISSING and
+                time.time() - entry[0] > self.soft_ttl)
+
+    def missing(self, key):
+        """Whether `key` was stored with :meth:`set_missing` less than
+        `negative_ttl` seconds ago."""
+        if self.negative_ttl is None:
+            return False
+        return self._get(key, True) is _MISSING
+
+    def set_missing(self, key):
+        """Remember that the server has nothing for `key`."""
+        if self.negative_ttl is not None:
+            self.set(key, _MISSING)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._uses.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class BloomFilter(object):
+    """A compact, thread-safe set of strings that may answer that it
+    contains a string it doesn't (with probability about `error_rate`
+    once `capacity` strings were added), but never the other way round.
+
+    Pass one to :func:`musicbrainzngs.set_missing_filter` to remember
+    the IDs lookups didn't find across runs: about 29 bits per ID at
+    the default error rate, so a million IDs take 3.6 MB.
+    """
+    _MAGIC = b"MBBF"
+    _HEADER = struct.Struct("<4sIIQ")
+
+    def __init__(self, capacity=100000, error_rate=1e-6):
+        bits = int(math.ceil(-capacity * math.log(error_rate)
+                             / math.log(2) ** 2))
+        self._bits = (bits + 7) // 8 * 8
+        self._hashes = max(1, int(round(float(self._bits) / capacity
+                                        * math.log(2))))
+        self._array = bytearray(self._bits // 8)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        if not isinstance(key, bytes):
+            key = key.encode("utf-8")
+        # Double hashing: k positions from two independent 64-bit hashes.
+        first, second = struct.unpack("<QQ", hashlib.md5(key).digest())
+        second |= 1
+        return [(first + i * second) % self._bits
+                for i in range(self._hashes)]
+
+    def add(self, key):
+        """Add `key`, a string."""
+        positions = self._positions(key)
+        with self._lock:
+            new = False
+            for position in positions:
+                mask = 1 << (position & 7)
+                if not self._array[position >> 3] & mask:
+                    self._array[position >> 3] |= mask
+                    new = True
+            if new:
+                self._count += 1
+
+    def __contains__(self, key):
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def __len__(self):
+        """The number of strings added (not counting those that looked
+        like they had been added already)."""
+        return self._count
+
+    def save(self, path):
+        """Write the filter to the file `path`."""
+        with self._lock:
+            data = self._HEADER.pack(self._MAGIC, self._hashes, 0,
+                                     self._count) + bytes(self._array)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    @classmethod
+    def load(cls, path):
+        """Read a filter written by :meth:`save` from the file `path`."""
+        with open(path, "rb") as f:
+            data = f.read()
+        size = cls._HEADER.size
+        magic, hashes, _, count = cls._HEADER.unpack(data[:size])
+        if magic != cls._MAGIC or len(data) == size:
+            raise ValueError("%s is not a saved BloomFilter" % path)
+        bloom = cls.__new__(cls)
+        bloom._array = bytearray(data[size:])
+        bloom._bits = len(bloom._array) * 8
+        bloom._hashes = hashes
+        bloom._count = count
+        bloom._lock = threading.Lock()
+        return bloom
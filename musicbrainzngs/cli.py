@@ -0,0 +1,247 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""Command line interface, run as ``python -m musicbrainzngs``.
+
+``lookup`` reads MBIDs from stdin, one per line, and writes one JSON
+object per line to stdout as the lookups finish::
+
+    python -m musicbrainzngs lookup release --inc artists,labels \\
+        < ids.txt > releases.ndjson
+
+Each line is ``{"id": ..., "result": {...}}`` with the result as the
+``get_*_by_id`` function returns it, or ``{"id": ..., "error": "..."}``.
+Lines are in the order the lookups finish, not the order of the IDs.
+
+With ``--checkpoint FILE``, the IDs that were looked up are appended to
+FILE, and IDs already in it are skipped, so an interrupted run can be
+resumed with the same command.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from musicbrainzngs import musicbrainz
+from musicbrainzngs import compat
+from musicbrainzngs.cache import MemoryCache
+
+#: The lookup function for each entity type.
+LOOKUPS = {
+    "artist": "get_artist_by_id",
+    "label": "get_label_by_id",
+    "recording": "get_recording_by_id",
+    "release": "get_release_by_id",
+    "release-group": "get_release_group_by_id",
+    "work": "get_work_by_id",
+    "url": "get_url_by_id",
+}
+
+_DONE = object()
+_STOP = object()
+
+
+def _read_ids(lines, skip, skipped=None):
+    """Yield the IDs in `lines` that aren't in `skip`, each once. The
+    function `skipped` is called for each ID that is left out because
+    it is in `skip`.
+    """
+    seen = set()
+    for line in lines:
+        id = line.strip()
+        if not id or id.startswith("#") or id in seen:
+            continue
+        seen.add(id)
+        if id in skip:
+            if skipped is not None:
+                skipped()
+        else:
+            yield id
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return set(line.strip() for line in f if line.strip())
+    except IOError:
+        return set()
+
+
+class _Progress(object):
+    """Counts the finished lookups and reports them on `out`."""
+    def __init__(self, out, interval):
+        self.out = out
+        self.interval = interval
+        self.done = self.errors = self.skipped = 0
+        self.start = self.last_report = time.time()
+
+    def skip(self):
+        self.skipped += 1
+
+    def add(self, error):
+        self.done += 1
+        if error:
+            self.errors += 1
+        now = time.time()
+        if self.interval and now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report("progress")
+
+    def report(self, label):
+        elapsed = time.time() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        print("%s: %d looked up (%d errors), %d skipped, %.1f s, %.2f/s"
+              % (label, self.done, self.errors, self.skipped, elapsed, rate),
+              file=self.out)
+        self.out.flush()
+
+
+def lookup(client, entity, ids, includes, out, checkpoint=None,
+           concurrency=1, progress=None):
+    """Look up every ID of the iterable `ids` with `client` and write
+    the results to `out` as JSON lines. The IDs are read as they are
+    needed, so `ids` can be a stream. If this is interrupted, nothing
+    more is written to `out` or `checkpoint` once it has returned.
+    """
+    fetch = getattr(client, LOOKUPS[entity])
+    tasks = compat.queue.Queue(maxsize=concurrency * 2)
+    results = compat.queue.Queue()
+
+    def work():
+        while True:
+            id = tasks.get()
+            if id is _DONE:
+                results.put(_DONE)
+                return
+            try:
+                results.put((id, fetch(id, includes)[entity], None))
+            except Exception as exc:
+                results.put((id, None, exc))
+
+    def write():
+        finished = 0
+        while finished < concurrency:
+            item = results.get()
+            if item is _STOP:
+                return
+            if item is _DONE:
+                finished += 1
+                continue
+            id, result, error = item
+            if error is None:
+                line = {"id": id, "result": result}
+            else:
+                line = {"id": id, "error": str(error)}
+            out.write(json.dumps(line, sort_keys=True) + "\n")
+            out.flush()
+            # Only successful lookups are done; errors are retried when
+            # the run is resumed.
+            if checkpoint is not None and error is None:
+                checkpoint.write(id + "\n")
+                checkpoint.flush()
+            if progress is not None:
+                progress.add(error is not None)
+
+    workers = [threading.Thread(target=work) for _ in range(concurrency)]
+    writer = threading.Thread(target=write)
+    for thread in workers + [writer]:
+        thread.daemon = True
+        thread.start()
+    try:
+        for id in ids:
+            tasks.put(id)
+        for _ in workers:
+            tasks.put(_DONE)
+        writer.join()
+    except:
+        # Let the writer finish the line it is writing and stop; the
+        # lookups still running are dropped.
+        results.put(_STOP)
+        writer.join()
+        raise
+
+def _rate(value):
+    """Parse a rate limit, "REQUESTS/SECONDS" or "REQUESTS"."""
+    requests, _, interval = value.partition("/")
+    return float(interval or 1.0), int(requests)
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+
+    parser = argparse.ArgumentParser(prog="python -m musicbrainzngs",
+                                     description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    lookup_parser = commands.add_parser(
+            "lookup", help="look up the MBIDs read from stdin")
+    lookup_parser.add_argument("entity", choices=sorted(LOOKUPS))
+    lookup_parser.add_argument("--inc", default="",
+                               help="comma separated includes")
+    lookup_parser.add_argument("--hostname", default="musicbrainz.org")
+    lookup_parser.add_argument("--useragent", metavar="APP/VERSION",
+                               default="python-musicbrainzngs-cli/" +
+                               musicbrainz._version)
+    lookup_parser.add_argument("--rate-limit", type=_rate, default="1/1",
+                               metavar="REQUESTS/SECONDS",
+                               help="the default is 1/1, one per second")
+    lookup_parser.add_argument("--no-rate-limit", action="store_true",
+                               help="for your own mirror")
+    lookup_parser.add_argument("--concurrency", type=int, default=1,
+                               help="lookups made at the same time")
+    lookup_parser.add_argument("--cache", type=int, default=1024,
+                               metavar="ENTRIES",
+                               help="responses to cache, 0 to disable")
+    lookup_parser.add_argument("--checkpoint", metavar="FILE",
+                               help="record finished IDs in FILE and skip "
+                               "those already in it")
+    lookup_parser.add_argument("--progress", type=float, default=10.0,
+                               metavar="SECONDS",
+                               help="report progress this often, 0 for "
+                               "only a summary")
+    args = parser.parse_args(argv)
+    if args.command != "lookup":
+        parser.print_usage(stderr)
+        return 2
+
+    includes = [inc for inc in args.inc.split(",") if inc]
+    try:
+        musicbrainz._check_includes(args.entity, includes)
+    except musicbrainz.UsageError as exc:
+        parser.error(str(exc))
+
+    client = musicbrainz.MusicBrainzClient(
+            args.hostname, pool_size=max(args.concurrency,
+                                         musicbrainz.POOL_SIZE))
+    app, _, version = args.useragent.partition("/")
+    client.set_useragent(app, version or "0")
+    if args.no_rate_limit:
+        client.set_rate_limit(False)
+    else:
+        client.set_rate_limit(*args.rate_limit)
+    if args.cache:
+        client.set_cache(MemoryCache(max_entries=args.cache))
+
+    done = set()
+    checkpoint = None
+    if args.checkpoint:
+        done = _read_checkpoint(args.checkpoint)
+        checkpoint = open(args.checkpoint, "a")
+    progress = _Progress(stderr, args.progress)
+    ids = _read_ids(stdin, done, progress.skip)
+    try:
+        lookup(client, args.entity, ids, includes, stdout, checkpoint,
+               max(1, args.concurrency), progress)
+    except KeyboardInterrupt:
+        progress.report("interrupted")
+        return 130
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    progress.report("done")
+    return 1 if progress.errors else 0
@@ -39,12 +39,16 @@ is_py3 = (_ver[0] == 3)
 
 if is_py2:
 	from StringIO import StringIO
+	from urllib import quote_plus
+	import Queue as queue
 
 	bytes = str
 	unicode = unicode
 	basestring = basestring
 elif is_py3:
 	from io import StringIO
+	from urllib.parse import quote_plus
+	import queue
 
 	unicode = str
 	bytes = bytes
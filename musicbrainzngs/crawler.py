@@ -0,0 +1,84 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""Fetch a graph of related entities, each only once::
+
+    from musicbrainzngs import crawler
+    follow = {"release": ["release-groups", "recordings"],
+              "recording": ["work-rels"],
+              "work": ["artist-rels"]}
+    for entity, id, data in crawler.crawl([("release", mbid)], follow, 3):
+        ...
+"""
+
+from musicbrainzngs import musicbrainz
+
+#: The entity types the crawler recognizes inside responses.
+ENTITY_TYPES = ("artist", "label", "recording", "release", "release-group",
+                "work", "url")
+
+
+def embedded_entities(data):
+    """Yield an (entity, id, data) triple for every entity nested
+    anywhere inside the parsed response `data`: entity lists, relation
+    targets, artist credits, tracks' recordings and so on.
+    """
+    if isinstance(data, list):
+        for item in data:
+            for found in embedded_entities(item):
+                yield found
+        return
+    if not isinstance(data, dict):
+        return
+    for key, value in data.items():
+        if key in ENTITY_TYPES and isinstance(value, dict) and "id" in value:
+            yield key, value["id"], value
+        elif (key.endswith("-list") and key[:-len("-list")] in ENTITY_TYPES
+              and isinstance(value, list)):
+            entity = key[:-len("-list")]
+            for item in value:
+                if isinstance(item, dict) and "id" in item:
+                    yield entity, item["id"], item
+        for found in embedded_entities(value):
+            yield found
+
+def crawl(seeds, follow, depth=1):
+    """Fetch the entities reachable from `seeds` and yield each of them
+    once as an (entity, id, data) triple, as soon as it is known.
+
+    `seeds` is an iterable of (entity, id) pairs. `follow` maps entity
+    types to the includes to request for them; the entities embedded in
+    the response (through those includes) are the next step of the
+    crawl. `depth` is the number of steps to go from the seeds.
+
+    An entity is only fetched if its edges are to be followed (its type
+    is in `follow` and the depth isn't reached yet) or if it is a seed.
+    All others are yielded with the data already embedded in the
+    response they were found in, without another request.
+    """
+    seen = set()
+    queue = []
+    for entity, id in seeds:
+        if (entity, id) not in seen:
+            seen.add((entity, id))
+            queue.append((entity, id, 0))
+
+    while queue:
+        level_queue, queue = queue, []
+        for entity, id, level in level_queue:
+            includes = follow.get(entity, []) if level < depth else []
+            data = musicbrainz._do_mb_query(entity, id, includes)[entity]
+            yield entity, id, data
+            if not includes:
+                continue
+
+            for child, child_id, child_data in embedded_entities(data):
+                if (child, child_id) in seen:
+                    continue
+                seen.add((child, child_id))
+                if level + 1 < depth and follow.get(child):
+                    queue.append((child, child_id, level + 1))
+                else:
+                    yield child, child_id, child_data
@@ -0,0 +1,257 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""Answer lookups from local dump files instead of the web service::
+
+    from musicbrainzngs import dump
+    store = dump.DumpStore("/data/mbdump", includes=["recordings"])
+    musicbrainzngs.set_local_store(store)
+    # No request if it is dumped.
+    musicbrainzngs.get_release_by_id(mbid, includes=["recordings"])
+
+A dump is a directory of files (or a single file) with one entity per
+line, as the web service would return it: either a whole ``<metadata>``
+document or just the entity element. The first time a dump is opened,
+an index of the MBIDs in it is written next to it, so that looking up
+an entity is a binary search in the index and a read of a single line.
+Both the index and the dump files are read through :mod:`mmap`.
+
+Compressed archives have to be extracted first, as they can't be mapped.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+
+from musicbrainzngs import mbxml
+
+#: The entity types that can be stored in a dump.
+ENTITY_TYPES = ("artist", "label", "recording", "release", "release-group",
+                "work", "url")
+
+#: The name of the index written into a dump directory. For a single
+#: dump file, the index is that file's name with this suffix.
+INDEX_NAME = ".mbid-index"
+
+_MAGIC = b"MBNGSIDX"
+_VERSION = 1
+_HEADER = struct.Struct("<8sII")
+# MBID, entity type, file number, offset and length of the line.
+_RECORD = struct.Struct("<16sBHQI")
+
+_ID_RE = re.compile(b'<(release-group|artist|label|recording|release|work|url)'
+                    b'[\\s][^>]*?\\bid="([0-9a-fA-F-]{36})"')
+_NS = b'<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+
+
+class InvalidIndexError(Exception):
+    """The index of a dump is unreadable."""
+
+
+def _entity_code(entity):
+    return ENTITY_TYPES.index(entity)
+
+def build_index(files, index_path):
+    """Index the entities in `files` (a list of paths) and write the
+    index to `index_path`. Lines without a MusicBrainz entity are
+    skipped.
+    """
+    records = []
+    stats = []
+    for number, name in enumerate(files):
+        st = os.stat(name)
+        stats.append([os.path.basename(name), st.st_size, int(st.st_mtime)])
+        if not st.st_size:
+            continue
+        with open(name, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offset = 0
+                while offset < st.st_size:
+                    end = data.find(b"\n", offset)
+                    if end == -1:
+                        end = st.st_size
+                    match = _ID_RE.search(data[offset:end])
+                    if match is not None:
+                        entity = match.group(1).decode("ascii")
+                        mbid = uuid.UUID(match.group(2).decode("ascii"))
+                        records.append((mbid.bytes, _entity_code(entity),
+                                        number, offset, end - offset))
+                    offset = end + 1
+            finally:
+                data.close()
+    records.sort()
+
+    header = json.dumps({"files": stats}).encode("utf-8")
+    tmp = index_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(header)))
+        f.write(header)
+        for record in records:
+            f.write(_RECORD.pack(*record))
+    if os.name == "nt" and os.path.exists(index_path):
+        # Windows can't rename over an existing file.
+        os.remove(index_path)
+    os.rename(tmp, index_path)
+
+
+class DumpStore(object):
+    """Entities read from the dump at `path`, a directory or a file.
+
+    The index is built if it is missing or the dump files changed.
+    `index_path` overrides where it is kept.
+
+    `includes` lists the includes the dumped entities were fetched with.
+    Lookups asking for any other include are left to the web service.
+
+    Use it with :func:`musicbrainzngs.set_local_store`.
+    """
+    def __init__(self, path, index_path=None, includes=()):
+        if os.path.isdir(path):
+            self.files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if not name.startswith(INDEX_NAME)
+                and os.path.isfile(os.path.join(path, name)))
+            default_index = os.path.join(path, INDEX_NAME)
+        else:
+            self.files = [path]
+            default_index = path + INDEX_NAME
+        self.index_path = index_path or default_index
+        self.includes = frozenset(includes)
+        self._maps = {}
+        self._lock = threading.Lock()
+
+        if not self._index_is_current():
+            build_index(self.files, self.index_path)
+        self._open_index()
+
+    def _read_header(self, f):
+        magic, version, length = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise InvalidIndexError("%s is not an index" % self.index_path)
+        return json.loads(f.read(length).decode("utf-8")), \
+                _HEADER.size + length
+
+    def _index_is_current(self):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, "rb") as f:
+                header, _ = self._read_header(f)
+        except (InvalidIndexError, ValueError, struct.error):
+            return False
+        current = []
+        for name in self.files:
+            st = os.stat(name)
+            current.append([os.path.basename(name), st.st_size,
+                            int(st.st_mtime)])
+        return header["files"] == current
+
+    def _open_index(self):
+        self._index_file = open(self.index_path, "rb")
+        header, self._start = self._read_header(self._index_file)
+        size = os.fstat(self._index_file.fileno()).st_size
+        self._count = (size - self._start) // _RECORD.size
+        if self._count:
+            self._index = mmap.mmap(self._index_file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        else:
+            self._index = None
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, i):
+        pos = self._start + i * _RECORD.size
+        return _RECORD.unpack(self._index[pos:pos + _RECORD.size])
+
+    def _find(self, entity, id):
+        try:
+            key = uuid.UUID(id).bytes
+        except ValueError:
+            return None
+        code = _entity_code(entity)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[:2] < (key, code):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            record = self._record(lo)
+            if record[:2] == (key, code):
+                return record
+        return None
+
+    def _map(self, number):
+        data = self._maps.get(number)
+        if data is None:
+            with self._lock:
+                data = self._maps.get(number)
+                if data is None:
+                    with open(self.files[number], "rb") as f:
+                        data = mmap.mmap(f.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+                    self._maps[number] = data
+        return data
+
+    def get(self, entity, id):
+        """Return the document of the `entity` with MBID `id` as bytes,
+        wrapped in ``<metadata>``, or None if it isn't in the dump."""
+        if entity not in ENTITY_TYPES or not self._count:
+            return None
+        record = self._find(entity, id)
+        if record is None:
+            return None
+        return self._document(record)
+
+    def _document(self, record):
+        _, _, number, offset, length = record
+        line = self._map(number)[offset:offset + length].strip()
+        if line.startswith(b"<?xml") or line.startswith(b"<metadata"):
+            return line
+        return _NS + line + b"</metadata>"
+
+    def documents(self):
+        """Yield an (entity, id, document) triple for every entity in
+        the dump, with the document as :meth:`get` returns it."""
+        for i in range(self._count):
+            record = self._record(i)
+            yield (ENTITY_TYPES[record[1]], str(uuid.UUID(bytes=record[0])),
+                   self._document(record))
+
+    def lookup(self, entity, id, includes=[]):
+        """Return the parsed `entity` with MBID `id` like the
+        ``get_*_by_id`` functions do, or None if it isn't in the dump
+        or the dump doesn't cover all of `includes`.
+        """
+        if not self.includes.issuperset(includes):
+            return None
+        document = self.get(entity, id)
+        if document is None:
+            return None
+        return mbxml.parse_message(document)
+
+    def close(self):
+        with self._lock:
+            for data in self._maps.values():
+                data.close()
+            self._maps.clear()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        self._count = 0
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
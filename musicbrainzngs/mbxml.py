@@ -5,8 +5,11 @@
 
 import xml.etree.ElementTree as ET
 import logging
+import threading
+import time
 
 from musicbrainzngs import util
+from musicbrainzngs import compat
 
 try:
 	from ET import fixtag
@@ -101,7 +104,8 @@ def parse_inner(inner_els, element):
 	    return a dict {'subelement': <result>}
 	    if parse_subelement returns a tuple of the form
 	    ('subelement-key', <result>) then return a dict
-	    {'subelement-key': <result>} instead
+	    {'subelement-key': <result>} instead.
+	    For a <foo-list count="n"> subelement, 'foo-count': n is added.
 	"""
 	result = {}
 	for sub in element:
@@ -114,6 +118,10 @@ def parse_inner(inner_els, element):
 				result[inner_result[0]] = inner_result[1]
 			else:
 				result[t] = inner_result
+				# Lists may be one page of many, so keep the total.
+				count = sub.get("count")
+				if t.endswith("-list") and count is not None:
+					result[t[:-5] + "-count"] = int(count)
 		else:
 			_log.debug("in <%s>, not delegating <%s>", fixtag(element.tag, NS_MAP)[0], t)
 	return result
@@ -533,100 +541,290 @@ def parse_alias(alias):
 
     return result
 
+# Profiling of the parsers.
+#
+# The parsers find each other through the module namespace (the
+# inner_els dicts are built on every call), so profiling is done by
+# replacing the parse_* functions with timing wrappers while it is
+# enabled. Nothing is wrapped when it is off.
+
+_HELPERS = ("parse_elements", "parse_attributes", "parse_inner")
+_originals = {}
+_stats = {}
+_tags = {}
+_stats_lock = threading.Lock()
+_local = threading.local()
+
+try:
+    _timer = time.perf_counter
+except AttributeError:
+    # Python < 3.3
+    _timer = time.time
+
+def _profiled(name, func):
+    count_tag = name not in _HELPERS and name != "parse_message"
+    def wrapper(*args):
+        active = getattr(_local, "active", None)
+        if active is None:
+            active = _local.active = {}
+            _local.children = []
+        outermost = not active.get(name)
+        active[name] = active.get(name, 0) + 1
+        _local.children.append(0.0)
+        start = _timer()
+        try:
+            return func(*args)
+        finally:
+            elapsed = _timer() - start
+            own = elapsed - _local.children.pop()
+            if _local.children:
+                _local.children[-1] += elapsed
+            active[name] -= 1
+            tag = None
+            if count_tag and args and hasattr(args[-1], "tag"):
+                tag = args[-1].tag.split("}", 1)[-1]
+            with _stats_lock:
+                stat = _stats.setdefault(name, [0, 0.0, 0.0])
+                stat[0] += 1
+                if outermost:
+                    # Recursive calls are already inside this time.
+                    stat[1] += elapsed
+                stat[2] += own
+                if tag is not None:
+                    _tags[tag] = _tags.get(tag, 0) + 1
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+def enable_profiling():
+    """Start counting calls and time spent in each parse_* function and
+    the elements they handle. See :func:`get_profile`.
+    """
+    if _originals:
+        return
+    module = globals()
+    for name, func in list(module.items()):
+        if name.startswith("parse_") and callable(func):
+            _originals[name] = func
+            module[name] = _profiled(name, func)
+
+def disable_profiling():
+    """Stop profiling. The statistics collected so far are kept."""
+    globals().update(_originals)
+    _originals.clear()
+
+def reset_profile():
+    with _stats_lock:
+        _stats.clear()
+        _tags.clear()
+
+def get_profile():
+    """Return the profile collected so far as a dict with a 'parsers'
+    key mapping every parser that was called to a dict of 'calls',
+    'cumtime' (seconds including the parsers it called) and 'selftime'
+    (seconds in the parser itself), and an 'elements' key mapping
+    element names to the number of times they were parsed.
+    """
+    with _stats_lock:
+        parsers = dict((name, {"calls": calls, "cumtime": cum,
+                               "selftime": own})
+                       for name, (calls, cum, own) in _stats.items())
+        return {"parsers": parsers, "elements": dict(_tags)}
+
+def format_profile(sort="selftime"):
+    """Return the profile as a table sorted by `sort` ('calls',
+    'cumtime' or 'selftime'), largest first.
+    """
+    parsers = get_profile()["parsers"]
+    lines = ["%-32s %10s %12s %12s" % ("parser", "calls", "cumtime",
+                                       "selftime")]
+    for name in sorted(parsers, key=lambda n: parsers[n][sort],
+                       reverse=True):
+        p = parsers[name]
+        lines.append("%-32s %10d %12.6f %12.6f" % (name, p["calls"],
+                     p["cumtime"], p["selftime"]))
+    return "\n".join(lines)
+
 ###
-def make_barcode_request(release2barcode):
-    NS = "http://musicbrainz.org/ns/mmd-2.0#"
-    root = ET.Element("{%s}metadata" % NS)
-    rel_list = ET.SubElement(root, "{%s}release-list" % NS)
-    for release, barcode in release2barcode.items():
-        rel_xml = ET.SubElement(rel_list, "{%s}release" % NS)
-        bar_xml = ET.SubElement(rel_xml, "{%s}barcode" % NS)
-        rel_xml.set("{%s}id" % NS, release)
-        bar_xml.text = barcode
-
-    return ET.tostring(root, "utf-8")
-
-def make_puid_request(recording2puids):
-    NS = "http://musicbrainz.org/ns/mmd-2.0#"
-    root = ET.Element("{%s}metadata" % NS)
-    rec_list = ET.SubElement(root, "{%s}recording-list" % NS)
-    for recording, puid_list in recording2puids.items():
-        rec_xml = ET.SubElement(rec_list, "{%s}recording" % NS)
-        rec_xml.set("id", recording)
-        puid_list_xml = ET.SubElement(rec_xml, "{%s}puid-list" % NS)
-        for puid in puid_list:
-            puid_xml = ET.SubElement(puid_list_xml, "{%s}puid" % NS)
-            puid_xml.set("id", puid)
-
-    return ET.tostring(root, "utf-8")
-
-def make_echoprint_request(recording2echoprints):
-    NS = "http://musicbrainz.org/ns/mmd-2.0#"
-    root = ET.Element("{%s}metadata" % NS)
-    rec_list = ET.SubElement(root, "{%s}recording-list" % NS)
-    for recording, echoprint_list in recording2echoprints.items():
-        rec_xml = ET.SubElement(rec_list, "{%s}recording" % NS)
-        rec_xml.set("id", recording)
-        echoprint_list_xml = ET.SubElement(rec_xml, "{%s}echoprint-list" % NS)
-        for echoprint in echoprint_list:
-            echo_xml = ET.SubElement(echoprint_list_xml, "{%s}echoprint" % NS)
-            echo_xml.set("id", echoprint)
-
-    return ET.tostring(root, "utf-8")
-
-def make_tag_request(artist2tags, recording2tags):
-    NS = "http://musicbrainz.org/ns/mmd-2.0#"
-    root = ET.Element("{%s}metadata" % NS)
-    rec_list = ET.SubElement(root, "{%s}recording-list" % NS)
-    for rec, tags in recording2tags.items():
-        rec_xml = ET.SubElement(rec_list, "{%s}recording" % NS)
-        rec_xml.set("{%s}id" % NS, rec)
-        taglist = ET.SubElement(rec_xml, "{%s}user-tag-list" % NS)
-        for tag in tags:
-            usertag_xml = ET.SubElement(taglist, "{%s}user-tag" % NS)
-            name_xml = ET.SubElement(usertag_xml, "{%s}name" % NS)
-            name_xml.text = tag
-    art_list = ET.SubElement(root, "{%s}artist-list" % NS)
-    for art, tags in artist2tags.items():
-        art_xml = ET.SubElement(art_list, "{%s}artist" % NS)
-        art_xml.set("{%s}id" % NS, art)
-        taglist = ET.SubElement(art_xml, "{%s}user-tag-list" % NS)
-        for tag in tags:
-            usertag_xml = ET.SubElement(taglist, "{%s}user-tag" % NS)
-            name_xml = ET.SubElement(usertag_xml, "{%s}name" % NS)
-            name_xml.text = tag
-
-    return ET.tostring(root, "utf-8")
-
-def make_rating_request(artist2rating, recording2rating):
-    NS = "http://musicbrainz.org/ns/mmd-2.0#"
-    root = ET.Element("{%s}metadata" % NS)
-    rec_list = ET.SubElement(root, "{%s}recording-list" % NS)
-    for rec, rating in recording2rating.items():
-        rec_xml = ET.SubElement(rec_list, "{%s}recording" % NS)
-        rec_xml.set("{%s}id" % NS, rec)
-        rating_xml = ET.SubElement(rec_xml, "{%s}user-rating" % NS)
-        rating_xml.text = str(rating)
-    art_list = ET.SubElement(root, "{%s}artist-list" % NS)
-    for art, rating in artist2rating.items():
-        art_xml = ET.SubElement(art_list, "{%s}artist" % NS)
-        art_xml.set("{%s}id" % NS, art)
-        rating_xml = ET.SubElement(art_xml, "{%s}user-rating" % NS)
-        rating_xml.text = str(rating)
-
-    return ET.tostring(root, "utf-8")
-
-def make_isrc_request(recording2isrcs):
-    NS = "http://musicbrainz.org/ns/mmd-2.0#"
-    root = ET.Element("{%s}metadata" % NS)
-    rec_list = ET.SubElement(root, "{%s}recording-list" % NS)
-    for rec, isrcs in recording2isrcs.items():
-        if len(isrcs) > 0:
-            rec_xml = ET.SubElement(rec_list, "{%s}recording" % NS)
-            rec_xml.set("{%s}id" % NS, rec)
-            isrc_list_xml = ET.SubElement(rec_xml, "{%s}isrc-list" % NS)
-            isrc_list_xml.set("{%s}count" % NS, str(len(isrcs)))
-            for isrc in isrcs:
-                isrc_xml = ET.SubElement(isrc_list_xml, "{%s}isrc" % NS)
-                isrc_xml.set("{%s}id" % NS, isrc)
-    return ET.tostring(root, "utf-8")
+# Submission bodies are written out as they are built, without a tree.
+# The output is the same as ElementTree.tostring(root, "utf-8") gives.
+
+_NS_URI = "http://musicbrainz.org/ns/mmd-2.0#"
+_ESCAPES = [("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")]
+_ATTRIB_ESCAPES = _ESCAPES + [('"', "&quot;"), ("\r", "&#13;"),
+                              ("\n", "&#10;"), ("\t", "&#09;")]
+
+#: The writers pass their output on in chunks of about this many bytes.
+CHUNK_SIZE = 64 * 1024
+
+def _escape(value, escapes):
+    if isinstance(value, compat.bytes) and \
+            not isinstance(value, compat.unicode):
+        value = value.decode("utf-8")
+    else:
+        value = compat.unicode(value)
+    for char, entity in escapes:
+        if char in value:
+            value = value.replace(char, entity)
+    return value
+
+class _XmlWriter(object):
+    """Writes a document in the mmd-2.0 namespace by calling `write` with
+    chunks of UTF-8 bytes. Elements are started and ended in order;
+    an element without content is closed as ``<ns0:tag />``.
+    """
+    def __init__(self, write, chunk_size=CHUNK_SIZE):
+        self._write = write
+        self._chunk_size = chunk_size
+        self._parts = []
+        self._size = 0
+        # A start tag still waiting for its ">" or " />".
+        self._open = False
+
+    def _add(self, text):
+        if self._open:
+            self._parts.append(">")
+            self._open = False
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._chunk_size:
+            self.flush()
+
+    def start(self, tag, attrs=(), root=False):
+        """Start the element `tag` with the (name, value, namespaced)
+        triples of `attrs`."""
+        text = "<ns0:" + tag
+        if root:
+            text += ' xmlns:ns0="%s"' % _NS_URI
+        for name, value, namespaced in attrs:
+            text += ' %s%s="%s"' % ("ns0:" if namespaced else "", name,
+                                    _escape(value, _ATTRIB_ESCAPES))
+        self._add(text)
+        self._open = True
+
+    def end(self, tag):
+        if self._open:
+            self._parts.append(" />")
+            self._open = False
+        else:
+            self._add("</ns0:%s>" % tag)
+
+    def element(self, tag, text=None, attrs=()):
+        """Write a whole element with `text` as its content. Without
+        text, it is closed with " />" as ElementTree does."""
+        self.start(tag, attrs)
+        if text:
+            self._add(_escape(text, _ESCAPES))
+        self.end(tag)
+
+    def flush(self):
+        if self._open:
+            # Can't know yet how the start tag is closed.
+            pending = self._parts.pop()
+        else:
+            pending = None
+        if self._parts:
+            self._write("".join(self._parts).encode("utf-8"))
+        self._parts = [] if pending is None else [pending]
+        self._size = 0
+
+    def close(self):
+        self.flush()
+
+def _build(write_document, args, out):
+    """Run `write_document` with a writer for `out` (a binary file) and
+    return None, or return the document as bytes if `out` is None."""
+    if out is not None:
+        writer = _XmlWriter(out.write)
+        write_document(writer, *args)
+        writer.close()
+        return None
+    chunks = []
+    writer = _XmlWriter(chunks.append)
+    write_document(writer, *args)
+    writer.close()
+    return b"".join(chunks)
+
+def _write_entity_lists(writer, lists, write_entity):
+    """Write a metadata document with a "<entity>-list" for each
+    (entity, mapping) pair in `lists`; `write_entity(writer, entity, id,
+    value)` writes each entry."""
+    writer.start("metadata", root=True)
+    for entity, mapping in lists:
+        writer.start(entity + "-list")
+        for id, value in mapping.items():
+            write_entity(writer, entity, id, value)
+        writer.end(entity + "-list")
+    writer.end("metadata")
+
+def _write_barcode(writer, entity, release, barcode):
+    writer.start("release", [("id", release, True)])
+    writer.element("barcode", barcode)
+    writer.end("release")
+
+def _id_list_writer(name):
+    def write(writer, entity, recording, ids):
+        writer.start("recording", [("id", recording, False)])
+        writer.start(name + "-list")
+        for id in ids:
+            writer.element(name, attrs=[("id", id, False)])
+        writer.end(name + "-list")
+        writer.end("recording")
+    return write
+
+_write_puids = _id_list_writer("puid")
+_write_echoprints = _id_list_writer("echoprint")
+
+def _write_tags(writer, entity, id, tags):
+    writer.start(entity, [("id", id, True)])
+    writer.start("user-tag-list")
+    for tag in tags:
+        writer.start("user-tag")
+        writer.element("name", tag)
+        writer.end("user-tag")
+    writer.end("user-tag-list")
+    writer.end(entity)
+
+def _write_rating(writer, entity, id, rating):
+    writer.start(entity, [("id", id, True)])
+    writer.element("user-rating", str(rating))
+    writer.end(entity)
+
+def _write_isrcs(writer, entity, recording, isrcs):
+    if len(isrcs) > 0:
+        writer.start("recording", [("id", recording, True)])
+        writer.start("isrc-list", [("count", str(len(isrcs)), True)])
+        for isrc in isrcs:
+            writer.element("isrc", attrs=[("id", isrc, True)])
+        writer.end("isrc-list")
+        writer.end("recording")
+
+# The make_*_request functions return the request body as bytes, or
+# write it to the binary file `out` if one is given.
+
+def make_barcode_request(release2barcode, out=None):
+    return _build(_write_entity_lists,
+                  ([("release", release2barcode)], _write_barcode), out)
+
+def make_puid_request(recording2puids, out=None):
+    return _build(_write_entity_lists,
+                  ([("recording", recording2puids)], _write_puids), out)
+
+def make_echoprint_request(recording2echoprints, out=None):
+    return _build(_write_entity_lists,
+                  ([("recording", recording2echoprints)], _write_echoprints),
+                  out)
+
+def make_tag_request(artist2tags, recording2tags, out=None):
+    return _build(_write_entity_lists,
+                  ([("recording", recording2tags), ("artist", artist2tags)],
+                   _write_tags), out)
+
+def make_rating_request(artist2rating, recording2rating, out=None):
+    return _build(_write_entity_lists,
+                  ([("recording", recording2rating),
+                    ("artist", artist2rating)], _write_rating), out)
+
+def make_isrc_request(recording2isrcs, out=None):
+    return _build(_write_entity_lists,
+                  ([("recording", recording2isrcs)], _write_isrcs), out)
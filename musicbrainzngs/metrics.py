@@ -0,0 +1,287 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""Process-wide metrics for the web service requests made by the
+library. Collection is disabled by default::
+
+    from musicbrainzngs import metrics
+    metrics.enable()
+    ...
+    print(metrics.registry.render_prometheus())
+
+The metrics are fed by a request listener (see
+:func:`musicbrainzngs.add_request_listener`) that is called for the
+requests of every :class:`musicbrainzngs.MusicBrainzClient`, so nothing
+is measured while they are disabled.
+"""
+
+import threading
+
+from musicbrainzngs import musicbrainz
+
+DEFAULT_TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                        1.0, 2.5, 5.0, 10.0)
+DEFAULT_BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576,
+                        4194304, 16777216)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\")
+                             .replace('"', '\\"').replace("\n", "\\n"))
+                             for k, v in pairs)
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(object):
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(l, "") for l in self.labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """A value that only goes up, for example the number of requests."""
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for key, value in sorted(self.snapshot().items()):
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. If `callback` is given, it is
+    called (without arguments) to read the current value instead.
+    """
+    type = "gauge"
+
+    def __init__(self, name, help, labels=(), callback=None):
+        super(Gauge, self).__init__(name, help, labels)
+        self.callback = callback
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def snapshot(self):
+        if self.callback is not None:
+            return {(): self.callback()}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for key, value in sorted(self.snapshot().items()):
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Histogram(_Metric):
+    """Counts observed values in cumulative buckets."""
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_TIME_BUCKETS):
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        """Return {labels: {'buckets': {bound: cumulative count}, 'sum':
+        total, 'count': observations}}."""
+        result = {}
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative, running = {}, 0
+                for bound, n in zip(self.buckets, counts):
+                    running += n
+                    cumulative[bound] = running
+                result[key] = {"buckets": cumulative, "sum": total,
+                               "count": count}
+        return result
+
+    def samples(self):
+        for key, value in sorted(self.snapshot().items()):
+            for bound in self.buckets:
+                yield (self.name + "_bucket",
+                       _format_labels(self.labels, key,
+                                      [("le", _format_value(float(bound)))]),
+                       value["buckets"][bound])
+            labels = _format_labels(self.labels, key)
+            yield self.name + "_sum", labels, value["sum"]
+            yield self.name + "_count", labels, value["count"]
+
+
+class Registry(object):
+    """A set of metrics that can be rendered together."""
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), callback=None):
+        return self.register(Gauge(name, help, labels, callback))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_TIME_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def clear(self):
+        """Reset every metric to its initial state."""
+        for metric in self._metrics:
+            metric.clear()
+
+    def snapshot(self):
+        """Return the current values as a dict keyed by metric name.
+        Each value is a list of (labels, value) pairs where `labels` is
+        a dict of the label values.
+        """
+        result = {}
+        for metric in self._metrics:
+            result[metric.name] = [
+                (dict(zip(metric.labels, key)), value)
+                for key, value in sorted(metric.snapshot().items())
+            ]
+        return result
+
+    def render_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append("# HELP %s %s" % (metric.name, metric.help))
+            lines.append("# TYPE %s %s" % (metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                lines.append("%s%s %s" % (name, labels, _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+# The client whose rate limiter the limiter gauge reports.
+_limiter_client = None
+
+def _limiter_tokens():
+    client = _limiter_client or musicbrainz._default_client
+    return client._send.available()
+
+#: The library's metrics.
+registry = Registry()
+
+requests_total = registry.counter(
+        "musicbrainzngs_requests_total",
+        "Web service requests by entity and HTTP status.",
+        ("entity", "status"))
+cache_total = registry.counter(
+        "musicbrainzngs_cache_requests_total",
+        "Cacheable requests by result (hit or miss).", ("result",))
+retries_total = registry.counter(
+        "musicbrainzngs_retries_total",
+        "Connection retries made by the transport.")
+in_flight = registry.gauge(
+        "musicbrainzngs_requests_in_flight",
+        "Requests currently being made.")
+limiter_tokens = registry.gauge(
+        "musicbrainzngs_limiter_tokens",
+        "Requests the rate limiter would allow right now.",
+        callback=_limiter_tokens)
+request_seconds = registry.histogram(
+        "musicbrainzngs_request_seconds",
+        "Total time spent per request.", ("entity",))
+limiter_wait_seconds = registry.histogram(
+        "musicbrainzngs_limiter_wait_seconds",
+        "Time spent waiting for the rate limiter.")
+parse_seconds = registry.histogram(
+        "musicbrainzngs_parse_seconds",
+        "Time spent parsing responses.", ("entity",))
+response_bytes = registry.histogram(
+        "musicbrainzngs_response_bytes",
+        "Size of response bodies.", ("entity",),
+        buckets=DEFAULT_BYTE_BUCKETS)
+
+
+def _listener(event, info):
+    if event == "start":
+        in_flight.inc()
+        return
+    in_flight.dec()
+    entity = info["entity"]
+    status = str(info["status"]) if info["status"] is not None else "error"
+    requests_total.inc(entity=entity, status=status)
+    if info["cache"] is not None:
+        cache_total.inc(result=info["cache"])
+    if info["retries"]:
+        retries_total.inc(info["retries"])
+    request_seconds.observe(info["elapsed"], entity=entity)
+    if info["cache"] != "hit":
+        limiter_wait_seconds.observe(info["limiter_wait"])
+    if info["parse_time"] is not None:
+        parse_seconds.observe(info["parse_time"], entity=entity)
+    if info["bytes"] is not None:
+        response_bytes.observe(info["bytes"], entity=entity)
+
+def enable(client=None):
+    """Start collecting metrics of the requests of every client. The
+    limiter gauge reports the rate limiter of `client`, by default the
+    one of the module's functions.
+    """
+    global _limiter_client
+    _limiter_client = client
+    disable()
+    musicbrainz._global_request_listeners = \
+            musicbrainz._global_request_listeners + [_listener]
+
+def disable():
+    """Stop collecting metrics. The values collected so far are kept."""
+    musicbrainz._global_request_listeners = [
+            l for l in musicbrainz._global_request_listeners
+            if l != _listener]
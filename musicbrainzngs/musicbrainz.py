@@ -4,17 +4,21 @@
 # See the COPYING file for more information.
 
 import re
+import collections
+import contextlib
+import functools
+import io
 import threading
 import time
 import logging
+import types
 import xml.etree.ElementTree as etree
 from xml.parsers import expat
-import requests
-from requests.auth import HTTPDigestAuth
 
 from musicbrainzngs import mbxml
 from musicbrainzngs import util
 from musicbrainzngs import compat
+from musicbrainzngs.cache import BloomFilter, MemoryCache
 
 _version = "0.5dev"
 _log = logging.getLogger("musicbrainzngs")
@@ -135,6 +139,19 @@ VALID_SEARCH_FIELDS = {
     ],
 }
 
+# The same as sets, for validating arguments.
+def _sets(valid):
+    return dict((key, frozenset(values)) for key, values in valid.items())
+_INCLUDE_SETS = _sets(VALID_INCLUDES)
+_BROWSE_INCLUDE_SETS = _sets(VALID_BROWSE_INCLUDES)
+_SEARCH_FIELD_SETS = _sets(VALID_SEARCH_FIELDS)
+_RELEASE_TYPE_SET = frozenset(VALID_RELEASE_TYPES)
+_RELEASE_STATUS_SET = frozenset(VALID_RELEASE_STATUSES)
+# Entities looked up by MBID. A 404 for one of them is final; disc IDs,
+# ISRCs and the like can be found once someone submits them.
+_MBID_ENTITIES = frozenset(['artist', 'label', 'recording', 'release',
+                            'release-group', 'url', 'work'])
+
 
 # Exceptions.
 
@@ -189,7 +206,15 @@ class NetworkError(WebServiceError):
 	pass
 
 class ResponseError(WebServiceError):
-	"""Bad response sent by the MB server."""
+	"""Bad response sent by the MB server. ``code`` is its HTTP status
+	code, or None if the response itself couldn't be read."""
+	def __init__(self, message=None, cause=None, code=None):
+		super(ResponseError, self).__init__(message, cause)
+		self.code = code
+
+class NotFoundError(ResponseError):
+	"""Received a HTTP 404 response: the requested entity doesn't exist,
+	for example because it was merged into another one."""
 	pass
 
 class AuthenticationError(WebServiceError):
@@ -204,24 +229,66 @@ def _check_includes_impl(includes, valid_includes):
         if i not in valid_includes:
             raise InvalidIncludeError("Bad includes", "%s is not a valid include" % i)
 def _check_includes(entity, inc):
-    _check_includes_impl(inc, VALID_INCLUDES[entity])
+    _check_includes_impl(inc, _INCLUDE_SETS[entity])
 
 def _check_filter(values, valid):
 	for v in values:
 		if v not in valid:
 			raise InvalidFilterError(v)
 
+#: The most arguments each memo of validated arguments keeps.
+_MEMO_SIZE = 1024
+
+def _remember(memo, key, value):
+    """Store `value` as `memo[key]` and return it. A full memo is
+    emptied rather than growing any further."""
+    if len(memo) >= _MEMO_SIZE:
+        memo.clear()
+    memo[key] = value
+    return value
+
+_filter_params = {}
+
+def _canonical_values(values):
+    """Return the filter `values` (a string or a list) as a sorted list
+    of lowercase strings without duplicates, so that the same filter
+    always makes the same request."""
+    if isinstance(values, compat.basestring):
+        values = [values]
+    for value in values:
+        if not isinstance(value, compat.basestring):
+            raise InvalidFilterError(value)
+    return sorted(set(value.strip().lower() for value in values))
+
 def _check_filter_and_make_params(entity, includes, release_status=[], release_type=[]):
     """Check that the status or type values are valid. Then, check that
     the filters can be used with the given includes. Return a params
     dict that can be passed to _do_mb_query.
     """
-    if isinstance(release_status, compat.basestring):
-        release_status = [release_status]
-    if isinstance(release_type, compat.basestring):
-        release_type = [release_type]
-    _check_filter(release_status, VALID_RELEASE_STATUSES)
-    _check_filter(release_type, VALID_RELEASE_TYPES)
+    # Valid arguments are only checked and made canonical the first
+    # time they are seen, keyed as they were passed.
+    key = (entity,
+           tuple(includes) if isinstance(includes, list) else includes,
+           tuple(release_status) if isinstance(release_status, list)
+           else release_status,
+           tuple(release_type) if isinstance(release_type, list)
+           else release_type)
+    try:
+        params = _filter_params[key]
+    except KeyError:
+        params = _remember(_filter_params, key, _make_filter_params(
+                entity, includes, release_status, release_type))
+    except TypeError:
+        # Unhashable arguments, such as sets.
+        params = _make_filter_params(entity, includes, release_status,
+                                     release_type)
+    return dict(params)
+
+def _make_filter_params(entity, includes, release_status, release_type):
+    release_status = _canonical_values(release_status)
+    release_type = _canonical_values(release_type)
+    _check_filter(release_status, _RELEASE_STATUS_SET)
+    _check_filter(release_type, _RELEASE_TYPE_SET)
 
     if (release_status
             and "releases" not in includes and entity != "release"):
@@ -265,28 +332,17 @@ def auth(u, p):
 	"""Set the username and password to be used in subsequent queries to
 	the MusicBrainz XML API that require authentication.
 	"""
-	global user, password
-	user = u
-	password = p
+	_default_client.auth(u, p)
 
 def set_useragent(app, version, contact=None):
     """Set the User-Agent to be used for requests to the MusicBrainz webservice.
     This must be set before requests are made."""
-    global _useragent, _client
-    if not app or not version:
-        raise ValueError("App and version can not be empty")
-    if contact is not None:
-        _useragent = "%s/%s python-musicbrainz-ngs/%s ( %s )" % (app, version, _version, contact)
-    else:
-        _useragent = "%s/%s python-musicbrainz-ngs/%s" % (app, version, _version)
-    _client = "%s-%s" % (app, version)
-    _log.debug("set user-agent to %s" % _useragent)
+    _default_client.set_useragent(app, version, contact)
 
 def set_hostname(new_hostname):
     """Set the base hostname for MusicBrainz webservice requests.
     Defaults to 'musicbrainz.org'."""
-    global hostname
-    hostname = new_hostname
+    _default_client.set_hostname(new_hostname)
 
 # Rate limiting.
 
@@ -302,66 +358,266 @@ def set_rate_limit(limit_or_interval=1.0, new_requests=1):
     a set number of requests (`new_requests`) will be made per
     given interval (`limit_or_interval`).
     """
-    global limit_interval
-    global limit_requests
-    global do_rate_limit
-    if isinstance(limit_or_interval, bool):
-        do_rate_limit = limit_or_interval
-    else:
-        if limit_or_interval <= 0.0:
-            raise ValueError("limit_or_interval can't be less than 0")
-        if new_requests <= 0:
-            raise ValueError("new_requests can't be less than 0")
-        do_rate_limit = True
-        limit_interval = limit_or_interval
-        limit_requests = new_requests
+    _default_client.set_rate_limit(limit_or_interval, new_requests)
 
 class _rate_limit(object):
     """A decorator that limits the rate at which the function may be
     called. The rate is controlled by the `limit_interval` and
-    `limit_requests` global variables.  The limiting is thread-safe;
-    only one thread may be in the function at a time (acts like a
-    monitor in this sense). The globals must be set before the first
+    `limit_requests` global variables, or by those attributes of
+    `client` if one is given.  The limiting is thread-safe;
+    callers wait for their turn one at a time, but the lock is released
+    before the function is called, so calls that have been let through
+    can run concurrently. The globals must be set before the first
     call to the limited function.
     """
-    def __init__(self, fun):
+    def __init__(self, fun, client=None):
         self.fun = fun
+        self.client = client
         self.last_call = 0.0
         self.lock = threading.Lock()
         self.remaining_requests = None # Set on first invocation.
 
-    def _update_remaining(self):
-        """Update remaining requests based on the elapsed time since
-        they were last calculated.
+    def _settings(self):
+        if self.client is None:
+            return do_rate_limit, limit_interval, limit_requests
+        return (self.client.do_rate_limit, self.client.limit_interval,
+                self.client.limit_requests)
+
+    def _refilled(self, interval, requests, now):
+        """The remaining requests plus those earned since they were
+        last calculated, without paying for any.
         """
         # On first invocation, we have the maximum number of requests
         # available.
         if self.remaining_requests is None:
-            self.remaining_requests = float(limit_requests)
+            return float(requests)
+        since_last_call = now - self.last_call
+        return min(self.remaining_requests +
+                   since_last_call * (requests / float(interval)),
+                   float(requests))
 
-        else:
-            since_last_call = time.time() - self.last_call
-            self.remaining_requests += since_last_call * \
-                                       (limit_requests / limit_interval)
-            self.remaining_requests = min(self.remaining_requests,
-                                          float(limit_requests))
-
-        self.last_call = time.time()
+    def _update_remaining(self, interval, requests):
+        """Update remaining requests based on the elapsed time since
+        they were last calculated.
+        """
+        now = time.time()
+        self.remaining_requests = self._refilled(interval, requests, now)
+        self.last_call = now
+
+    def available(self):
+        """Return how many calls the limiter would let through right
+        now without waiting. Nothing is paid for, and the lock is not
+        taken, so the answer may be out of date at once.
+        """
+        enabled, interval, requests = self._settings()
+        if not enabled:
+            return float(requests)
+        return self._refilled(interval, requests, time.time())
 
     def __call__(self, *args, **kwargs):
         with self.lock:
-            if do_rate_limit:
-                self._update_remaining()
+            enabled, interval, requests = self._settings()
+            if enabled:
+                self._update_remaining(interval, requests)
 
                 # Delay if necessary.
+                waited = 0.0
                 while self.remaining_requests < 0.999:
-                    time.sleep((1.0 - self.remaining_requests) *
-                               (limit_requests / limit_interval))
-                    self._update_remaining()
-
-                # Call the original function, "paying" for this call.
+                    delay = ((1.0 - self.remaining_requests) /
+                             (requests / float(interval)))
+                    time.sleep(delay)
+                    waited += delay
+                    self._update_remaining(interval, requests)
+                _request_state.limiter_wait = waited
+
+                # "Pay" for this call.
                 self.remaining_requests -= 1.0
-            return self.fun(*args, **kwargs)
+        return self.fun(*args, **kwargs)
+
+    def try_acquire(self):
+        """Pay for a call of the limited function if that needs no
+        waiting and would take none of the requests other callers use:
+        no one is waiting and no call was let through for at least one
+        interval. Return whether it was paid for. Calls paid for this
+        way should be made through `fun`.
+        """
+        if not self.lock.acquire(False):
+            return False
+        try:
+            enabled, interval, requests = self._settings()
+            if not enabled:
+                return True
+            self._update_remaining(interval, requests)
+            if self.remaining_requests < requests - 0.001:
+                return False
+            self.remaining_requests -= 1.0
+            return True
+        finally:
+            self.lock.release()
+
+
+# Request listeners and caching.
+
+_request_listeners = []
+# Listeners called around the requests of every client, such as those
+# of musicbrainzngs.metrics.
+_global_request_listeners = []
+_request_state = threading.local()
+_cache = None
+
+def add_request_listener(listener):
+    """Register a function to be called around every web service
+    request. It is called as ``listener(event, info)`` where `event` is
+    "start" before a request is made and "end" once it has finished
+    (successfully or not). `info` is a dict describing the request, with
+    these keys filled in by the "end" event:
+
+    * method, path, entity and url of the request
+    * cache: "hit" or "miss", or None if no cache is set
+    * limiter_wait: seconds spent waiting for the rate limiter
+    * ttfb: seconds from sending the request to receiving the headers
+    * transfer_time and bytes: time spent reading the body and its size
+    * parse_time: seconds spent parsing the XML
+    * retries: connection retries made by the transport
+    * status: the HTTP status code, if there was a response
+    * error: the exception raised, if any
+    * elapsed: total seconds spent in the request
+    """
+    _default_client.add_request_listener(listener)
+
+def remove_request_listener(listener):
+    """Unregister a function added with :func:`add_request_listener`."""
+    _default_client.remove_request_listener(listener)
+
+def _fire(listeners, event, info):
+    for listener in listeners:
+        try:
+            listener(event, info)
+        except Exception:
+            _log.exception("request listener %r failed", listener)
+
+def set_cache(cache):
+    """Cache the responses to GET requests that need no authentication
+    in `cache`, for example a :class:`MemoryCache`. Cached responses
+    are returned without contacting the server (and without waiting for
+    the rate limiter). Pass None to disable caching, which is the
+    default.
+
+    Responses the cache calls stale (see the `soft_ttl` of
+    :class:`MemoryCache`) are returned as well, and fetched again in a
+    background thread when the rate limiter has requests to spare.
+    """
+    _default_client.set_cache(cache)
+
+class _Refresher(object):
+    """Fetches stale cache entries again in a background thread, one at
+    a time and only with requests the rate limiter has to spare, so the
+    refreshes never delay requests made by the application.
+    """
+    def __init__(self):
+        # Key -> (client, cache, prepared), and the keys in the order
+        # they were queued.
+        self._queued = {}
+        self._order = collections.deque()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def queue(self, client, cache, key, prepared):
+        """Fetch `prepared` with `client` and store it in `cache` under
+        `key` when there is time. Keys already queued are ignored."""
+        with self._lock:
+            if key in self._queued:
+                return
+            self._queued[key] = (client, cache, prepared)
+            self._order.append(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def __len__(self):
+        return len(self._queued)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._queued:
+                    self._thread = None
+                    return
+                key = self._order[0]
+                client, cache, prepared = self._queued[key]
+            limiter = client._send
+            if hasattr(limiter, "try_acquire"):
+                if not limiter.try_acquire():
+                    time.sleep(min(0.5, float(client.limit_interval) /
+                                        client.limit_requests / 4))
+                    continue
+                send = limiter.fun
+            else:
+                send = limiter
+            try:
+                status, content = send(client._get_session(), prepared,
+                                       None)
+                if status == 200:
+                    cache.set(key, content)
+                elif status == 404 and hasattr(cache, "set_missing"):
+                    cache.set_missing(key)
+            except Exception:
+                _log.debug("refreshing %s failed", key, exc_info=True)
+            with self._lock:
+                del self._queued[key]
+                self._order.popleft()
+
+_refresher = _Refresher()
+
+_local_store = None
+
+def set_local_store(store):
+    """Look entities up in `store`, for example a
+    :class:`musicbrainzngs.dump.DumpStore`, before asking the web
+    service. Entities that aren't in the store are still requested from
+    the server. Pass None to stop using the store, which is the default.
+
+    A store has a ``lookup(entity, id, includes)`` method returning the
+    parsed result or None. It should return None when it can't include
+    all of `includes`.
+    """
+    _default_client.set_local_store(store)
+
+_missing_filter = None
+
+def set_missing_filter(missing):
+    """Remember the IDs that lookups didn't find in `missing`, for
+    example a :class:`musicbrainzngs.cache.BloomFilter`, and raise
+    :class:`NotFoundError` for lookups of them without asking the server
+    again. Pass None to stop, which is the default.
+
+    Only lookups by MBID are remembered: disc IDs, ISRCs, PUIDs and
+    echoprints are asked for each time, since they may be added later.
+
+    `missing` needs ``add(key)`` and ``key in missing``; the keys are
+    strings like "release/<mbid>".
+    """
+    _default_client.set_missing_filter(missing)
+
+_search_index = None
+_search_index_preferred = False
+
+def set_search_index(index, prefer=False):
+    """Answer searches from `index`, for example a
+    :class:`musicbrainzngs.searchindex.SearchIndex`, when the web service
+    can't be reached or answers with a 503 (as it does when it is busy
+    or the rate limit is exceeded). If `prefer` is True, the index is
+    always used instead of the web service. Pass None to stop using the
+    index.
+
+    An index has a ``search(entity, query, limit, offset)`` method
+    returning the parsed result, or None if it can't search `entity`.
+    If it also has an ``add(document)`` method, the responses to
+    lookups, browses and searches that don't need authentication are
+    added to it, so it can find what was fetched before.
+    """
+    _default_client.set_search_index(index, prefer)
 
 
 # Core (internal) functions for calling the MB API.
@@ -373,11 +629,238 @@ if hasattr(etree, 'ParseError'):
 else:
 	ETREE_EXCEPTIONS = (expat.ExpatError)
 
-@_rate_limit
+#: The number of connections kept open per host.
+POOL_SIZE = 10
+
+_session = None
+_session_lock = threading.Lock()
+
+def _requests():
+	"""Return the requests module. It is imported when the first request
+	is made rather than with this module, which is a large part of the
+	time it takes to import musicbrainzngs.
+	"""
+	import requests
+	import requests.adapters
+	import requests.auth
+	return requests
+
+def _new_session(pool_size):
+	"""Return a requests Session whose connections are reused (and
+	retried) through one pool of `pool_size` connections per host.
+	"""
+	requests = _requests()
+	session = requests.Session()
+	adapter = requests.adapters.HTTPAdapter(
+		max_retries=8, pool_connections=pool_size, pool_maxsize=pool_size)
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+	return session
+
+def _send_request(session, prepared, info):
+	"""Send a prepared request, reading the whole response. Clients
+	call it through their rate limiter.
+	"""
+	if info is not None:
+		info["limiter_wait"] = getattr(_request_state, "limiter_wait", 0.0)
+	_request_state.limiter_wait = 0.0
+	start = time.time()
+	try:
+		resp = session.send(prepared, allow_redirects=True, stream=True)
+		ttfb = time.time()
+		content = resp.content
+	except _requests().RequestException as exc:
+		raise NetworkError(cause=exc)
+	if info is not None:
+		end = time.time()
+		info["ttfb"] = ttfb - start
+		info["transfer_time"] = end - ttfb
+		info["bytes"] = len(content)
+		info["status"] = resp.status_code
+		retries = getattr(resp.raw, "retries", None)
+		info["retries"] = len(retries.history) if retries else 0
+	return resp.status_code, content
+
+_send = _rate_limit(_send_request)
+
+
+# Clients.
+
+_client_state = threading.local()
+
+class MusicBrainzClient(object):
+	"""A connection to a MusicBrainz server with its own settings: the
+	hostname, user agent, credentials, rate limit, connection pool,
+	cache, local store, search index and request listeners.
+
+	Every function of the module that requests data, such as
+	:func:`get_artist_by_id` or :func:`iter_browse_releases`, is also a
+	method of a client. The functions themselves use a default client
+	that is configured with :func:`set_hostname`, :func:`auth` and the
+	other ``set_`` functions. Clients don't share any of these settings,
+	so one process can use a local mirror without a rate limit next to
+	musicbrainz.org::
+
+	    mirror = musicbrainzngs.MusicBrainzClient("localhost:5000")
+	    mirror.set_useragent("Example music app", "0.1")
+	    mirror.set_rate_limit(False)
+	    mirror.get_artist_by_id(artist_id)
+	"""
+	def __init__(self, hostname="musicbrainz.org", pool_size=POOL_SIZE):
+		self.user = self.password = ""
+		self.hostname = hostname
+		self._client = ""
+		self._useragent = ""
+		self.limit_interval = 1.0
+		self.limit_requests = 1
+		self.do_rate_limit = True
+		self.pool_size = pool_size
+		self._send = _rate_limit(_send_request, self)
+		self._session = None
+		self._session_lock = threading.Lock()
+		self._request_listeners = []
+		self._cache = None
+		self._refresher = _Refresher()
+		self._local_store = None
+		self._missing_filter = None
+		self._search_index = None
+		self._search_index_preferred = False
+
+	def auth(self, u, p):
+		"""Like :func:`musicbrainzngs.auth`, for this client."""
+		self.user = u
+		self.password = p
+
+	def set_useragent(self, app, version, contact=None):
+		"""Like :func:`musicbrainzngs.set_useragent`, for this client."""
+		if not app or not version:
+			raise ValueError("App and version can not be empty")
+		if contact is not None:
+			self._useragent = "%s/%s python-musicbrainz-ngs/%s ( %s )" % (app, version, _version, contact)
+		else:
+			self._useragent = "%s/%s python-musicbrainz-ngs/%s" % (app, version, _version)
+		self._client = "%s-%s" % (app, version)
+		_log.debug("set user-agent to %s" % self._useragent)
+
+	def set_hostname(self, new_hostname):
+		"""Like :func:`musicbrainzngs.set_hostname`, for this client."""
+		self.hostname = new_hostname
+
+	def set_rate_limit(self, limit_or_interval=1.0, new_requests=1):
+		"""Like :func:`musicbrainzngs.set_rate_limit`, for this client."""
+		if isinstance(limit_or_interval, bool):
+			self.do_rate_limit = limit_or_interval
+		else:
+			if limit_or_interval <= 0.0:
+				raise ValueError("limit_or_interval can't be less than 0")
+			if new_requests <= 0:
+				raise ValueError("new_requests can't be less than 0")
+			self.do_rate_limit = True
+			self.limit_interval = limit_or_interval
+			self.limit_requests = new_requests
+
+	def set_cache(self, cache):
+		"""Like :func:`musicbrainzngs.set_cache`, for this client."""
+		self._cache = cache
+
+	def set_local_store(self, store):
+		"""Like :func:`musicbrainzngs.set_local_store`, for this client."""
+		self._local_store = store
+
+	def set_missing_filter(self, missing):
+		"""Like :func:`musicbrainzngs.set_missing_filter`, for this
+		client."""
+		self._missing_filter = missing
+
+	def set_search_index(self, index, prefer=False):
+		"""Like :func:`musicbrainzngs.set_search_index`, for this
+		client."""
+		self._search_index = index
+		self._search_index_preferred = prefer
+
+	def add_request_listener(self, listener):
+		"""Like :func:`musicbrainzngs.add_request_listener`, for the
+		requests of this client."""
+		self._request_listeners = self._request_listeners + [listener]
+
+	def remove_request_listener(self, listener):
+		"""Like :func:`musicbrainzngs.remove_request_listener`."""
+		self._request_listeners = [l for l in self._request_listeners
+		                           if l != listener]
+
+	def _get_session(self):
+		with self._session_lock:
+			if self._session is None:
+				self._session = _new_session(self.pool_size)
+			return self._session
+
+	@contextlib.contextmanager
+	def activate(self):
+		"""Make the functions of the module, and the modules built on
+		them like :mod:`musicbrainzngs.crawler`, use this client in the
+		current thread for the duration of a ``with`` block.
+		"""
+		previous = getattr(_client_state, "client", None)
+		_client_state.client = self
+		try:
+			yield self
+		finally:
+			_client_state.client = previous
+
+def _module_global(name):
+	def get(self):
+		return globals()[name]
+	def set(self, value):
+		globals()[name] = value
+	return property(get, set)
+
+class _DefaultClient(MusicBrainzClient):
+	"""The client of the module's functions. Its settings are the
+	module's globals, which is where they have always been kept.
+	"""
+	user = _module_global("user")
+	password = _module_global("password")
+	hostname = _module_global("hostname")
+	_client = _module_global("_client")
+	_useragent = _module_global("_useragent")
+	limit_interval = _module_global("limit_interval")
+	limit_requests = _module_global("limit_requests")
+	do_rate_limit = _module_global("do_rate_limit")
+	pool_size = _module_global("POOL_SIZE")
+	_send = _module_global("_send")
+	_session = _module_global("_session")
+	_session_lock = _module_global("_session_lock")
+	_request_listeners = _module_global("_request_listeners")
+	_cache = _module_global("_cache")
+	_refresher = _module_global("_refresher")
+	_local_store = _module_global("_local_store")
+	_missing_filter = _module_global("_missing_filter")
+	_search_index = _module_global("_search_index")
+	_search_index_preferred = _module_global("_search_index_preferred")
+
+	def __init__(self):
+		pass
+
+_default_client = _DefaultClient()
+
+def _current_client():
+	"""Return the client activated in this thread, or the default one."""
+	return getattr(_client_state, "client", None) or _default_client
+
+def _index_response(index, content):
+	"""Add the body of a response to `index`, if it can learn."""
+	add = getattr(index, "add", None)
+	if add is None:
+		return
+	try:
+		add(content)
+	except Exception:
+		_log.debug("indexing a response failed", exc_info=True)
+
 def _mb_request(path, method='GET', auth_required=False, client_required=False,
 				args=None, data=None, body=None):
 	"""Makes a request for the specified `path` (endpoint) on /ws/2 on
-	the globally-specified hostname. Parses the responses and returns
+	the hostname of the current client. Parses the responses and returns
 	the resulting object.  `auth_required` and `client_required` control
 	whether exceptions should be raised if the client and
 	username/password are left unspecified, respectively.
@@ -387,14 +870,18 @@ def _mb_request(path, method='GET', auth_required=False, client_required=False,
 	else:
 		args = dict(args) or {}
 
-	if _useragent == "":
+	client = _current_client()
+	if client._useragent == "":
 		raise UsageError("set a proper user-agent with "
 						 "set_useragent(\"application name\", \"application version\", \"contact info (preferably URL or email for your application)\")")
 
 	if client_required:
-		args["client"] = _client
+		args["client"] = client._client
 
 	headers = {}
+	if hasattr(body, "seek"):
+		# A file is streamed from its start, also when it is sent again.
+		body.seek(0)
 	if body:
 		headers['Content-Type'] = 'application/xml; charset=UTF-8'
 	else:
@@ -402,39 +889,107 @@ def _mb_request(path, method='GET', auth_required=False, client_required=False,
 		# will be sent (avoids HTTP 411 error).
 		headers['Content-Length'] = '0'
 
+	requests = _requests()
 	req = requests.Request(
 		method,
-		'http://{0}/ws/2/{1}'.format(hostname, path),
-		params=args,
-		auth=HTTPDigestAuth(user, password) if auth_required else None,
+		'http://{0}/ws/2/{1}'.format(client.hostname, path),
+		# Sorted, so that one query always has the same URL (and cache key).
+		params=sorted(args.items()),
+		auth=requests.auth.HTTPDigestAuth(client.user, client.password)
+			if auth_required else None,
 		headers=headers,
 		data=body,
 	)
+	prepared = req.prepare()
+
+	listeners = client._request_listeners
+	if _global_request_listeners:
+		listeners = listeners + _global_request_listeners
+	info = None
+	if listeners:
+		info = {"method": method, "path": path,
+		        "entity": path.split("/", 1)[0], "url": prepared.url,
+		        "cache": None, "limiter_wait": 0.0, "ttfb": None,
+		        "transfer_time": None, "bytes": None, "parse_time": None,
+		        "retries": 0, "status": None, "error": None}
+		start = time.time()
+		_fire(listeners, "start", info)
 
-	# Make request (with retries).
-	session = requests.Session()
-	adapter = requests.adapters.HTTPAdapter(max_retries=8)
-	session.mount('http://', adapter)
-	session.mount('https://', adapter)
 	try:
-		resp = session.send(req.prepare(), allow_redirects=True)
-	except requests.RequestException as exc:
-		raise NetworkError(cause=exc)
-	if resp.status_code != 200:
-		raise ResponseError(
-			'API responded with code {0}'.format(resp.status_code)
-		)
-
-	# Parse the response.
-	try:
-		return mbxml.parse_message(resp.content)
-	except UnicodeError as exc:
-		raise ResponseError(cause=exc)
-	except Exception as exc:
-		if isinstance(exc, ETREE_EXCEPTIONS):
+		cache = client._cache
+		cache_key = None
+		content = None
+		if cache is not None and method == 'GET' and not auth_required:
+			cache_key = prepared.url
+			content = cache.get(cache_key)
+			missing = content is None and _is_missing(cache, cache_key)
+			if info is not None:
+				info["cache"] = "miss" if content is None and not missing \
+						else "hit"
+			if missing:
+				if info is not None:
+					info["status"] = 404
+				raise NotFoundError('API responded with code 404', code=404)
+			if content is not None and _is_stale(cache, cache_key):
+				client._refresher.queue(client, cache, cache_key, prepared)
+
+		if content is None:
+			status, content = client._send(client._get_session(), prepared,
+			                               info)
+			if status == 404:
+				if cache_key is not None and hasattr(cache, "set_missing"):
+					cache.set_missing(cache_key)
+				raise NotFoundError(
+					'API responded with code {0}'.format(status), code=status
+				)
+			if status != 200:
+				raise ResponseError(
+					'API responded with code {0}'.format(status), code=status
+				)
+			if cache_key is not None:
+				cache.set(cache_key, content)
+			if (client._search_index is not None and method == 'GET'
+			        and not auth_required):
+				_index_response(client._search_index, content)
+		elif info is not None:
+			info["bytes"] = len(content)
+			info["status"] = 200
+
+		# Parse the response.
+		if info is not None:
+			parse_start = time.time()
+		try:
+			result = mbxml.parse_message(content)
+		except UnicodeError as exc:
 			raise ResponseError(cause=exc)
-		else:
-			raise
+		except Exception as exc:
+			if isinstance(exc, ETREE_EXCEPTIONS):
+				raise ResponseError(cause=exc)
+			else:
+				raise
+		if info is not None:
+			info["parse_time"] = time.time() - parse_start
+		return result
+	except Exception as exc:
+		if info is not None:
+			info["error"] = exc
+		raise
+	finally:
+		if info is not None:
+			info["elapsed"] = time.time() - start
+			_fire(listeners, "end", info)
+
+def _is_missing(cache, key):
+	"""Whether `cache` remembers that `key` wasn't found. Caches without
+	negative caching never do."""
+	missing = getattr(cache, "missing", None)
+	return missing is not None and missing(key)
+
+def _is_stale(cache, key):
+	"""Whether the entry `cache` has for `key` should be fetched again.
+	Entries of caches without a soft TTL never are."""
+	stale = getattr(cache, "stale", None)
+	return stale is not None and stale(key)
 
 def _is_auth_required(entity, includes):
 	""" Some calls require authentication. This returns
@@ -447,6 +1002,16 @@ def _is_auth_required(entity, includes):
 	else:
 		return False
 
+_include_args = {}
+
+def _make_include_args(entity, includes):
+	"""Check `includes` and return the "inc" argument for them (or None)
+	and whether they need authentication."""
+	_check_includes(entity, includes)
+	# Sorted, so that the same includes always make the same request.
+	return (" ".join(sorted(set(includes))) or None,
+	        _is_auth_required(entity, includes))
+
 def _do_mb_query(entity, id, includes=[], params={}):
 	"""Make a single GET call to the MusicBrainz XML API. `entity` is a
 	string indicated the type of object to be retrieved. The id may be
@@ -458,16 +1023,47 @@ def _do_mb_query(entity, id, includes=[], params={}):
 	# Build arguments.
 	if not isinstance(includes, list):
 		includes = [includes]
-	_check_includes(entity, includes)
-	auth_required = _is_auth_required(entity, includes)
+	key = (entity, tuple(includes))
+	try:
+		inc, auth_required = _include_args[key]
+	except KeyError:
+		inc, auth_required = _remember(_include_args, key,
+		                               _make_include_args(entity, includes))
+	client = _current_client()
+	store = client._local_store
+	if store is not None and id and not params and not auth_required:
+		result = store.lookup(entity, id, includes)
+		if result is not None:
+			return result
 	args = dict(params)
-	if len(includes) > 0:
-		inc = " ".join(includes)
+	if inc:
 		args["inc"] = inc
 
 	# Build the endpoint components.
 	path = '%s/%s' % (entity, id)
-	return _mb_request(path, 'GET', auth_required, args=args)
+	missing = client._missing_filter
+	if (missing is None or not id or auth_required
+	        or entity not in _MBID_ENTITIES):
+		return _mb_request(path, 'GET', auth_required, args=args)
+	key = '%s/%s' % (entity, id)
+	if key in missing:
+		raise NotFoundError('API responded with code 404', code=404)
+	try:
+		return _mb_request(path, 'GET', auth_required, args=args)
+	except NotFoundError:
+		missing.add(key)
+		raise
+
+_LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]\^"~*?:\\\/])')
+# The query is escaped the same, except for slashes.
+_QUERY_SPECIAL = re.compile(r'([+\-&|!(){}\[\]\^"~*?:\\])')
+
+def _collapse_spaces(value):
+	return " ".join(value.split())
+
+def _escape_lucene(value):
+	"""Escape Lucene's special characters in a search term."""
+	return _LUCENE_SPECIAL.sub(r'\\\1', value)
 
 def _do_mb_search(entity, query='', fields={},
 		  limit=None, offset=None, strict=False):
@@ -480,26 +1076,25 @@ def _do_mb_search(entity, query='', fields={},
 	# Encode the query terms as a Lucene query string.
 	query_parts = []
 	if query:
-		clean_query = util._unicode(query)
+		clean_query = _collapse_spaces(util._unicode(query))
 		if fields:
-			clean_query = re.sub(r'([+\-&|!(){}\[\]\^"~*?:\\])',
-					r'\\\1', clean_query)
+			clean_query = _QUERY_SPECIAL.sub(r'\\\1', clean_query)
 			if strict:
 				query_parts.append('"%s"' % clean_query)
 			else:
 				query_parts.append(clean_query.lower())
 		else:
 			query_parts.append(clean_query)
-	for key, value in fields.items():
+	# The fields are in a fixed order, to make the same query each time.
+	for key, value in sorted(fields.items()):
 		# Ensure this is a valid search field.
-		if key not in VALID_SEARCH_FIELDS[entity]:
+		if key not in _SEARCH_FIELD_SETS[entity]:
 			raise InvalidSearchFieldError(
 				'%s is not a valid search field for %s' % (key, entity)
 			)
 
 		# Escape Lucene's special characters.
-		value = util._unicode(value)
-		value = re.sub(r'([+\-&|!(){}\[\]\^"~*?:\\\/])', r'\\\1', value)
+		value = _escape_lucene(_collapse_spaces(util._unicode(value)))
 		if value:
 			if strict:
 				query_parts.append('%s:"%s"' % (key, value))
@@ -521,7 +1116,23 @@ def _do_mb_search(entity, query='', fields={},
 	if offset:
 		params['offset'] = str(offset)
 
-	return _do_mb_query(entity, '', [], params)
+	client = _current_client()
+	index = client._search_index
+	if index is not None and client._search_index_preferred:
+		result = index.search(entity, full_query, limit, offset)
+		if result is not None:
+			return result
+	try:
+		return _do_mb_query(entity, '', [], params)
+	except (NetworkError, ResponseError) as exc:
+		# A 503 means the service is busy or we are rate limited.
+		if index is None or (isinstance(exc, ResponseError) and
+		                     exc.code != 503):
+			raise
+		result = index.search(entity, full_query, limit, offset)
+		if result is None:
+			raise
+		return result
 
 def _do_mb_delete(path):
 	"""Send a DELETE request for the specified object.
@@ -662,6 +1273,81 @@ def search_works(query='', limit=None, offset=None, strict=False, **fields):
     return _do_mb_search('work', query, fields, limit, offset, strict)
 
 
+# Resolving many IDs at once
+
+#: The search field that holds the MusicBrainz ID of each entity type.
+ID_SEARCH_FIELDS = {
+    'artist': 'arid',
+    'label': 'laid',
+    'recording': 'rid',
+    'release': 'reid',
+    'release-group': 'rgid',
+    'work': 'wid',
+}
+
+#: The longest (URL-encoded) search query :func:`resolve_ids` sends.
+MAX_QUERY_LENGTH = 8000
+
+def _id_queries(field, ids, max_length):
+    """Pack `ids` into queries of the form "field:(id1 OR id2 ...)" of
+    at most MAX_PAGE_SIZE IDs and `max_length` encoded characters.
+    Yield (query, ids in it) pairs.
+    """
+    head = len(compat.quote_plus("%s:()" % field))
+    batch, length = [], head
+    for id in ids:
+        term = _escape_lucene(util._unicode(id))
+        term_length = len(compat.quote_plus(term + " OR "))
+        if batch and (length + term_length > max_length or
+                      len(batch) >= MAX_PAGE_SIZE):
+            yield "%s:(%s)" % (field, " OR ".join(t for i, t in batch)), \
+                  [i for i, t in batch]
+            batch, length = [], head
+        batch.append((id, term))
+        length += term_length
+    if batch:
+        yield "%s:(%s)" % (field, " OR ".join(t for i, t in batch)), \
+              [i for i, t in batch]
+
+def resolve_ids(entity, ids, max_query_length=MAX_QUERY_LENGTH):
+    """Get many entities of one type by their MusicBrainz IDs.
+
+    The IDs are packed into as few searches as possible (up to 100 IDs
+    per request), so this is much faster than one lookup per ID under
+    the rate limit. Search results carry the same data as a lookup
+    without includes (plus an 'ext:score'). IDs the search doesn't
+    find, for example because they were merged into another entity,
+    are looked up one by one.
+
+    Returns a dict mapping every given ID to the entity's dict, or to
+    None if it doesn't exist. `entity` is one of the keys of
+    :data:`ID_SEARCH_FIELDS`.
+    """
+    if entity not in ID_SEARCH_FIELDS:
+        raise UsageError("Can't resolve IDs of %s entities" % entity)
+    wanted = []
+    for id in ids:
+        if id not in wanted:
+            wanted.append(id)
+
+    result = {}
+    list_key = "%s-list" % entity
+    for query, batch in _id_queries(ID_SEARCH_FIELDS[entity], wanted,
+                                    max_query_length):
+        found = _do_mb_search(entity, query, limit=len(batch))
+        for match in found.get(list_key, []):
+            if match.get("id") in batch:
+                result[match["id"]] = match
+
+    for id in wanted:
+        if id not in result:
+            try:
+                result[id] = _do_mb_query(entity, id)[entity]
+            except NotFoundError:
+                result[id] = None
+    return result
+
+
 # Lists of entities
 @_docstring('release')
 def get_releases_by_discid(id, includes=[], release_status=[], release_type=[]):
@@ -750,7 +1436,7 @@ def browse_artists(recording=None, release=None, release_group=None,
 
     *Available includes*: {includes}"""
     # optional parameter work?
-    valid_includes = VALID_BROWSE_INCLUDES['artists']
+    valid_includes = _BROWSE_INCLUDE_SETS['artists']
     params = {"recording": recording,
               "release": release,
               "release-group": release_group}
@@ -762,7 +1448,7 @@ def browse_labels(release=None, includes=[], limit=None, offset=None):
     """Get all labels linked to a relase. You need to give a MusicBrainz ID.
 
     *Available includes*: {includes}"""
-    valid_includes = VALID_BROWSE_INCLUDES['labels']
+    valid_includes = _BROWSE_INCLUDE_SETS['labels']
     params = {"release": release}
     return _browse_impl("label", includes, valid_includes,
                         limit, offset, params)
@@ -774,7 +1460,7 @@ def browse_recordings(artist=None, release=None, includes=[],
     You need to give one MusicBrainz ID.
 
     *Available includes*: {includes}"""
-    valid_includes = VALID_BROWSE_INCLUDES['recordings']
+    valid_includes = _BROWSE_INCLUDE_SETS['recordings']
     params = {"artist": artist,
               "release": release}
     return _browse_impl("recording", includes, valid_includes,
@@ -792,7 +1478,7 @@ def browse_releases(artist=None, label=None, recording=None,
 
     *Available includes*: {includes}"""
     # track_artist param doesn't work yet
-    valid_includes = VALID_BROWSE_INCLUDES['releases']
+    valid_includes = _BROWSE_INCLUDE_SETS['releases']
     params = {"artist": artist,
               "label": label,
               "recording": recording,
@@ -809,7 +1495,7 @@ def browse_release_groups(artist=None, release=None, release_type=[],
     You can filter by :data:`musicbrainz.VALID_RELEASE_TYPES`.
 
     *Available includes*: {includes}"""
-    valid_includes = VALID_BROWSE_INCLUDES['release-groups']
+    valid_includes = _BROWSE_INCLUDE_SETS['release-groups']
     params = {"artist": artist,
               "release": release}
     return _browse_impl("release-group", includes, valid_includes,
@@ -822,13 +1508,233 @@ def browse_urls(resource=None, includes=[], limit=None, offset=None):
 
     *Available includes*: {includes}"""
     # optional parameter work?
-    valid_includes = VALID_BROWSE_INCLUDES['urls']
+    valid_includes = _BROWSE_INCLUDE_SETS['urls']
     params = {"resource": resource}
     return _browse_impl("url", includes, valid_includes,
                         limit, offset, params)
 
 # browse_work is defined in the docs but has no browse criteria
 
+# Iterating over all results
+
+#: The largest `limit` the web service accepts for browse and search
+#: requests.
+MAX_PAGE_SIZE = 100
+
+class _Prefetch(object):
+    """Calls `fetch(**kwargs)` in a background thread. The result (or
+    exception) is returned (raised) by :meth:`result`.
+    """
+    def __init__(self, fetch, **kwargs):
+        self._result = self._exc = None
+        # The request is made by the client of the calling thread.
+        self._client = _current_client()
+        self._thread = threading.Thread(target=self._run,
+                                        args=(fetch, kwargs))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, fetch, kwargs):
+        try:
+            with self._client.activate():
+                self._result = fetch(**kwargs)
+        except Exception as exc:
+            self._exc = exc
+
+    def result(self):
+        self._thread.join()
+        if self._exc is not None:
+            raise self._exc
+        return self._result
+
+def _iter_pages(fetch, kwargs, list_key, page_size=MAX_PAGE_SIZE,
+                concurrency=1):
+    """Yield every entry of `list_key` over all pages returned by
+    `fetch(limit=..., offset=..., **kwargs)`. The total is read from the
+    matching '-count' key of the first page. The next page is fetched
+    in the background while the current one is consumed; nothing more
+    is fetched once the caller stops iterating.
+
+    Once the total is known, up to `concurrency` of the remaining pages
+    are requested at the same time. They are still yielded in order.
+    """
+    count_key = list_key[:-len("-list")] + "-count"
+    page = fetch(limit=page_size, offset=0, **kwargs)
+    entries = page.get(list_key, [])
+    count = page.get(count_key)
+
+    if count is None:
+        # Without a total, one page tells us whether to get the next.
+        offset = 0
+        while True:
+            offset += len(entries)
+            more = len(entries) >= page_size
+            if more:
+                prefetch = _Prefetch(fetch, limit=page_size, offset=offset,
+                                     **kwargs)
+            for entry in entries:
+                yield entry
+            if not more:
+                return
+            entries = prefetch.result().get(list_key, [])
+
+    # The server may return fewer than `page_size` entries per page.
+    step = len(entries) or page_size
+    offsets = iter(range(len(entries), count, step))
+    window = collections.deque()
+    def fill():
+        while len(window) < max(1, concurrency):
+            offset = next(offsets, None)
+            if offset is None:
+                break
+            window.append(_Prefetch(fetch, limit=step, offset=offset,
+                                    **kwargs))
+    fill()
+    for entry in entries:
+        yield entry
+    while window:
+        page = window.popleft().result()
+        fill()
+        for entry in page.get(list_key, []):
+            yield entry
+
+@_docstring('artists', browse=True)
+def iter_browse_artists(recording=None, release=None, release_group=None,
+                        includes=[], page_size=MAX_PAGE_SIZE, concurrency=1):
+    """Iterate over all artists linked to a recording, a release or a
+    release group, fetching page after page as :func:`browse_artists`.
+
+    *Available includes*: {includes}"""
+    return _iter_pages(browse_artists, dict(recording=recording,
+                       release=release, release_group=release_group,
+                       includes=includes), "artist-list", page_size,
+                       concurrency)
+
+@_docstring('labels', browse=True)
+def iter_browse_labels(release=None, includes=[], page_size=MAX_PAGE_SIZE,
+                       concurrency=1):
+    """Iterate over all labels linked to a release, fetching page after
+    page as :func:`browse_labels`.
+
+    *Available includes*: {includes}"""
+    return _iter_pages(browse_labels, dict(release=release,
+                       includes=includes), "label-list", page_size,
+                       concurrency)
+
+@_docstring('recordings', browse=True)
+def iter_browse_recordings(artist=None, release=None, includes=[],
+                           page_size=MAX_PAGE_SIZE, concurrency=1):
+    """Iterate over all recordings linked to an artist or a release,
+    fetching page after page as :func:`browse_recordings`.
+
+    *Available includes*: {includes}"""
+    return _iter_pages(browse_recordings, dict(artist=artist,
+                       release=release, includes=includes),
+                       "recording-list", page_size, concurrency)
+
+@_docstring('releases', browse=True)
+def iter_browse_releases(artist=None, label=None, recording=None,
+                         release_group=None, release_status=[],
+                         release_type=[], includes=[],
+                         page_size=MAX_PAGE_SIZE, concurrency=1):
+    """Iterate over all releases linked to an artist, a label, a
+    recording or a release group, fetching page after page as
+    :func:`browse_releases`.
+
+    *Available includes*: {includes}"""
+    return _iter_pages(browse_releases, dict(artist=artist, label=label,
+                       recording=recording, release_group=release_group,
+                       release_status=release_status,
+                       release_type=release_type, includes=includes),
+                       "release-list", page_size, concurrency)
+
+@_docstring('release-groups', browse=True)
+def iter_browse_release_groups(artist=None, release=None, release_type=[],
+                               includes=[], page_size=MAX_PAGE_SIZE,
+                               concurrency=1):
+    """Iterate over all release groups linked to an artist or a
+    release, fetching page after page as :func:`browse_release_groups`.
+
+    *Available includes*: {includes}"""
+    return _iter_pages(browse_release_groups, dict(artist=artist,
+                       release=release, release_type=release_type,
+                       includes=includes), "release-group-list", page_size,
+                       concurrency)
+
+@_docstring('urls', browse=True)
+def iter_browse_urls(resource=None, includes=[], page_size=MAX_PAGE_SIZE,
+                     concurrency=1):
+    """Iterate over all urls for a URL string, fetching page after page
+    as :func:`browse_urls`.
+
+    *Available includes*: {includes}"""
+    return _iter_pages(browse_urls, dict(resource=resource,
+                       includes=includes), "url-list", page_size,
+                       concurrency)
+
+@_docstring('annotation')
+def iter_search_annotations(query='', strict=False, page_size=MAX_PAGE_SIZE,
+                            **fields):
+    """Iterate over all results of :func:`search_annotations`.
+
+    *Available search fields*: {fields}"""
+    return _iter_pages(search_annotations, dict(fields, query=query,
+                       strict=strict), "annotation-list", page_size)
+
+@_docstring('artist')
+def iter_search_artists(query='', strict=False, page_size=MAX_PAGE_SIZE,
+                        **fields):
+    """Iterate over all results of :func:`search_artists`.
+
+    *Available search fields*: {fields}"""
+    return _iter_pages(search_artists, dict(fields, query=query,
+                       strict=strict), "artist-list", page_size)
+
+@_docstring('label')
+def iter_search_labels(query='', strict=False, page_size=MAX_PAGE_SIZE,
+                       **fields):
+    """Iterate over all results of :func:`search_labels`.
+
+    *Available search fields*: {fields}"""
+    return _iter_pages(search_labels, dict(fields, query=query,
+                       strict=strict), "label-list", page_size)
+
+@_docstring('recording')
+def iter_search_recordings(query='', strict=False, page_size=MAX_PAGE_SIZE,
+                           **fields):
+    """Iterate over all results of :func:`search_recordings`.
+
+    *Available search fields*: {fields}"""
+    return _iter_pages(search_recordings, dict(fields, query=query,
+                       strict=strict), "recording-list", page_size)
+
+@_docstring('release')
+def iter_search_releases(query='', strict=False, page_size=MAX_PAGE_SIZE,
+                         **fields):
+    """Iterate over all results of :func:`search_releases`.
+
+    *Available search fields*: {fields}"""
+    return _iter_pages(search_releases, dict(fields, query=query,
+                       strict=strict), "release-list", page_size)
+
+@_docstring('release-group')
+def iter_search_release_groups(query='', strict=False,
+                               page_size=MAX_PAGE_SIZE, **fields):
+    """Iterate over all results of :func:`search_release_groups`.
+
+    *Available search fields*: {fields}"""
+    return _iter_pages(search_release_groups, dict(fields, query=query,
+                       strict=strict), "release-group-list", page_size)
+
+@_docstring('work')
+def iter_search_works(query='', strict=False, page_size=MAX_PAGE_SIZE,
+                      **fields):
+    """Iterate over all results of :func:`search_works`.
+
+    *Available search fields*: {fields}"""
+    return _iter_pages(search_works, dict(fields, query=query,
+                       strict=strict), "work-list", page_size)
+
 # Collections
 def get_collections():
     """List the collections for the currently :func:`authenticated <auth>` user
@@ -836,79 +1742,322 @@ def get_collections():
     # Missing <release-list count="n"> the count in the reply
     return _do_mb_query("collection", '')
 
-def get_releases_in_collection(collection):
+def get_releases_in_collection(collection, limit=None, offset=None):
     """List the releases in a collection.
     Returns a dict with a 'collection' key, which again has a 'release-list'.
+
+    Like the browse functions, it returns up to 25 releases by default,
+    and up to 100 with a `limit`, starting at `offset`.
     """
-    return _do_mb_query("collection", "%s/releases" % collection)
+    params = {}
+    if limit: params["limit"] = limit
+    if offset: params["offset"] = offset
+    return _do_mb_query("collection", "%s/releases" % collection, [], params)
+
+def _collection_page(collection, limit, offset):
+    return get_releases_in_collection(collection, limit, offset)["collection"]
+
+def iter_releases_in_collection(collection, page_size=MAX_PAGE_SIZE,
+                                concurrency=1):
+    """Iterate over all releases in a collection, fetching page after
+    page as :func:`get_releases_in_collection`. Only the pages being
+    read are held in memory; the next one is fetched in the background.
+    """
+    return _iter_pages(_collection_page, dict(collection=collection),
+                       "release-list", page_size, concurrency)
 
 # Submission methods
 
-def submit_barcodes(release_barcode):
-    """Submits a set of {release_id1: barcode, ...}"""
-    query = mbxml.make_barcode_request(release_barcode)
-    return _do_mb_post("release", query)
+#: How many times a chunk of a submission is sent again after a network
+#: error or a server error (5xx) response.
+SUBMIT_RETRIES = 2
+
+def _retried(request, retries, **kwargs):
+    """Return `request(**kwargs)`, trying again up to `retries` times
+    after a network error or a server error response. Other error
+    responses, such as a 400 or 404, would only fail again and are
+    raised at once."""
+    for attempt in range(retries + 1):
+        try:
+            return request(**kwargs)
+        except (NetworkError, ResponseError) as exc:
+            if attempt == retries or (isinstance(exc, ResponseError) and
+                                      (exc.code or 0) < 500):
+                raise
+
+def _send_chunks(chunks, retries, concurrency):
+    """Make the requests of `chunks`, an iterable of (keys, request,
+    kwargs) triples, up to `concurrency` at a time, and each retried up
+    to `retries` times. The next chunk is taken from `chunks` while the
+    previous ones are sent. Return a summary dict: "succeeded" lists the
+    keys of the requests that succeeded and "failed" maps the others to
+    the exception their request raised.
+    """
+    summary = {"succeeded": [], "failed": {}}
+    pending = collections.deque()
+
+    def collect():
+        keys, prefetch = pending.popleft()
+        try:
+            prefetch.result()
+        except WebServiceError as exc:
+            for key in keys:
+                summary["failed"][key] = exc
+        else:
+            summary["succeeded"].extend(keys)
+
+    for keys, request, kwargs in chunks:
+        if len(pending) >= concurrency:
+            collect()
+        pending.append((keys, _Prefetch(_retried, request=request,
+                                        retries=retries, **kwargs)))
+    while pending:
+        collect()
+    return summary
+
+def _request_body(make_request, mappings):
+    """Write the request body to a buffer it is streamed from."""
+    body = io.BytesIO()
+    make_request(*mappings, out=body)
+    return body
+
+def _submit(path, make_request, mappings, batch_size=None,
+            retries=SUBMIT_RETRIES, concurrency=1):
+    """POST the request `make_request` builds from `mappings` (a list of
+    dicts, its arguments) and return the parsed response.
+
+    If `batch_size` is set, the entries of the mappings are sent in
+    requests of at most `batch_size` entries instead, up to
+    `concurrency` at a time, and each is retried up to `retries` times.
+    The next request is built while the previous ones are sent. Return
+    the summary of :func:`_send_chunks` then.
+    """
+    if batch_size is None:
+        return _do_mb_post(path, _request_body(make_request, mappings))
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    items = [(i, key, value) for i, mapping in enumerate(mappings)
+             for key, value in sorted(mapping.items())]
+
+    def chunks():
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+            parts = [{} for _ in mappings]
+            for i, key, value in chunk:
+                parts[i][key] = value
+            yield ([key for _, key, _ in chunk], _do_mb_post,
+                   {"path": path, "body": _request_body(make_request, parts)})
+    return _send_chunks(chunks(), retries, concurrency)
+
+def _as_lists(mapping):
+    return dict((key, value if isinstance(value, list) else [value])
+                for key, value in mapping.items())
+
+def submit_barcodes(release_barcode, batch_size=None,
+                    retries=SUBMIT_RETRIES, concurrency=1):
+    """Submits a set of {release_id1: barcode, ...}
+
+    By default everything is sent in one request. With a `batch_size`,
+    at most that many releases are sent per request, `concurrency`
+    requests at a time, and failed requests are retried `retries` times.
+    A summary is returned then, with the IDs that "succeeded" and the
+    ones that "failed" mapped to the exception of their request.
+    """
+    return _submit("release", mbxml.make_barcode_request,
+                   [release_barcode], batch_size, retries, concurrency)
 
-def submit_puids(recording_puids):
+def submit_puids(recording_puids, batch_size=None,
+                 retries=SUBMIT_RETRIES, concurrency=1):
     """Submit PUIDs.
     Submits a set of {recording_id1: [puid1, ...], ...}
     or {recording_id1: puid, ...}.
+
+    See :func:`submit_barcodes` for `batch_size`, `retries` and
+    `concurrency`.
     """
-    rec2puids = dict()
-    for (rec, puids) in recording_puids.items():
-        rec2puids[rec] = puids if isinstance(puids, list) else [puids]
-    query = mbxml.make_puid_request(rec2puids)
-    return _do_mb_post("recording", query)
+    return _submit("recording", mbxml.make_puid_request,
+                   [_as_lists(recording_puids)],
+                   batch_size, retries, concurrency)
 
-def submit_echoprints(recording_echoprints):
+def submit_echoprints(recording_echoprints, batch_size=None,
+                      retries=SUBMIT_RETRIES, concurrency=1):
     """Submit echoprints.
     Submits a set of {recording_id1: [echoprint1, ...], ...}
     or {recording_id1: echoprint, ...}.
+
+    See :func:`submit_barcodes` for `batch_size`, `retries` and
+    `concurrency`.
     """
-    rec2echos = dict()
-    for (rec, echos) in recording_echoprints.items():
-        rec2echos[rec] = echos if isinstance(echos, list) else [echos]
-    query = mbxml.make_echoprint_request(rec2echos)
-    return _do_mb_post("recording", query)
+    return _submit("recording", mbxml.make_echoprint_request,
+                   [_as_lists(recording_echoprints)],
+                   batch_size, retries, concurrency)
 
-def submit_isrcs(recording_isrcs):
+def submit_isrcs(recording_isrcs, batch_size=None,
+                 retries=SUBMIT_RETRIES, concurrency=1):
     """Submit ISRCs.
     Submits a set of {recording-id1: [isrc1, ...], ...}
     or {recording_id1: isrc, ...}.
+
+    See :func:`submit_barcodes` for `batch_size`, `retries` and
+    `concurrency`.
     """
-    rec2isrcs = dict()
-    for (rec, isrcs) in recording_isrcs.items():
-        rec2isrcs[rec] = isrcs if isinstance(isrcs, list) else [isrcs]
-    query = mbxml.make_isrc_request(rec2isrcs)
-    return _do_mb_post("recording", query)
+    return _submit("recording", mbxml.make_isrc_request,
+                   [_as_lists(recording_isrcs)],
+                   batch_size, retries, concurrency)
 
-def submit_tags(artist_tags={}, recording_tags={}):
+def submit_tags(artist_tags={}, recording_tags={}, batch_size=None,
+                retries=SUBMIT_RETRIES, concurrency=1):
     """Submit user tags.
     Artist or recording parameters are of the form:
     {entity_id1: [tag1, ...], ...}
+
+    See :func:`submit_barcodes` for `batch_size`, `retries` and
+    `concurrency`.
     """
-    query = mbxml.make_tag_request(artist_tags, recording_tags)
-    return _do_mb_post("tag", query)
+    return _submit("tag", mbxml.make_tag_request,
+                   [artist_tags, recording_tags],
+                   batch_size, retries, concurrency)
 
-def submit_ratings(artist_ratings={}, recording_ratings={}):
+def submit_ratings(artist_ratings={}, recording_ratings={}, batch_size=None,
+                   retries=SUBMIT_RETRIES, concurrency=1):
     """ Submit user ratings.
     Artist or recording parameters are of the form:
     {entity_id1: rating, ...}
-    """
-    query = mbxml.make_rating_request(artist_ratings, recording_ratings)
-    return _do_mb_post("rating", query)
 
-def add_releases_to_collection(collection, releases=[]):
+    See :func:`submit_barcodes` for `batch_size`, `retries` and
+    `concurrency`.
+    """
+    return _submit("rating", mbxml.make_rating_request,
+                   [artist_ratings, recording_ratings],
+                   batch_size, retries, concurrency)
+
+#: The longest URL sent to change a collection, a little under the
+#: 16 KiB the server accepts. Longer lists of releases are split.
+MAX_URL_LENGTH = 16000
+
+def _collection_chunks(collection, releases, max_url_length):
+    """Split `releases` into lists whose collection URL is at most
+    `max_url_length` characters long."""
+    client = _current_client()
+    base = len("http://%s/ws/2/collection/%s/releases/?client=%s"
+               % (client.hostname, collection,
+                  compat.quote_plus(client._client)))
+    chunk, length = [], base
+    for release in releases:
+        extra = len(release) + (1 if chunk else 0)
+        if chunk and length + extra > max_url_length:
+            yield chunk
+            chunk, length = [], base
+            extra = len(release)
+        chunk.append(release)
+        length += extra
+    if chunk:
+        yield chunk
+
+def _edit_collection(request, collection, releases, max_url_length,
+                     retries, concurrency, summary=False):
+    """Send the edits of `releases` with `request`. Return the parsed
+    response of a single request, or a summary of the chunks if they
+    took more than one request or `summary` is true."""
+    if not releases:
+        raise ValueError("at least one release is required")
+    path = "collection/%s/releases/%%s" % collection
+    chunks = list(_collection_chunks(collection, releases, max_url_length))
+    if len(chunks) == 1 and not summary:
+        # One request returns the response or raises, as it always has.
+        return request(path % ";".join(chunks[0]))
+    return _send_chunks([(chunk, request, {"path": path % ";".join(chunk)})
+                         for chunk in chunks], retries, concurrency)
+
+def add_releases_to_collection(collection, releases=[],
+                               max_url_length=MAX_URL_LENGTH,
+                               retries=SUBMIT_RETRIES, concurrency=1):
     """Add releases to a collection.
     Collection and releases should be identified by their MBIDs
+
+    If the releases fit in one request, its parsed response is returned
+    and errors are raised. Otherwise they are sent in as many requests
+    as it takes to keep their URLs within `max_url_length`, up to
+    `concurrency` at a time, and each is retried `retries` times. A
+    summary is then returned like the submit functions return with a
+    `batch_size`: the releases that "succeeded", and the ones that
+    "failed" mapped to the exception of their request.
+
+    `releases` can't be empty: :exc:`ValueError` is raised.
     """
-    # XXX: Maximum URI length of 16kb means we should only allow ~400 releases
-    releaselist = ";".join(releases)
-    _do_mb_put("collection/%s/releases/%s" % (collection, releaselist))
+    return _edit_collection(_do_mb_put, collection, releases,
+                            max_url_length, retries, concurrency)
 
-def remove_releases_from_collection(collection, releases=[]):
+def remove_releases_from_collection(collection, releases=[],
+                                    max_url_length=MAX_URL_LENGTH,
+                                    retries=SUBMIT_RETRIES, concurrency=1):
     """Remove releases from a collection.
     Collection and releases should be identified by their MBIDs
+
+    See :func:`add_releases_to_collection` for `max_url_length`,
+    `retries`, `concurrency` and what is returned.
+    """
+    return _edit_collection(_do_mb_delete, collection, releases,
+                            max_url_length, retries, concurrency)
+
+def sync_collection(collection, releases, max_url_length=MAX_URL_LENGTH,
+                    retries=SUBMIT_RETRIES, concurrency=1):
+    """Make the releases in a collection the given `releases` (a list of
+    MBIDs): get the releases it has, then add only the missing ones and
+    remove only the ones that aren't in `releases`.
+
+    Return a dict with summaries of the "added" and "removed" releases,
+    as :func:`add_releases_to_collection` returns them for more than one
+    request, whatever the number of requests.
     """
-    releaselist = ";".join(releases)
-    _do_mb_delete("collection/%s/releases/%s" % (collection, releaselist))
+    current = set(release["id"]
+                  for release in iter_releases_in_collection(collection))
+    wanted = set(releases)
+    result = {}
+    for key, request, changed in [
+            ("added", _do_mb_put, wanted - current),
+            ("removed", _do_mb_delete, current - wanted)]:
+        result[key] = {"succeeded": [], "failed": {}}
+        if changed:
+            result[key] = _edit_collection(
+                    request, collection, sorted(changed), max_url_length,
+                    retries, concurrency, summary=True)
+    return result
+
+# Methods of the clients.
+
+#: The functions that become methods of :class:`MusicBrainzClient`.
+_CLIENT_METHOD_PREFIXES = ("get_", "search_", "browse_", "iter_", "submit_",
+                           "resolve_", "add_releases_", "remove_releases_",
+                           "sync_")
+
+def _iterate_with(client, generator):
+    try:
+        while True:
+            with client.activate():
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        with client.activate():
+            generator.close()
+
+def _client_method(func):
+    @functools.wraps(func)
+    def method(self, *args, **kwargs):
+        with self.activate():
+            result = func(*args, **kwargs)
+        if isinstance(result, types.GeneratorType):
+            # The requests are made while iterating.
+            return _iterate_with(self, result)
+        return result
+    return method
+
+for _name, _func in list(globals().items()):
+    if _name.startswith(_CLIENT_METHOD_PREFIXES) and \
+            isinstance(_func, types.FunctionType):
+        setattr(MusicBrainzClient, _name, _client_method(_func))
+del _name, _func
@@ -0,0 +1,218 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""Fetch an entity together with its linked entities in as few requests
+as possible::
+
+    from musicbrainzngs import planner
+    artist, plan = planner.fetch("artist", mbid,
+                                 want={"releases": ["media", "recordings"]})
+    for release in artist["release-list"]:
+        ...
+    print(plan)
+
+Linked entities can come with the lookup of the entity itself (up to
+:data:`LOOKUP_LIST_LIMIT` of them), from browse requests of up to
+:data:`musicbrainzngs.musicbrainz.MAX_PAGE_SIZE` entities each, or from
+a lookup of every single one of them. :func:`fetch` picks the cheapest
+of these for the includes you want.
+"""
+
+from musicbrainzngs import musicbrainz
+
+#: The number of entities a lookup returns for a subquery such as the
+#: "releases" of an artist. Longer lists are cut off.
+LOOKUP_LIST_LIMIT = 25
+
+#: Lookup includes that add a list of linked entities, by entity.
+LOOKUP_LISTS = {
+    "artist": ["recordings", "releases", "release-groups", "works"],
+    "label": ["releases"],
+    "recording": ["releases"],
+    "release-group": ["releases"],
+}
+
+#: Lookup includes that add details to the entities of those lists
+#: rather than another list.
+LIST_MODIFIERS = ["media", "discids", "artist-credits",
+                  "puids", "echoprints", "isrcs"]
+
+#: The entities each type of entity can be browsed by.
+BROWSE_FILTERS = {
+    "artists": ["recording", "release", "release-group"],
+    "labels": ["release"],
+    "recordings": ["artist", "release"],
+    "releases": ["artist", "label", "recording", "release-group"],
+    "release-groups": ["artist", "release"],
+}
+
+_LOOKUP_FUNCTIONS = {
+    "artist": "get_artist_by_id",
+    "label": "get_label_by_id",
+    "recording": "get_recording_by_id",
+    "release": "get_release_by_id",
+    "release-group": "get_release_group_by_id",
+    "work": "get_work_by_id",
+}
+
+def _singular(linked):
+    return linked[:-1]
+
+def _pages(count, page_size):
+    return max(1, -(-count // page_size))
+
+def _complete(listed, count):
+    if listed is None:
+        return False
+    if count is None:
+        # Without a count, only a list shorter than the limit is whole.
+        return len(listed) < LOOKUP_LIST_LIMIT
+    return len(listed) >= count
+
+
+class Plan(list):
+    """The calls made by :func:`fetch`, in order. Each one is a dict
+    with the name of the `function` and its `kwargs`.
+
+    `choices` holds a (linked, strategy, estimated requests) triple for
+    every linked entity type, with `strategy` one of "lookup-list" (part
+    of the lookup), "browse" or "lookup-each".
+    """
+    def __init__(self):
+        super(Plan, self).__init__()
+        self.choices = []
+
+    @property
+    def requests(self):
+        """The number of requests made."""
+        return len(self)
+
+    def __str__(self):
+        lines = ["%s: %s (~%d requests)" % choice for choice in self.choices]
+        for step in self:
+            lines.append("%s(%s)" % (step["function"], ", ".join(
+                "%s=%r" % item for item in sorted(step["kwargs"].items()))))
+        return "\n".join(lines)
+
+
+def choose(parent, linked, includes, listed=None, count=None,
+           page_size=musicbrainz.MAX_PAGE_SIZE):
+    """Return the cheapest way to get the `linked` entities (a plural
+    like "releases") of a `parent` entity with `includes` each, as a
+    (strategy, estimated requests) pair.
+
+    `listed` is the list the lookup of the parent returned for `linked`,
+    if any, and `count` the number of linked entities if known.
+    """
+    complete = _complete(listed, count)
+    if complete:
+        count = len(listed)
+    can_browse = parent in BROWSE_FILTERS.get(linked, [])
+    estimate = count if count is not None else page_size
+
+    candidates = []
+    if complete and set(includes) <= set(LIST_MODIFIERS) and \
+            set(includes) <= set(musicbrainz.VALID_INCLUDES[parent]):
+        candidates.append(("lookup-list", 0))
+    if can_browse and set(includes) <= \
+            set(musicbrainz.VALID_BROWSE_INCLUDES[linked]):
+        candidates.append(("browse", _pages(estimate, page_size)))
+    if complete:
+        candidates.append(("lookup-each", count))
+    elif can_browse:
+        candidates.append(("lookup-each",
+                           _pages(estimate, page_size) + estimate))
+    if not candidates:
+        raise musicbrainz.UsageError("can't get the %s of a %s"
+                                     % (linked, parent))
+    # The first of equally cheap candidates is the simplest.
+    return min(candidates, key=lambda candidate: candidate[1])
+
+def _call(plan, function, **kwargs):
+    plan.append({"function": function, "kwargs": kwargs})
+    return getattr(musicbrainz, function)(**kwargs)
+
+def _browse(plan, linked, parent, id, includes, page_size):
+    function = "browse_" + linked.replace("-", "_")
+    list_key = _singular(linked) + "-list"
+    count_key = _singular(linked) + "-count"
+    kwargs = {parent.replace("-", "_"): id, "limit": page_size}
+    if includes:
+        kwargs["includes"] = includes
+    entries = []
+    while True:
+        page = _call(plan, function, offset=len(entries) or None, **kwargs)
+        got = page.get(list_key, [])
+        entries.extend(got)
+        if not got or len(entries) >= page.get(count_key, len(entries)):
+            return entries
+
+def fetch(entity, id, includes=[], want={},
+          page_size=musicbrainz.MAX_PAGE_SIZE):
+    """Get the `entity` with the given `id` and `includes`, and all of
+    the linked entities in `want`.
+
+    `want` maps the plural of linked entity types (as in the browse
+    functions, e.g. "releases") to the includes wanted for each of them.
+    They end up in the "<entity>-list" of the result.
+
+    Return the result and the :class:`Plan` that was run.
+    """
+    if entity not in _LOOKUP_FUNCTIONS:
+        raise musicbrainz.UsageError("can't plan lookups of %s" % entity)
+    for linked, child_includes in want.items():
+        child = _singular(linked)
+        if child not in _LOOKUP_FUNCTIONS:
+            raise musicbrainz.UsageError("can't get %s" % linked)
+        musicbrainz._check_includes_impl(
+                child_includes, musicbrainz.VALID_INCLUDES[child])
+
+    # Everything that might come with the lookup is asked for; the
+    # lists are only used if they turn out to be complete.
+    lookup_includes = list(includes)
+    for linked, child_includes in sorted(want.items()):
+        if linked in LOOKUP_LISTS.get(entity, []):
+            if linked not in lookup_includes:
+                lookup_includes.append(linked)
+            for inc in child_includes:
+                if inc in LIST_MODIFIERS and inc not in lookup_includes \
+                        and inc in musicbrainz.VALID_INCLUDES[entity]:
+                    lookup_includes.append(inc)
+
+    plan = Plan()
+    kwargs = {"id": id}
+    if lookup_includes:
+        kwargs["includes"] = lookup_includes
+    result = _call(plan, _LOOKUP_FUNCTIONS[entity], **kwargs)[entity]
+
+    for linked, child_includes in sorted(want.items()):
+        child = _singular(linked)
+        list_key, count_key = child + "-list", child + "-count"
+        listed = result.get(list_key) \
+                if linked in LOOKUP_LISTS.get(entity, []) else None
+        if listed is None and linked in LOOKUP_LISTS.get(entity, []):
+            listed = []
+        strategy, estimate = choose(entity, linked, child_includes,
+                                    listed, result.get(count_key), page_size)
+        plan.choices.append((linked, strategy, estimate))
+
+        if strategy == "lookup-list":
+            entries = listed
+        elif strategy == "browse":
+            entries = _browse(plan, linked, entity, id, child_includes,
+                              page_size)
+        else:
+            if not _complete(listed, result.get(count_key)):
+                listed = _browse(plan, linked, entity, id, [], page_size)
+            entries = []
+            for entry in listed:
+                kwargs = {"id": entry["id"]}
+                if child_includes:
+                    kwargs["includes"] = child_includes
+                entries.append(_call(plan, _LOOKUP_FUNCTIONS[child],
+                                     **kwargs)[child])
+        result[list_key] = entries
+        result[count_key] = len(entries)
+    return result, plan
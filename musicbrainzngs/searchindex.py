@@ -0,0 +1,374 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""A local full-text index to search entities without the web service::
+
+    from musicbrainzngs import searchindex
+    index = searchindex.SearchIndex("mb-search.sqlite")
+    index.add_dump(dump_store)
+    musicbrainzngs.set_search_index(index)
+
+With an index set, the ``search_*`` functions fall back to it when the
+server can't be reached or answers with a 503, or always use it if it
+is preferred. The entities in the responses the library gets from the
+web service are added to the index as well. The results have the same
+shape as those of the web service, including the "ext:score" of each
+entity.
+
+The index is an sqlite database of the terms in the names, titles,
+aliases and artist credits (and a few more fields) of the entities
+added to it. It understands the queries the ``search_*`` functions
+build: terms, optionally in a field (``field:(terms)``), quoted phrases
+and AND or OR between them. Phrases match if all of their terms are in
+the field, in any order.
+"""
+
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+import xml.etree.ElementTree as etree
+
+from musicbrainzngs import mbxml
+from musicbrainzngs import util
+
+NS = "http://musicbrainz.org/ns/mmd-2.0#"
+EXT_NS = "http://musicbrainz.org/ns/ext#-2.0"
+
+_CREDITS = {
+    "arid": ["artist-credit/name-credit/artist/@id"],
+    "artist": ["artist-credit/name-credit/artist/name",
+               "artist-credit/name-credit/name"],
+    "artistname": ["artist-credit/name-credit/artist/name"],
+    "creditname": ["artist-credit/name-credit/name"],
+}
+
+#: The indexed fields of each entity and where their values are in the
+#: entity's XML element, as paths of child elements. A path can end
+#: with an attribute, like "@id".
+FIELDS = {
+    "artist": {
+        "arid": ["@id"], "artist": ["name"], "artistaccent": ["name"],
+        "sortname": ["sort-name"], "alias": ["alias-list/alias"],
+        "type": ["@type"], "gender": ["gender"], "country": ["country"],
+        "comment": ["disambiguation"], "begin": ["life-span/begin"],
+        "end": ["life-span/end"], "tag": ["tag-list/tag/name"],
+    },
+    "label": {
+        "laid": ["@id"], "label": ["name"], "labelaccent": ["name"],
+        "sortname": ["sort-name"], "alias": ["alias-list/alias"],
+        "type": ["@type"], "code": ["label-code"], "country": ["country"],
+        "comment": ["disambiguation"], "tag": ["tag-list/tag/name"],
+    },
+    "recording": dict(_CREDITS, **{
+        "rid": ["@id"], "recording": ["title"],
+        "recordingaccent": ["title"], "comment": ["disambiguation"],
+        "release": ["release-list/release/title"],
+        "reid": ["release-list/release/@id"],
+        "isrc": ["isrc-list/isrc/@id"], "tag": ["tag-list/tag/name"],
+    }),
+    "release": dict(_CREDITS, **{
+        "reid": ["@id"], "release": ["title"], "releaseaccent": ["title"],
+        "rgid": ["release-group/@id"], "status": ["status"],
+        "country": ["country"], "date": ["date"], "barcode": ["barcode"],
+        "asin": ["asin"], "comment": ["disambiguation"],
+        "label": ["label-info-list/label-info/label/name"],
+        "laid": ["label-info-list/label-info/label/@id"],
+        "catno": ["label-info-list/label-info/catalog-number"],
+        "tag": ["tag-list/tag/name"],
+    }),
+    "release-group": dict(_CREDITS, **{
+        "rgid": ["@id"], "releasegroup": ["title"],
+        "releasegroupaccent": ["title"], "type": ["@type"],
+        "primarytype": ["primary-type"], "comment": ["disambiguation"],
+        "release": ["release-list/release/title"],
+        "reid": ["release-list/release/@id"],
+        "tag": ["tag-list/tag/name"],
+    }),
+    "work": {
+        "wid": ["@id"], "work": ["title"], "workaccent": ["title"],
+        "alias": ["alias-list/alias"], "type": ["@type"],
+        "iswc": ["iswc", "iswc-list/iswc"], "comment": ["disambiguation"],
+        "arid": ["relation-list/relation/artist/@id"],
+        "artist": ["relation-list/relation/artist/name"],
+        "tag": ["tag-list/tag/name"],
+    },
+}
+
+#: The fields searched by terms without a field.
+DEFAULT_FIELDS = {
+    "artist": ["artist", "sortname", "alias"],
+    "label": ["label", "sortname", "alias"],
+    "recording": ["recording"],
+    "release": ["release"],
+    "release-group": ["releasegroup"],
+    "work": ["work", "alias"],
+}
+
+#: Fields whose value is matched as a whole rather than word by word.
+KEYWORD_FIELDS = frozenset([
+    "arid", "laid", "rid", "reid", "rgid", "wid", "isrc", "iswc",
+    "barcode", "asin", "catno", "code", "country", "date", "begin", "end",
+    "type", "primarytype", "gender", "status",
+])
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Fielded terms, phrases, operators and bare terms, as _do_mb_search
+# writes them. Backslashes escape the next character.
+_QUERY_RE = re.compile(r'''
+    (?:(?P<field>\w+):)?
+    (?: \((?P<group>(?:\\.|[^\\)])*)\)
+      | "(?P<phrase>(?:\\.|[^\\"])*)"
+      | (?P<term>(?:\\.|[^\s\\()"])+)
+    )''', re.VERBOSE | re.UNICODE)
+_ESCAPE_RE = re.compile(r"\\(.)")
+# Operators between the values in a group, like "reid:(id1 OR id2)".
+_GROUP_OPERATOR_RE = re.compile(r"\s+(?:OR|AND|\|\||&&)\s+")
+
+
+def _fold(text):
+    """Lower case `text` and remove its accents."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def analyze(field, text):
+    """Return the list of terms in `text` for `field`."""
+    text = util._unicode(text)
+    if field in KEYWORD_FIELDS:
+        text = text.strip().lower()
+        return [text] if text else []
+    if not field.endswith("accent"):
+        text = _fold(text)
+    else:
+        text = text.lower()
+    return _WORD_RE.findall(text)
+
+def _clause_terms(field, text, phrase):
+    """Return the list of terms of a clause's `text` for `field`. The
+    values in a group of a keyword field are analyzed one by one."""
+    if field in KEYWORD_FIELDS and not phrase:
+        terms = []
+        for value in _GROUP_OPERATOR_RE.split(text):
+            terms.extend(analyze(field, value))
+        return terms
+    return analyze(field, text)
+
+def parse_query(query):
+    """Split a Lucene query into a list of (field, terms, phrase,
+    required) clauses. `field` is None for terms without a field.
+    """
+    clauses = []
+    and_next = False
+    for match in _QUERY_RE.finditer(util._unicode(query)):
+        field = match.group("field")
+        group, phrase, term = match.group("group", "phrase", "term")
+        if field is None and term in ("AND", "OR", "NOT", "&&", "||"):
+            if term in ("AND", "&&") and clauses:
+                clauses[-1][3] = True
+                and_next = True
+            continue
+        text = _ESCAPE_RE.sub(r"\1", group if group is not None else
+                              phrase if phrase is not None else term)
+        clauses.append([field, text, phrase is not None, and_next])
+        and_next = False
+    return [tuple(clause) for clause in clauses]
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def _values(element, path):
+    steps = path.split("/")
+    elements = [element]
+    for step in steps:
+        if step.startswith("@"):
+            return [e.get(step[1:]) for e in elements if e.get(step[1:])]
+        elements = [child for e in elements for child in e
+                    if _local(child.tag) == step]
+    return [e.text for e in elements if e.text]
+
+def _entities(root):
+    """Yield the (entity, element) pairs in a web service document."""
+    if _local(root.tag) in FIELDS:
+        yield _local(root.tag), root
+        return
+    for child in root:
+        tag = _local(child.tag)
+        if tag in FIELDS:
+            yield tag, child
+        elif tag.endswith("-list") and tag[:-len("-list")] in FIELDS:
+            for entity in child:
+                yield tag[:-len("-list")], entity
+
+
+class SearchIndex(object):
+    """An inverted index of entities in the sqlite database at `path`.
+    By default it is kept in memory.
+    """
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                entity TEXT, id TEXT, body BLOB, PRIMARY KEY (entity, id));
+            CREATE TABLE IF NOT EXISTS terms (
+                entity TEXT, field TEXT, term TEXT, id TEXT,
+                frequency INTEGER, length INTEGER);
+            CREATE INDEX IF NOT EXISTS terms_by_term
+                ON terms (entity, field, term);
+            CREATE INDEX IF NOT EXISTS terms_by_id ON terms (entity, id);
+        """)
+
+    def _add_element(self, entity, element):
+        id = element.get("id")
+        if not id:
+            return False
+        # Scores in search results must not end up in the index.
+        element.attrib.pop("{%s}score" % EXT_NS, None)
+        rows = []
+        for field, paths in FIELDS[entity].items():
+            terms = []
+            for path in paths:
+                for value in _values(element, path):
+                    terms.extend(analyze(field, value))
+            for term in set(terms):
+                rows.append((entity, field, term, id, terms.count(term),
+                             len(terms)))
+        self._db.execute("DELETE FROM terms WHERE entity = ? AND id = ?",
+                         (entity, id))
+        self._db.executemany("INSERT INTO terms VALUES (?, ?, ?, ?, ?, ?)",
+                             rows)
+        self._db.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                         (entity, id, etree.tostring(element)))
+        return True
+
+    def add(self, document):
+        """Index the entities in `document`, the bytes of a web service
+        response (a lookup, browse or search result) or of a single entity
+        element. Return the number of entities indexed.
+        """
+        root = util.bytes_to_elementtree(document).getroot()
+        if not root.tag.startswith("{"):
+            # A bare element from a dump, without the namespace.
+            root = util.bytes_to_elementtree(
+                    b'<metadata xmlns="' + NS.encode("ascii") + b'">' +
+                    document + b"</metadata>").getroot()
+        added = 0
+        with self._lock:
+            for entity, element in _entities(root):
+                added += self._add_element(entity, element)
+            self._db.commit()
+        return added
+
+    def add_dump(self, store):
+        """Index every entity of a :class:`musicbrainzngs.dump.DumpStore`.
+        Return the number of entities indexed.
+        """
+        added = 0
+        for entity, id, document in store.documents():
+            if entity in FIELDS:
+                added += self.add(document)
+        return added
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                    "SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _postings(self, entity, field, term):
+        return self._db.execute(
+                "SELECT id, frequency, length FROM terms "
+                "WHERE entity = ? AND field = ? AND term = ?",
+                (entity, field, term)).fetchall()
+
+    def _score(self, entity, clauses):
+        total = self._db.execute(
+                "SELECT COUNT(*) FROM documents WHERE entity = ?",
+                (entity,)).fetchone()[0]
+        scores = {}
+        required = None
+        optional = set()
+        for field, text, phrase, must in clauses:
+            fields = [field] if field else DEFAULT_FIELDS[entity]
+            clause_scores = {}
+            clause_matches = None
+            # Which of the clause's terms each entity has, for Lucene's
+            # coordination factor.
+            matched_terms = {}
+            term_count = 1
+            for term_field in fields:
+                if term_field not in FIELDS[entity]:
+                    continue
+                field_matches = None
+                terms = _clause_terms(term_field, text, phrase)
+                term_count = max(term_count, len(set(terms)))
+                for term in terms:
+                    postings = self._postings(entity, term_field, term)
+                    idf = 1.0 + math.log(float(total + 1) /
+                                         (len(postings) + 1))
+                    ids = set()
+                    for id, frequency, length in postings:
+                        ids.add(id)
+                        matched_terms.setdefault(id, set()).add(term)
+                        clause_scores[id] = clause_scores.get(id, 0.0) + \
+                                idf * idf * math.sqrt(frequency) / \
+                                math.sqrt(length)
+                    if field_matches is None:
+                        field_matches = ids
+                    elif phrase:
+                        field_matches &= ids
+                    else:
+                        field_matches |= ids
+                if field_matches is not None:
+                    clause_matches = field_matches if clause_matches is None \
+                            else clause_matches | field_matches
+            clause_matches = clause_matches or set()
+            for id in clause_matches:
+                coord = len(matched_terms[id]) / float(term_count)
+                scores[id] = scores.get(id, 0.0) + clause_scores[id] * coord
+            if must:
+                required = clause_matches if required is None \
+                        else required & clause_matches
+            else:
+                optional |= clause_matches
+        matches = required if required is not None else optional
+        return dict((id, scores[id]) for id in matches)
+
+    def search(self, entity, query, limit=None, offset=None):
+        """Search for `entity` with a Lucene `query` and return the result
+        like :func:`musicbrainzngs.mbxml.parse_message` does for the web
+        service. Return None if `entity` can't be searched in this index.
+        """
+        if entity not in FIELDS:
+            return None
+        limit = int(limit or 25)
+        offset = int(offset or 0)
+        with self._lock:
+            scores = self._score(entity, parse_query(query))
+            ranked = sorted(scores.items(), key=lambda item: (-item[1],
+                                                              item[0]))
+            page = ranked[offset:offset + limit]
+            bodies = {}
+            for id, score in page:
+                bodies[id] = self._db.execute(
+                        "SELECT body FROM documents WHERE entity = ? "
+                        "AND id = ?", (entity, id)).fetchone()[0]
+
+        root = etree.Element("{%s}metadata" % NS)
+        entity_list = etree.SubElement(root, "{%s}%s-list" % (NS, entity))
+        entity_list.set("count", str(len(ranked)))
+        entity_list.set("offset", str(offset))
+        best = ranked[0][1] if ranked else 1.0
+        for id, score in page:
+            element = etree.fromstring(bytes(bodies[id]))
+            element.set("{%s}score" % EXT_NS,
+                        str(int(round(100 * score / best))))
+            entity_list.append(element)
+        return mbxml.parse_message(etree.tostring(root))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,240 @@
+# This file is part of the musicbrainzngs library
+# Copyright (C) Alastair Porter, Adrian Sampson, and others
+# This file is distributed under a BSD-2-Clause type license.
+# See the COPYING file for more information.
+
+"""Queue tag and rating edits one at a time and submit them in batches::
+
+    from musicbrainzngs import submitqueue
+    queue = submitqueue.SubmissionQueue("edits.sqlite")
+    queue.add_tags("recording", mbid, ["rock"])
+    queue.set_rating("artist", mbid, 80)
+    ...
+    queue.close()  # submits what is left
+
+The edits are kept in an sqlite database until they are submitted.
+Edits of the same entity are merged: its tags are the union of all the
+tags queued for it, and the last rating queued for it wins. They are
+submitted with :func:`musicbrainzngs.submit_tags` and
+:func:`musicbrainzngs.submit_ratings` in a background thread when
+`max_edits` are queued or the oldest edit waited `max_age` seconds.
+
+Edits that were queued but not submitted when the program stopped (or
+crashed) are submitted as soon as the queue is opened again.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from musicbrainzngs import musicbrainz
+
+#: The entity types that can be tagged and rated.
+ENTITY_TYPES = ("artist", "recording")
+
+_log = logging.getLogger("musicbrainzngs")
+
+
+class SubmissionQueue(object):
+    """A queue of edits kept in the sqlite database at `path`.
+
+    The edits are submitted through `client`, by default the client
+    that is current when the queue is created, in requests of at most
+    `batch_size` entities. Requests that fail are tried again
+    `retry_delay` seconds later; their edits stay in the queue.
+    """
+    def __init__(self, path=":memory:", max_edits=500, max_age=60.0,
+                 batch_size=500, retry_delay=60.0, client=None):
+        self.path = path
+        self.max_edits = max_edits
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.client = client or musicbrainz._current_client()
+
+        self._cond = threading.Condition(threading.Lock())
+        # Only one flush submits at a time.
+        self._flush_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tags (
+                entity TEXT, id TEXT, tag TEXT, seq INTEGER, queued REAL,
+                PRIMARY KEY (entity, id, tag));
+            CREATE TABLE IF NOT EXISTS ratings (
+                entity TEXT, id TEXT, rating INTEGER, seq INTEGER,
+                queued REAL, PRIMARY KEY (entity, id));
+        """)
+        # Every change of an edit gets a new sequence number, so that a
+        # flush only removes the edits as they were when it started.
+        self._seq = self._db.execute("""
+            SELECT MAX(seq) FROM (SELECT seq FROM tags
+                                  UNION ALL SELECT seq FROM ratings)
+        """).fetchone()[0] or 0
+        self._closed = False
+        self._not_before = 0.0
+        # Edits left over from the last run are replayed right away.
+        self._flush_now = self._seq > 0
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _check_entity(self, entity):
+        if entity not in ENTITY_TYPES:
+            raise musicbrainz.UsageError("can't queue edits of %s" % entity)
+        if self._closed:
+            raise musicbrainz.UsageError("the queue is closed")
+
+    def _queue(self, table, entity, id, value, column):
+        self._seq += 1
+        key = "entity = ? AND id = ?" + (" AND tag = ?"
+                                         if table == "tags" else "")
+        keys = (entity, id, value) if table == "tags" else (entity, id)
+        # A changed edit keeps the time it was first queued.
+        queued = self._db.execute(
+                "SELECT queued FROM %s WHERE %s" % (table, key),
+                keys).fetchone()
+        self._db.execute(
+                "INSERT OR REPLACE INTO %s (entity, id, %s, seq, queued) "
+                "VALUES (?, ?, ?, ?, ?)" % (table, column),
+                (entity, id, value, self._seq,
+                 queued[0] if queued else time.time()))
+
+    def add_tags(self, entity, id, tags):
+        """Queue `tags` (a list) for the `entity` ("artist" or
+        "recording") with MBID `id`."""
+        with self._cond:
+            self._check_entity(entity)
+            for tag in tags:
+                self._queue("tags", entity, id, tag, "tag")
+            self._db.commit()
+            self._edited()
+
+    def set_rating(self, entity, id, rating):
+        """Queue the `rating` (0 to 100) of the `entity` with MBID `id`,
+        replacing a rating queued for it before."""
+        with self._cond:
+            self._check_entity(entity)
+            self._queue("ratings", entity, id, int(rating), "rating")
+            self._db.commit()
+            self._edited()
+
+    def _edited(self):
+        if self._pending() >= self.max_edits:
+            self._flush_now = True
+        self._cond.notify()
+
+    def _pending(self):
+        return sum(self._db.execute("SELECT COUNT(*) FROM %s" % table)
+                   .fetchone()[0] for table in ("tags", "ratings"))
+
+    def __len__(self):
+        """The number of edits waiting to be submitted."""
+        with self._cond:
+            return self._pending()
+
+    def _due(self):
+        """The time the next flush is due, or None with an empty queue."""
+        oldest = [self._db.execute("SELECT MIN(queued) FROM %s" % table)
+                  .fetchone()[0] for table in ("tags", "ratings")]
+        oldest = [queued for queued in oldest if queued is not None]
+        if not oldest:
+            return None
+        due = 0.0 if self._flush_now else min(oldest) + self.max_age
+        return max(due, self._not_before)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    due = self._due()
+                    now = time.time()
+                    if due is not None and due <= now:
+                        break
+                    self._cond.wait(None if due is None else due - now)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                _log.exception("submitting queued edits failed")
+                with self._cond:
+                    self._not_before = time.time() + self.retry_delay
+
+    def _take(self, table, seq):
+        """Return the edits of `table` up to `seq` as a dict of
+        {entity: {id: value}}, with lists of tags as values."""
+        edits = dict((entity, {}) for entity in ENTITY_TYPES)
+        rows = self._db.execute(
+                "SELECT entity, id, %s FROM %s WHERE seq <= ? ORDER BY seq"
+                % ("tag" if table == "tags" else "rating", table), (seq,))
+        for entity, id, value in rows:
+            if table == "tags":
+                edits[entity].setdefault(id, []).append(value)
+            else:
+                edits[entity][id] = value
+        return edits
+
+    def flush(self):
+        """Submit the queued edits now and remove the ones that were
+        submitted from the queue.
+
+        Return a summary like the submit functions do with a
+        `batch_size`: "succeeded" lists the MBIDs whose edits were
+        submitted and "failed" maps the others to the exception their
+        request raised.
+        """
+        summary = {"succeeded": [], "failed": {}}
+        with self._flush_lock:
+            with self._cond:
+                seq = self._seq
+                self._flush_now = False
+                tags = self._take("tags", seq)
+                ratings = self._take("ratings", seq)
+
+            for table, edits, submit in [
+                    ("tags", tags, self.client.submit_tags),
+                    ("ratings", ratings, self.client.submit_ratings)]:
+                if not edits["artist"] and not edits["recording"]:
+                    continue
+                result = submit(edits["artist"], edits["recording"],
+                                batch_size=self.batch_size)
+                with self._cond:
+                    # Edits changed since the flush started stay queued.
+                    self._db.executemany(
+                            "DELETE FROM %s WHERE id = ? AND seq <= ?"
+                            % table,
+                            [(id, seq) for id in result["succeeded"]])
+                    self._db.commit()
+                summary["succeeded"].extend(result["succeeded"])
+                summary["failed"].update(result["failed"])
+
+            if summary["failed"]:
+                with self._cond:
+                    self._not_before = time.time() + self.retry_delay
+        return summary
+
+    def close(self, flush=True):
+        """Stop the queue, after submitting the queued edits if `flush`
+        is true. Edits that are left are kept for the next time the
+        queue is opened.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        try:
+            if flush:
+                self.flush()
+        finally:
+            with self._cond:
+                self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
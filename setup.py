@@ -6,6 +6,11 @@ from setuptools import Command
 
 from musicbrainzngs import musicbrainz
 
+install_requires = ['requests>=1.2.1']
+if sys.version_info < (2, 7):
+    # The command line interface uses argparse.
+    install_requires.append('argparse')
+
 class test(Command):
     description = "run automated tests"
     user_options = [
@@ -53,9 +58,10 @@ setup(
     url="https://github.com/alastair/python-musicbrainz-ngs",
     packages=['musicbrainzngs'],
     cmdclass={'test': test },
-    install_requires=[
-        'requests>=1.2.1'
-    ],
+    entry_points={
+        'console_scripts': ['musicbrainzngs = musicbrainzngs.cli:main'],
+    },
+    install_requires=install_requires,
     license='BSD 2-clause',
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -0,0 +1,168 @@
+"""Common support for the benchmark scripts (test/bench_*.py).
+
+The benchmarks are not part of the test suite. Each script can be run
+on its own, for example::
+
+    python -m test.bench_mbxml
+    python -m test.bench_mbxml --save-baseline
+    python -m test.bench_mbxml --check
+
+Timings are taken with :mod:`timeit`; peak memory is measured with
+:mod:`tracemalloc` where it is available.
+"""
+from __future__ import print_function
+
+import gc
+import json
+import os
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python < 3.4
+    tracemalloc = None
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "data", "bench")
+
+#: A benchmark is reported as a regression when it runs this much slower
+#: (or uses this much more memory) than the stored baseline.
+DEFAULT_TOLERANCE = 0.25
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """Time ``func`` (called without arguments) and return a dict with
+    'ops_per_sec' (from the best of `repeat` runs), 'seconds_per_op'
+    and 'peak_memory' (bytes allocated at peak during one call, or None
+    if it can't be measured).
+    """
+    timer = timeit.Timer(func)
+
+    # Find a number of calls that takes at least `min_time` per run.
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    best = min(timer.repeat(repeat, number)) / number
+
+    return {
+        "ops_per_sec": 1.0 / best if best else float("inf"),
+        "seconds_per_op": best,
+        "peak_memory": peak_memory(func),
+    }
+
+def peak_memory(func):
+    """Return the peak number of bytes allocated while calling `func`
+    once, or None if tracemalloc is not available.
+    """
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, "%s.json" % name)
+
+def load_baseline(name):
+    path = baseline_path(name)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(name, results):
+    if not os.path.isdir(BASELINE_DIR):
+        os.makedirs(BASELINE_DIR)
+    with open(baseline_path(name), "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare `results` against `baseline` (both as returned by
+    :func:`run`). Return a list of (name, ratio, regressed) tuples where
+    `ratio` is the current throughput relative to the baseline.
+    """
+    report = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        now, then = results[name], baseline[name]
+        ratio = now["ops_per_sec"] / then["ops_per_sec"]
+        regressed = ratio < 1.0 - tolerance
+        if now.get("peak_memory") and then.get("peak_memory"):
+            mem_ratio = float(now["peak_memory"]) / then["peak_memory"]
+            regressed = regressed or mem_ratio > 1.0 + tolerance
+        report.append((name, ratio, regressed))
+    return report
+
+def format_bytes(n):
+    if n is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024.0:
+            return "%.1f %s" % (n, unit)
+        n /= 1024.0
+    return "%.1f GiB" % n
+
+def run(benchmarks, **kwargs):
+    """Measure every (name, func) pair of `benchmarks` and return a dict
+    mapping names to the result of :func:`measure`.
+    """
+    results = {}
+    for name, func in benchmarks:
+        results[name] = measure(func, **kwargs)
+        print("%-72s %12.1f ops/s %12s" % (name,
+              results[name]["ops_per_sec"],
+              format_bytes(results[name]["peak_memory"])),
+              file=sys.stderr)
+    return results
+
+def main(name, benchmarks, argv=None):
+    """Command line driver shared by the benchmark scripts.
+    `benchmarks` is a list of (name, func) pairs.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the %s benchmarks."
+                                                 % name)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error if a benchmark regressed")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--json", metavar="FILE",
+                        help="also write the results to FILE")
+    parser.add_argument("-k", dest="pattern",
+                        help="only run benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    if args.pattern:
+        benchmarks = [b for b in benchmarks if args.pattern in b[0]]
+    results = run(benchmarks)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        save_baseline(name, results)
+        return 0
+
+    regressions = 0
+    for bench, ratio, regressed in compare(results, load_baseline(name),
+                                           args.tolerance):
+        if regressed:
+            regressions += 1
+        print("%-72s %6.2fx baseline%s" % (bench, ratio,
+              "  REGRESSION" if regressed else ""), file=sys.stderr)
+    if args.check and regressions:
+        return 1
+    return 0
@@ -1,8 +1,13 @@
 """Common support for the test cases."""
+import os
+import random
+import threading
 import time
+import unittest
 
 import musicbrainzngs
 from musicbrainzngs import compat
+from musicbrainzngs import musicbrainz
 
 try:
     from urllib2 import OpenerDirector
@@ -12,6 +17,14 @@ try:
     import StringIO
 except ImportError:
     import io as StringIO
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs
 
 class FakeOpener(OpenerDirector):
     """ A URL Opener that saves the URL requested and
@@ -58,3 +71,224 @@ class Timecop(object):
     def restore(self):
         time.time = self.orig['time']
         time.sleep = self.orig['sleep']
+
+
+# A local stand-in for the MusicBrainz web service.
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+NOT_FOUND = (b'<?xml version="1.0" encoding="UTF-8"?>'
+             b'<error><text>Not Found</text></error>')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _FakeServerHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        server = self.server.fake
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        server.record(self.command, url.path, query, body)
+        server.enter()
+        try:
+            self._reply(server, url, query)
+        finally:
+            server.leave()
+
+    def _reply(self, server, url, query):
+        delay = server.latency
+        if server.jitter:
+            delay += server.random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        roll = server.random.random()
+        if roll < server.unavailable_rate:
+            status, data = 503, b""
+        elif roll < server.unavailable_rate + server.error_rate:
+            status, data = 500, b""
+        else:
+            data = server.lookup(self.command, url.path, query)
+            if isinstance(data, int):
+                status, data = data, b""
+            else:
+                status = 200 if data is not None else 404
+            if data is None:
+                data = NOT_FOUND
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+
+class FakeServer(object):
+    """Serves the documents in test/data for /ws/2/ paths on a local
+    port, so the real request code can be exercised without a network.
+
+    Lookups map to test/data/<entity>/<id>[-<includes>].xml (includes
+    joined with "+" in any order) and searches to
+    test/data/search-<entity>.xml.
+    Any other path can be served by putting its body in `responses`,
+    keyed by path (e.g. "/ws/2/release/"), or a function that is given
+    the parsed query string and returns the body. A body of None is
+    answered with a 404 and an int with that status.
+
+    `latency` (seconds) is added to every response, varied by up to
+    `jitter` in either direction. `error_rate` and `unavailable_rate`
+    are the fractions of requests answered with a 500 or a 503.
+    `max_in_flight` is the most requests that were handled at once.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 unavailable_rate=0.0, seed=None, data_dir=DATA_DIR):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.unavailable_rate = unavailable_rate
+        self.random = random.Random(seed)
+        self.data_dir = data_dir
+        self.responses = {}
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._running = False
+
+    @property
+    def hostname(self):
+        """The value to pass to set_hostname()."""
+        return "%s:%d" % self._httpd.server_address[:2]
+
+    def record(self, method, path, query, body):
+        with self._lock:
+            self.requests.append((method, path, query, body))
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def lookup(self, method, path, query):
+        """Return the document for a request or None for a 404."""
+        if path in self.responses:
+            response = self.responses[path]
+            if callable(response):
+                return response(query)
+            return response
+        parts = path.split("/")
+        if parts[:3] != ["", "ws", "2"] or len(parts) < 5:
+            return None
+        entity, id = parts[3], "/".join(parts[4:])
+        if id:
+            name = id
+            if "inc" in query:
+                name = self._with_includes(entity, id,
+                                           query["inc"][0].split())
+            path = os.path.join(self.data_dir, entity, name + ".xml")
+        else:
+            path = os.path.join(self.data_dir, "search-%s.xml" % entity)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _with_includes(self, entity, id, includes):
+        """Return the name of the document of `id` with `includes`, in
+        whatever order they are in the file name."""
+        prefix = id + "-"
+        directory = os.path.join(self.data_dir, entity)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith(prefix) and name.endswith(".xml") and \
+                        sorted(name[len(prefix):-4].split("+")) == \
+                        sorted(includes):
+                    return name[:-4]
+        return prefix + "+".join(includes)
+
+    def start(self):
+        self._httpd = _ThreadingHTTPServer(("127.0.0.1", 0),
+                                           _FakeServerHandler)
+        self._httpd.fake = self
+        thread = threading.Thread(target=self._httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self._running = True
+        return self
+
+    def stop(self):
+        """Stop serving. The port stays unused, so requests to it fail;
+        stopping again does nothing."""
+        if self._running:
+            self._running = False
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+
+# The module settings a SettingsTestCase puts back.
+_SETTINGS = ("hostname", "_useragent", "_client", "do_rate_limit",
+             "limit_interval", "limit_requests")
+
+class SettingsTestCase(unittest.TestCase):
+    """A test case that puts the module's hostname, user agent and rate
+    limit settings, and the state of its rate limiter, back as they
+    were before the test, whatever it changed.
+    """
+    def setUp(self):
+        self._settings = dict((name, getattr(musicbrainz, name))
+                              for name in _SETTINGS)
+        self._limiter = (musicbrainz._send.remaining_requests,
+                         musicbrainz._send.last_call)
+
+    def tearDown(self):
+        for name, value in self._settings.items():
+            setattr(musicbrainz, name, value)
+        (musicbrainz._send.remaining_requests,
+         musicbrainz._send.last_call) = self._limiter
+
+class FakeServerTestCase(SettingsTestCase):
+    """A test case whose module functions talk to a FakeServer,
+    `self.server`, with the rate limit off. `server_options` are passed
+    to the FakeServer.
+    """
+    server_options = {}
+
+    def setUp(self):
+        super(FakeServerTestCase, self).setUp()
+        self.server = FakeServer(**self.server_options).start()
+        musicbrainzngs.set_useragent("test", "1")
+        musicbrainzngs.set_hostname(self.server.hostname)
+        musicbrainzngs.set_rate_limit(False)
+
+    def tearDown(self):
+        self.server.stop()
+        super(FakeServerTestCase, self).tearDown()
+
+
+def release_list_page(query, total):
+    """Body of one page of a browse over `total` releases, for
+    FakeServer.responses. Release number i has the id "release-i".
+    """
+    limit = int(query.get("limit", ["25"])[0])
+    offset = int(query.get("offset", ["0"])[0])
+    releases = "".join('<release id="release-%d"><title>Release %d</title>'
+                       '</release>' % (i, i)
+                       for i in range(offset, min(offset + limit, total)))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+            '<release-list count="%d" offset="%d">%s</release-list>'
+            '</metadata>' % (total, offset, releases)).encode("utf-8")
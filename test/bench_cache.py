@@ -0,0 +1,133 @@
+"""Cache hit rate of a replayed trace of queries.
+
+Generates a trace of lookups, browses and searches the way applications
+make them: a few popular queries asked often and many asked once, each
+time with includes, filter values and search fields in whatever order
+and case the caller happened to use. The trace is replayed through a
+response cache against a local FakeServer, and the hit rate is compared
+with what it would be if every spelling of a query was a request of its
+own::
+
+    python -m test.bench_cache [--queries 300] [--requests 5000] [--seed 1]
+"""
+from __future__ import print_function
+
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs.cache import MemoryCache
+from test import _common
+
+INCLUDES = ["aliases", "tags", "ratings", "release-groups", "url-rels"]
+TYPES = ["album", "ep", "single"]
+WORDS = ["blue", "night", "river", "city", "gold", "fire", "song", "love"]
+
+
+def logical_queries(count, rng):
+    """Return `count` queries as (function name, arguments) pairs."""
+    queries = []
+    for i in range(count):
+        mbid = "%08x-0000-4000-8000-000000000000" % i
+        kind = rng.choice(["lookup", "browse", "search"])
+        if kind == "lookup":
+            queries.append(("get_artist_by_id", {
+                "id": mbid,
+                "includes": ["releases"] + rng.sample(INCLUDES, 2),
+                "release_type": rng.sample(TYPES, 2)}))
+        elif kind == "browse":
+            queries.append(("browse_releases", {
+                "artist": mbid, "includes": ["labels", "media"],
+                "release_status": ["official"], "limit": 100}))
+        else:
+            queries.append(("search_recordings", {
+                "recording": " ".join(rng.sample(WORDS, 2)),
+                "artist": rng.choice(WORDS), "limit": 25}))
+    return queries
+
+def spelling(name, kwargs, rng):
+    """Return `kwargs` as one caller might have written them."""
+    kwargs = dict(kwargs)
+    for key in ("includes", "release_type", "release_status"):
+        if key in kwargs:
+            values = list(kwargs[key])
+            rng.shuffle(values)
+            if key != "includes" and rng.random() < 0.3:
+                values = [value.capitalize() for value in values]
+            kwargs[key] = values
+    if name.startswith("search_"):
+        for key in ("recording", "artist"):
+            if rng.random() < 0.3:
+                kwargs[key] = kwargs[key].title()
+            if rng.random() < 0.2:
+                kwargs[key] = kwargs[key].replace(" ", "  ") + " "
+        items = list(kwargs.items())
+        rng.shuffle(items)
+        kwargs = dict(items)
+    return kwargs
+
+def trace(queries, requests, rng):
+    """Return `requests` calls, with query i asked about 1/(i+1) as
+    often as the first one."""
+    popular = logical_queries(queries, rng)
+    cumulative = []
+    total = 0.0
+    for i in range(queries):
+        total += 1.0 / (i + 1)
+        cumulative.append(total)
+    result = []
+    for _ in range(requests):
+        i = bisect.bisect(cumulative, rng.random() * total)
+        name, kwargs = popular[min(i, queries - 1)]
+        result.append((name, spelling(name, kwargs, rng)))
+    return result
+
+def raw_key(name, kwargs):
+    """The request as it is spelled, like the URLs used to be built."""
+    return (name, tuple((key, tuple(value) if isinstance(value, list)
+                         else value) for key, value in kwargs.items()))
+
+def replay(calls):
+    server = _common.FakeServer().start()
+    server.lookup = lambda method, path, query: b"<metadata/>"
+    musicbrainzngs.set_useragent("bench_cache", "1")
+    musicbrainzngs.set_hostname(server.hostname)
+    musicbrainzngs.set_rate_limit(False)
+    musicbrainzngs.set_cache(MemoryCache(max_entries=len(calls)))
+    try:
+        for name, kwargs in calls:
+            getattr(musicbrainzngs, name)(**kwargs)
+        return len(server.requests)
+    finally:
+        server.stop()
+        musicbrainzngs.set_cache(None)
+        musicbrainzngs.set_hostname("musicbrainz.org")
+        musicbrainzngs.set_rate_limit(True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=300,
+                        help="distinct logical queries")
+    parser.add_argument("--requests", type=int, default=5000,
+                        help="calls in the trace")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    calls = trace(args.queries, args.requests, random.Random(args.seed))
+    spellings = len(set(raw_key(name, kwargs) for name, kwargs in calls))
+    sent = replay(calls)
+    print(json.dumps({
+        "calls": len(calls),
+        "spellings": spellings,
+        "requests": sent,
+        "hit_rate_by_spelling": 1.0 - float(spellings) / len(calls),
+        "hit_rate": 1.0 - float(sent) / len(calls),
+    }, indent=2, sort_keys=True))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""How long `import musicbrainzngs` takes.
+
+Runs the import in new interpreters with -X importtime (Python 3.7 and
+later) and reports the best cumulative time of musicbrainzngs. The
+first run fills a temporary bytecode cache (PYTHONPYCACHEPREFIX, Python
+3.8 and later) that the timed runs read, so compiling the source is not
+counted::
+
+    python -m test.bench_import [--runs 5] [--budget 0.05]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def import_time(pycache):
+    """Import musicbrainzngs in a new interpreter and return the
+    cumulative time of the import in seconds."""
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONPYCACHEPREFIX=pycache)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    process = subprocess.Popen([sys.executable, "-X", "importtime", "-c",
+                                "import musicbrainzngs"],
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, env=env, cwd=ROOT)
+    _, err = process.communicate()
+    match = re.search(r"\|\s*(\d+) \| musicbrainzngs\s*$",
+                      err.decode("utf-8"), re.MULTILINE)
+    return int(match.group(1)) / 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, metavar="SECONDS",
+                        help="exit with an error if the best import takes "
+                        "longer")
+    parser.add_argument("--json", metavar="FILE",
+                        help="also write the results to FILE")
+    args = parser.parse_args(argv)
+    if sys.version_info < (3, 8):
+        parser.error("needs Python 3.8 or later")
+
+    pycache = tempfile.mkdtemp()
+    try:
+        import_time(pycache)
+        times = [import_time(pycache) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(pycache)
+    results = {"best": min(times), "median": sorted(times)[len(times) // 2]}
+    print("import musicbrainzngs: best %.1f ms, median %.1f ms" % (
+          results["best"] * 1000, results["median"] * 1000))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.budget is not None and results["best"] > args.budget:
+        print("over the budget of %.1f ms" % (args.budget * 1000),
+              file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
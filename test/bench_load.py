@@ -0,0 +1,136 @@
+"""End-to-end load harness against a local FakeServer.
+
+Runs a mix of lookups and searches through the public API and reports
+throughput and p50/p95/p99 latency for the sequential and threaded
+client paths, with rate limiting on and off::
+
+    python -m test.bench_load --requests 200 --threads 8 --latency 0.02
+
+The server's behaviour is set with --latency, --jitter, --error-rate
+and --unavailable-rate; --rate sets the limiter's requests per second
+for the rate-limited runs.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from test import _common
+
+# Calls that the fixtures in test/data can answer.
+WORKLOAD = [
+    (musicbrainzngs.get_artist_by_id,
+     ("0e43fe9d-c472-4b62-be9e-55f971a023e1", ["aliases"])),
+    (musicbrainzngs.get_label_by_id,
+     ("022fe361-596c-43a0-8e22-bad712bb9548", ["aliases"])),
+    (musicbrainzngs.get_release_by_id,
+     ("212895ca-ee36-439a-a824-d2620cd10461", ["recordings"])),
+    (musicbrainzngs.get_release_by_id,
+     ("fbe4490e-e366-4da2-a37a-82162d2f41a9",
+      ["recordings", "artist-credits"])),
+    (musicbrainzngs.get_release_group_by_id,
+     ("f52bc6a1-c848-49e6-85de-f8f53459a624",)),
+    (musicbrainzngs.get_work_by_id,
+     ("3d7c7cd2-da79-37f4-98b8-ccfb1a4ac6c4", ["aliases"])),
+    (musicbrainzngs.search_artists, ("Dynamo Go",)),
+    (musicbrainzngs.search_releases, ("Affordable Pop Music",)),
+]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return float("nan")
+    k = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values))) - 1))
+    return values[k]
+
+def _timed_call(i):
+    func, args = WORKLOAD[i % len(WORKLOAD)]
+    start = time.time()
+    try:
+        func(*args)
+        ok = True
+    except musicbrainzngs.WebServiceError:
+        ok = False
+    return time.time() - start, ok
+
+def run(requests, threads):
+    """Issue `requests` calls on `threads` threads (0 means in the
+    calling thread) and return a dict of throughput and latency figures.
+    """
+    start = time.time()
+    if threads:
+        pool = ThreadPool(threads)
+        try:
+            samples = pool.map(_timed_call, range(requests))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        samples = [_timed_call(i) for i in range(requests)]
+    elapsed = time.time() - start
+
+    latencies = sorted(s[0] for s in samples)
+    return {
+        "requests": requests,
+        "errors": len([s for s in samples if not s[1]]),
+        "seconds": elapsed,
+        "throughput": requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=20.0,
+                        help="requests per second when rate limiting is on")
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--unavailable-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="FILE",
+                        help="also write the results to FILE")
+    args = parser.parse_args(argv)
+
+    server = _common.FakeServer(latency=args.latency, jitter=args.jitter,
+                                error_rate=args.error_rate,
+                                unavailable_rate=args.unavailable_rate,
+                                seed=args.seed).start()
+    musicbrainzngs.set_useragent("bench_load", "0.1")
+    musicbrainzngs.set_hostname(server.hostname)
+
+    results = {}
+    try:
+        for limited in (False, True):
+            if limited:
+                musicbrainzngs.set_rate_limit(1.0, args.rate)
+            else:
+                musicbrainzngs.set_rate_limit(False)
+            for mode, threads in (("sync", 0), ("threaded", args.threads)):
+                name = "%s, rate limit %s" % (mode, "on" if limited else "off")
+                r = results[name] = run(args.requests, threads)
+                print("%-28s %8.1f req/s  p50 %7.1f ms  p95 %7.1f ms  "
+                      "p99 %7.1f ms  %d errors" % (name, r["throughput"],
+                      r["p50"] * 1000, r["p95"] * 1000, r["p99"] * 1000,
+                      r["errors"]))
+    finally:
+        server.stop()
+        musicbrainzngs.set_rate_limit(True)
+        musicbrainzngs.set_hostname("musicbrainz.org")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
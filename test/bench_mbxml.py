@@ -0,0 +1,72 @@
+"""Benchmarks for mbxml.parse_message.
+
+Times the parser on every fixture in test/data and on synthetically
+scaled documents (a release with 1,000 tracks, searches with 10,000
+hits) and compares the results with test/data/bench/mbxml.json::
+
+    python -m test.bench_mbxml [--save-baseline] [--check]
+"""
+import copy
+import glob
+import os
+import sys
+import xml.etree.ElementTree as ET
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from musicbrainzngs import mbxml
+from test import _bench
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+NS = "{http://musicbrainz.org/ns/mmd-2.0#}"
+
+
+def fixtures():
+    """Return a list of (name, bytes) for every XML file in test/data."""
+    paths = glob.glob(os.path.join(DATA_DIR, "*.xml"))
+    paths += glob.glob(os.path.join(DATA_DIR, "*", "*.xml"))
+    result = []
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            result.append((os.path.relpath(path, DATA_DIR), f.read()))
+    return result
+
+def scale_list(document, list_tag, count):
+    """Return `document` with the children of its first `list_tag`
+    element repeated until there are `count` of them.
+    """
+    ET.register_namespace("", NS[1:-1])
+    ET.register_namespace("ext", "http://musicbrainz.org/ns/ext#-2.0")
+    root = ET.fromstring(document)
+    parent = next(root.iter(NS + list_tag))
+    children = list(parent)
+    for child in children:
+        parent.remove(child)
+    for i in range(count):
+        parent.append(copy.deepcopy(children[i % len(children)]))
+    parent.set("count", str(count))
+    return ET.tostring(root, "utf-8")
+
+def synthetic():
+    """Return a list of (name, bytes) of scaled documents."""
+    def read(name):
+        with open(os.path.join(DATA_DIR, name), "rb") as f:
+            return f.read()
+    release = read(os.path.join("release",
+            "fbe4490e-e366-4da2-a37a-82162d2f41a9-recordings+artist-credits.xml"))
+    return [
+        ("synthetic/release-1000-tracks",
+         scale_list(release, "track-list", 1000)),
+        ("synthetic/search-artist-10000-hits",
+         scale_list(read("search-artist.xml"), "artist-list", 10000)),
+        ("synthetic/search-recording-10000-hits",
+         scale_list(read("search-recording.xml"), "recording-list", 10000)),
+    ]
+
+def benchmarks():
+    result = []
+    for name, document in fixtures() + synthetic():
+        # Bind the document now, not when the lambda is called.
+        result.append((name, lambda d=document: mbxml.parse_message(d)))
+    return result
+
+if __name__ == "__main__":
+    sys.exit(_bench.main("mbxml", benchmarks()))
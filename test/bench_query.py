@@ -0,0 +1,50 @@
+"""Micro-benchmarks of the per-call overhead of building requests.
+
+Times the validation and argument building of lookups, browses and
+searches with the request itself replaced by a function that returns
+at once, as it would be against a fast local mirror::
+
+    python -m test.bench_query [--save-baseline] [--check]
+"""
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from musicbrainzngs import musicbrainz
+from test import _bench
+
+MBID = "b5a5f6c8-05a6-4d6b-9f2a-1d8c5e6b7a90"
+
+
+def _no_request(path, method="GET", auth_required=False,
+                client_required=False, args=None, data=None, body=None):
+    return {}
+
+def _without_requests(func):
+    def run():
+        original = musicbrainz._mb_request
+        musicbrainz._mb_request = _no_request
+        try:
+            func()
+        finally:
+            musicbrainz._mb_request = original
+    return run
+
+def benchmarks():
+    cases = [
+        ("lookup release 6 includes", lambda: musicbrainz.get_release_by_id(
+            MBID, ["artists", "labels", "recordings", "release-groups",
+                   "media", "artist-credits"])),
+        ("lookup artist with filters", lambda: musicbrainz.get_artist_by_id(
+            MBID, ["releases", "release-groups"], release_status=["official"],
+            release_type=["album", "ep"])),
+        ("browse releases", lambda: musicbrainz.browse_releases(
+            artist=MBID, includes=["labels", "recordings"],
+            release_type=["album"], limit=100)),
+        ("search recordings 3 fields", lambda: musicbrainz.search_recordings(
+            recording="Stairway (to) Heaven!", artist="Led Zeppelin",
+            release="IV", limit=50)),
+    ]
+    return [(name, _without_requests(func)) for name, func in cases]
+
+if __name__ == "__main__":
+    sys.exit(_bench.main("query", benchmarks()))
@@ -0,0 +1,135 @@
+"""Accuracy and overhead of the rate limiter under contention.
+
+Calls a no-op function decorated with musicbrainz._rate_limit from 1, 8
+and 64 threads at once (in real time) and reports the achieved rate
+against the configured one, the jitter of the intervals between calls,
+how long the limiter's lock is held and the CPU time spent::
+
+    python -m test.bench_ratelimit [--rate 50] [--calls 200]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import musicbrainz
+
+try:
+    process_time = time.process_time
+except AttributeError:
+    # Python < 3.3
+    process_time = time.clock
+
+
+class _TimedLock(object):
+    """A Lock that records how long it was held each time."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.held = []
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._acquired = time.time()
+
+    def __exit__(self, *exc):
+        self.held.append(time.time() - self._acquired)
+        self._lock.release()
+
+
+def contention(threads, calls, interval, requests):
+    """Make `calls` limited calls spread over `threads` threads with the
+    limiter set to `requests` per `interval` seconds. Return a dict of
+    measurements.
+    """
+    stamps = []
+    def record():
+        stamps.append(time.time())
+
+    musicbrainzngs.set_rate_limit(interval, requests)
+    limited = musicbrainz._rate_limit(record)
+    limited.lock = _TimedLock()
+
+    def worker(n):
+        for _ in range(n):
+            limited()
+    shares = [calls // threads + (1 if i < calls % threads else 0)
+              for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(n,)) for n in shares]
+
+    cpu = process_time()
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.time() - start
+    cpu = process_time() - cpu
+
+    # The first `requests` calls are a free burst; the steady state rate
+    # is measured from the calls after it.
+    stamps.sort()
+    burst = min(int(requests), len(stamps) - 1)
+    steady = stamps[burst:]
+    span = steady[-1] - stamps[0] if len(steady) > 1 else 0.0
+    achieved = (len(stamps) - burst) / span if span else float("inf")
+    configured = requests / float(interval)
+
+    gaps = [b - a for a, b in zip(steady, steady[1:])]
+    if gaps:
+        mean = sum(gaps) / len(gaps)
+        jitter = math.sqrt(sum((g - mean) ** 2 for g in gaps) / len(gaps))
+    else:
+        jitter = 0.0
+
+    held = limited.lock.held
+    return {
+        "threads": threads,
+        "calls": len(stamps),
+        "seconds": elapsed,
+        "configured_rate": configured,
+        "achieved_rate": achieved,
+        "jitter": jitter,
+        "lock_hold_mean": sum(held) / len(held),
+        "lock_hold_max": max(held),
+        "cpu_seconds": cpu,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=50.0,
+                        help="configured requests per second")
+    parser.add_argument("--burst", type=int, default=5,
+                        help="requests allowed per interval")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", default="1,8,64")
+    parser.add_argument("--json", metavar="FILE",
+                        help="also write the results to FILE")
+    args = parser.parse_args(argv)
+
+    results = []
+    try:
+        for threads in [int(t) for t in args.threads.split(",")]:
+            r = contention(threads, args.calls, args.burst / args.rate,
+                           args.burst)
+            results.append(r)
+            print("%3d threads: %7.2f/%7.2f req/s  jitter %6.2f ms  "
+                  "lock held %6.2f ms (max %6.2f)  cpu %6.3f s" % (
+                  threads, r["achieved_rate"], r["configured_rate"],
+                  r["jitter"] * 1000, r["lock_hold_mean"] * 1000,
+                  r["lock_hold_max"] * 1000, r["cpu_seconds"]))
+    finally:
+        musicbrainzngs.set_rate_limit(1.0, 1)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
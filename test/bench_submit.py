@@ -0,0 +1,86 @@
+"""Benchmarks for building submission bodies.
+
+Builds tag, ISRC and rating requests for 100,000 entities with the
+mbxml.make_*_request writers and, for comparison, with an ElementTree
+tree serialized by ET.tostring (how the bodies used to be built), and
+reports the time and peak memory of each::
+
+    python -m test.bench_submit [--save-baseline] [--check]
+"""
+import io
+import os
+import sys
+import xml.etree.ElementTree as ET
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from musicbrainzngs import mbxml
+from test import _bench
+
+NS = "http://musicbrainz.org/ns/mmd-2.0#"
+ITEMS = 100000
+
+
+def etree_tag_request(artist2tags, recording2tags):
+    root = ET.Element("{%s}metadata" % NS)
+    for name, mapping in (("recording", recording2tags),
+                          ("artist", artist2tags)):
+        entity_list = ET.SubElement(root, "{%s}%s-list" % (NS, name))
+        for id, tags in mapping.items():
+            entity = ET.SubElement(entity_list, "{%s}%s" % (NS, name))
+            entity.set("{%s}id" % NS, id)
+            taglist = ET.SubElement(entity, "{%s}user-tag-list" % NS)
+            for tag in tags:
+                usertag = ET.SubElement(taglist, "{%s}user-tag" % NS)
+                ET.SubElement(usertag, "{%s}name" % NS).text = tag
+    return ET.tostring(root, "utf-8")
+
+def etree_isrc_request(recording2isrcs):
+    root = ET.Element("{%s}metadata" % NS)
+    rec_list = ET.SubElement(root, "{%s}recording-list" % NS)
+    for rec, isrcs in recording2isrcs.items():
+        rec_xml = ET.SubElement(rec_list, "{%s}recording" % NS)
+        rec_xml.set("{%s}id" % NS, rec)
+        isrc_list = ET.SubElement(rec_xml, "{%s}isrc-list" % NS)
+        isrc_list.set("{%s}count" % NS, str(len(isrcs)))
+        for isrc in isrcs:
+            ET.SubElement(isrc_list, "{%s}isrc" % NS).set("{%s}id" % NS, isrc)
+    return ET.tostring(root, "utf-8")
+
+def etree_rating_request(artist2rating, recording2rating):
+    root = ET.Element("{%s}metadata" % NS)
+    for name, mapping in (("recording", recording2rating),
+                          ("artist", artist2rating)):
+        entity_list = ET.SubElement(root, "{%s}%s-list" % (NS, name))
+        for id, rating in mapping.items():
+            entity = ET.SubElement(entity_list, "{%s}%s" % (NS, name))
+            entity.set("{%s}id" % NS, id)
+            ET.SubElement(entity, "{%s}user-rating" % NS).text = str(rating)
+    return ET.tostring(root, "utf-8")
+
+
+def mbid(i):
+    return "%08x-0000-4000-8000-%012x" % (i, i)
+
+def benchmarks(items=ITEMS):
+    tags = dict((mbid(i), ["rock", "r&b"]) for i in range(items))
+    isrcs = dict((mbid(i), ["GBAAA%07d" % i]) for i in range(items))
+    ratings = dict((mbid(i), i % 101) for i in range(items))
+    cases = [
+        ("tags", (tags, {}), mbxml.make_tag_request, etree_tag_request),
+        ("isrcs", (isrcs,), mbxml.make_isrc_request, etree_isrc_request),
+        ("ratings", ({}, ratings), mbxml.make_rating_request,
+         etree_rating_request),
+    ]
+    result = []
+    for name, args, make, reference in cases:
+        # The writer has to produce what ElementTree does.
+        assert make(*args) == reference(*args), name
+        label = "%s %dk" % (name, items // 1000)
+        result.append(("%s writer" % label, lambda m=make, a=args: m(*a)))
+        result.append(("%s writer to file" % label,
+                       lambda m=make, a=args: m(*(a + (io.BytesIO(),)))))
+        result.append(("%s etree" % label,
+                       lambda r=reference, a=args: r(*a)))
+    return result
+
+if __name__ == "__main__":
+    sys.exit(_bench.main("submit", benchmarks()))
@@ -0,0 +1,149 @@
+import unittest
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs.cache import MemoryCache
+from test import _common
+from test._common import Timecop
+
+
+class MemoryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cop = Timecop()
+        self.cop.install()
+
+    def tearDown(self):
+        self.cop.restore()
+
+    def test_get_set(self):
+        cache = MemoryCache()
+        self.assertEqual(None, cache.get("a"))
+        cache.set("a", b"1")
+        self.assertEqual(b"1", cache.get("a"))
+
+    def test_least_recently_used_dropped(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")
+        cache.set("c", b"3")
+        self.assertEqual(b"1", cache.get("a"))
+        self.assertEqual(None, cache.get("b"))
+        self.assertEqual(2, len(cache))
+
+    def test_many_uses(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        for _ in range(100):
+            cache.get("b")
+            cache.get("a")
+        cache.set("c", b"3")
+        self.assertEqual(None, cache.get("b"))
+        self.assertEqual(b"1", cache.get("a"))
+        cache.set("d", b"4")
+        self.assertEqual(None, cache.get("c"))
+        self.assertEqual(2, len(cache))
+
+    def test_ttl(self):
+        cache = MemoryCache(ttl=10)
+        cache.set("a", b"1")
+        self.cop.sleep(5)
+        self.assertEqual(b"1", cache.get("a"))
+        self.cop.sleep(6)
+        self.assertEqual(None, cache.get("a"))
+
+    def test_soft_ttl(self):
+        cache = MemoryCache(ttl=10, soft_ttl=5)
+        cache.set("a", b"1")
+        self.assertFalse(cache.stale("a"))
+        self.cop.sleep(6)
+        self.assertEqual(b"1", cache.get("a"))
+        self.assertTrue(cache.stale("a"))
+        self.assertFalse(cache.stale("b"))
+        cache.set("a", b"2")
+        self.assertFalse(cache.stale("a"))
+
+    def test_negative_ttl_longer(self):
+        cache = MemoryCache(ttl=5, negative_ttl=10)
+        cache.set("a", b"1")
+        cache.set_missing("b")
+        self.cop.sleep(6)
+        self.assertEqual(None, cache.get("a"))
+        self.assertEqual(None, cache.get("b"))
+        self.assertTrue(cache.missing("b"))
+        self.cop.sleep(5)
+        self.assertFalse(cache.missing("b"))
+        self.assertEqual(0, len(cache))
+
+    def test_negative_ttl_shorter(self):
+        cache = MemoryCache(ttl=10, negative_ttl=5)
+        cache.set("a", b"1")
+        cache.set_missing("b")
+        self.cop.sleep(6)
+        self.assertFalse(cache.missing("a"))
+        self.assertFalse(cache.missing("b"))
+        self.assertEqual(b"1", cache.get("a"))
+        self.cop.sleep(5)
+        self.assertEqual(None, cache.get("a"))
+        self.assertEqual(0, len(cache))
+
+
+class StaleWhileRevalidateTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(StaleWhileRevalidateTest, self).setUp()
+        self.name = "A"
+        self.server.lookup = lambda method, path, query: (
+            '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+            '<artist id="a"><name>%s</name></artist></metadata>'
+            % self.name).encode("ascii")
+        self.cache = MemoryCache(ttl=60, soft_ttl=0.1)
+        musicbrainzngs.set_cache(self.cache)
+
+    def tearDown(self):
+        musicbrainzngs.set_cache(None)
+        super(StaleWhileRevalidateTest, self).tearDown()
+
+    def name_of_a(self):
+        return musicbrainzngs.get_artist_by_id("a")["artist"]["name"]
+
+    def wait_for_refresh(self):
+        deadline = time.time() + 5
+        while len(musicbrainzngs.musicbrainz._refresher) and \
+                time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_refresh(self):
+        self.assertEqual("A", self.name_of_a())
+        self.name = "B"
+        time.sleep(0.15)
+        # The stale name is returned at once, and fetched again.
+        self.assertEqual("A", self.name_of_a())
+        self.wait_for_refresh()
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual("B", self.name_of_a())
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_refresh_waits_for_idle_limiter(self):
+        musicbrainzngs.set_rate_limit(0.5, 1)
+        self.name_of_a()
+        time.sleep(0.15)
+        start = time.time()
+        self.name_of_a()
+        self.name_of_a()
+        self.assertTrue(time.time() - start < 0.1)
+        self.wait_for_refresh()
+        # One refresh, once the request of the lookup was half a second ago.
+        self.assertEqual(2, len(self.server.requests))
+        self.assertTrue(time.time() - start > 0.3)
+
+    def test_hard_ttl(self):
+        self.cache.ttl = 0.1
+        self.cache.soft_ttl = 0.05
+        self.name_of_a()
+        self.name = "B"
+        time.sleep(0.15)
+        self.assertEqual("B", self.name_of_a())
+        self.assertEqual(2, len(self.server.requests))
@@ -0,0 +1,124 @@
+import unittest
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from musicbrainzngs import cli
+from musicbrainzngs import compat
+from test import _common
+
+RELEASES = ["833d4c3a-2635-4b7a-83c4-4e560588f23a",
+            "fbe4490e-e366-4da2-a37a-82162d2f41a9"]
+MISSING = "00000000-0000-0000-0000-000000000000"
+
+
+class LookupTest(unittest.TestCase):
+    def setUp(self):
+        self.server = _common.FakeServer().start()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def run_cli(self, ids, *args):
+        stdout, stderr = compat.StringIO(), compat.StringIO()
+        argv = ["lookup", "release", "--inc", "recordings,artist-credits",
+                "--hostname", self.server.hostname, "--no-rate-limit",
+                "--concurrency", "2"] + list(args)
+        code = cli.main(argv, compat.StringIO("\n".join(ids) + "\n"),
+                        stdout, stderr)
+        lines = [json.loads(l) for l in stdout.getvalue().splitlines()]
+        return code, lines, stderr.getvalue()
+
+    def test_lookup(self):
+        code, lines, summary = self.run_cli(RELEASES + [RELEASES[0]])
+        self.assertEqual(0, code)
+        self.assertEqual(sorted(RELEASES), sorted(l["id"] for l in lines))
+        for line in lines:
+            self.assertEqual(line["id"], line["result"]["id"])
+        # Duplicates are only looked up once.
+        self.assertEqual(2, len(self.server.requests))
+        self.assertTrue(summary.startswith("done: 2 looked up (0 errors)"))
+
+    def test_error(self):
+        code, lines, summary = self.run_cli([MISSING])
+        self.assertEqual(1, code)
+        self.assertEqual(MISSING, lines[0]["id"])
+        self.assertTrue("404" in lines[0]["error"])
+
+    def test_resume(self):
+        checkpoint = os.path.join(self.dir, "checkpoint")
+        code, lines, _ = self.run_cli(RELEASES[:1] + [MISSING],
+                                      "--checkpoint", checkpoint)
+        self.assertEqual(2, len(lines))
+        # The failed lookup is retried, the finished one skipped.
+        code, lines, summary = self.run_cli(RELEASES + [MISSING],
+                                            "--checkpoint", checkpoint)
+        self.assertEqual(sorted([RELEASES[1], MISSING]),
+                         sorted(l["id"] for l in lines))
+        self.assertTrue("1 skipped" in summary)
+        with open(checkpoint) as f:
+            self.assertEqual(sorted(RELEASES), sorted(f.read().split()))
+
+    def test_bad_include(self):
+        stderr = compat.StringIO()
+        self.assertRaises(SystemExit, cli.main,
+                          ["lookup", "release", "--inc", "nope"],
+                          compat.StringIO(""), compat.StringIO(), stderr)
+
+    def test_skipped_counts_input(self):
+        checkpoint = os.path.join(self.dir, "checkpoint")
+        with open(checkpoint, "w") as f:
+            f.write("\n".join(RELEASES + [MISSING]) + "\n")
+        # Only the IDs that were read and left out are skipped.
+        code, lines, summary = self.run_cli(RELEASES[:1] * 2,
+                                            "--checkpoint", checkpoint)
+        self.assertEqual([], lines)
+        self.assertTrue("0 looked up (0 errors), 1 skipped" in summary)
+
+
+class _SlowClient(object):
+    def get_release_by_id(self, id, includes):
+        time.sleep(0.2)
+        return {"release": {"id": id}}
+
+
+class _Recorder(object):
+    """A file that interrupts the main thread when the first line is
+    written, and records the writes made after it was closed.
+    """
+    def __init__(self):
+        self.closed = False
+        self.lines = []
+        self.late = []
+
+    def write(self, line):
+        if self.closed:
+            self.late.append(line)
+            return
+        if not self.lines:
+            os.kill(os.getpid(), signal.SIGINT)
+        self.lines.append(line)
+
+    def flush(self):
+        pass
+
+
+class InterruptTest(unittest.TestCase):
+    def test_no_writes_after_interrupt(self):
+        if sys.version_info < (3, 2):
+            # Waiting for a thread can't be interrupted on Python 2.
+            return
+        out, checkpoint = _Recorder(), _Recorder()
+        # The interrupt comes while lookup() waits for the writer.
+        self.assertRaises(KeyboardInterrupt, cli.lookup, _SlowClient(),
+                          "release", RELEASES, [], out, checkpoint)
+        out.closed = checkpoint.closed = True
+        # The lookup that was running finishes, and is dropped.
+        time.sleep(0.4)
+        self.assertEqual([], out.late + checkpoint.late)
@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import musicbrainz
+from test import _common
+
+RELEASE = "833d4c3a-2635-4b7a-83c4-4e560588f23a"
+INCLUDES = ["recordings", "artist-credits"]
+
+
+class ClientTest(_common.FakeServerTestCase):
+    def setUp(self):
+        # The module's functions use self.other.
+        super(ClientTest, self).setUp()
+        self.other = self.server
+        self.mirror = _common.FakeServer().start()
+        self.client = musicbrainzngs.MusicBrainzClient(self.mirror.hostname)
+        self.client.set_useragent("test", "1")
+        self.client.set_rate_limit(False)
+        musicbrainzngs.set_useragent("default", "1")
+
+    def tearDown(self):
+        self.mirror.stop()
+        super(ClientTest, self).tearDown()
+
+    def test_own_settings(self):
+        other = musicbrainzngs.MusicBrainzClient(self.other.hostname)
+        self.assertRaises(musicbrainzngs.UsageError,
+                          other.get_release_by_id, RELEASE, INCLUDES)
+        other.set_useragent("other", "2")
+        other.get_release_by_id(RELEASE, INCLUDES)
+        release = self.client.get_release_by_id(RELEASE, INCLUDES)
+        self.assertEqual(RELEASE, release["release"]["id"])
+        self.assertEqual(1, len(self.mirror.requests))
+        self.assertEqual(1, len(self.other.requests))
+        # The module's settings are untouched.
+        self.assertEqual(self.other.hostname, musicbrainz.hostname)
+        self.assertEqual(self.mirror.hostname, self.client.hostname)
+
+    def test_own_rate_limit(self):
+        # The default client allows one request per second, this one
+        # has no limit at all.
+        musicbrainzngs.set_rate_limit(1.0, 1)
+        musicbrainzngs.get_release_by_id(RELEASE, INCLUDES)
+        start = time.time()
+        for _ in range(10):
+            self.client.get_release_by_id(RELEASE, INCLUDES)
+        self.assertTrue(time.time() - start < 0.9)
+        self.assertTrue(self.client._send is not musicbrainz._send)
+
+    def test_own_listeners(self):
+        events = []
+        self.client.add_request_listener(
+                lambda event, info: events.append(info["url"]))
+        musicbrainzngs.get_release_by_id(RELEASE, INCLUDES)
+        self.assertEqual([], events)
+        self.client.get_release_by_id(RELEASE, INCLUDES)
+        self.assertEqual(2, len(events))
+
+    def test_iterator_threads(self):
+        self.mirror.responses["/ws/2/release/"] = \
+                lambda query: _common.release_list_page(query, 450)
+        releases = list(self.client.iter_browse_releases(
+                artist="x", concurrency=3))
+        self.assertEqual(450, len(releases))
+        # The pages fetched in other threads went to the same server.
+        self.assertEqual(5, len(self.mirror.requests))
+        self.assertEqual([], self.other.requests)
+
+    def test_activate(self):
+        with self.client.activate():
+            musicbrainzngs.get_release_by_id(RELEASE, INCLUDES)
+        self.assertEqual(1, len(self.mirror.requests))
+        self.assertEqual([], self.other.requests)
+
+    def test_methods(self):
+        for name in ("get_artist_by_id", "search_artists", "browse_releases",
+                     "iter_browse_releases", "submit_tags", "resolve_ids"):
+            method = getattr(musicbrainzngs.MusicBrainzClient, name)
+            self.assertEqual(getattr(musicbrainzngs, name).__doc__,
+                             method.__doc__)
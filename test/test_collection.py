@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import musicbrainz
+from test import _common
+
+OK = (b'<?xml version="1.0" encoding="UTF-8"?>'
+      b'<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+      b'<message><text>OK</text></message></metadata>')
+PATH = "/ws/2/collection/c/releases/"
+
+
+def mbid(i):
+    return "%08x-0000-4000-8000-000000000000" % i
+
+
+class CollectionTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(CollectionTest, self).setUp()
+        self.server.lookup = self.lookup
+        self.releases = set()
+        self.failing = set()
+        musicbrainzngs.auth("user", "password")
+
+    def tearDown(self):
+        musicbrainzngs.auth("", "")
+        super(CollectionTest, self).tearDown()
+
+    def lookup(self, method, path, query):
+        # A collection kept in self.releases. Changing a list of
+        # releases that contains one of self.failing gives a 503.
+        if method == "GET" and path.rstrip("/") == PATH.rstrip("/"):
+            limit = int(query.get("limit", ["25"])[0])
+            offset = int(query.get("offset", ["0"])[0])
+            page = sorted(self.releases)[offset:offset + limit]
+            return ('<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+                    '<collection id="c"><release-list count="%d">%s'
+                    '</release-list></collection></metadata>' % (
+                        len(self.releases), "".join(
+                            '<release id="%s"/>' % id for id in page))
+                    ).encode("ascii")
+        if not path.startswith(PATH):
+            return None
+        ids = path[len(PATH):].split(";")
+        if self.failing.intersection(ids):
+            return 503
+        if method == "PUT":
+            self.releases.update(ids)
+        else:
+            self.releases.difference_update(ids)
+        return OK
+
+    def edits(self):
+        return [(method, path[len(PATH):].split(";"))
+                for method, path, query, body in self.server.requests
+                if method != "GET"]
+
+    def test_single_request(self):
+        response = musicbrainzngs.add_releases_to_collection("c", ["a", "b"])
+        self.assertEqual({"message": {"text": "OK"}}, response)
+        self.assertEqual([("PUT", ["a", "b"])], self.edits())
+
+    def test_empty(self):
+        self.assertRaises(ValueError,
+                          musicbrainzngs.add_releases_to_collection, "c", [])
+        self.assertEqual([], self.edits())
+
+    def test_single_request_raises(self):
+        self.failing = set(["a"])
+        self.assertRaises(musicbrainzngs.ResponseError,
+                          musicbrainzngs.remove_releases_from_collection,
+                          "c", ["a"])
+
+    def test_url_length(self):
+        releases = [mbid(i) for i in range(1000)]
+        summary = musicbrainzngs.add_releases_to_collection("c", releases)
+        self.assertEqual(releases, summary["succeeded"])
+        self.assertEqual(set(releases), self.releases)
+        edits = self.edits()
+        self.assertEqual(3, len(edits))
+        self.assertEqual(releases, sum([ids for _, ids in edits], []))
+        for method, path, query, body in self.server.requests:
+            url = "http://%s%s?client=%s" % (self.server.hostname, path,
+                                              query["client"][0])
+            self.assertTrue(len(url) <= musicbrainz.MAX_URL_LENGTH)
+
+    def test_failed_chunk(self):
+        releases = [mbid(i) for i in range(10)]
+        self.failing = set([mbid(7)])
+        summary = musicbrainzngs.add_releases_to_collection(
+                "c", releases, max_url_length=300, concurrency=2)
+        failed = [ids for _, ids in self.edits() if mbid(7) in ids][0]
+        self.assertTrue(1 < len(failed) < 10)
+        self.assertEqual(failed, sorted(summary["failed"]))
+        self.assertEqual(sorted(set(releases) - set(failed)),
+                         sorted(summary["succeeded"]))
+        # The chunk was tried three times.
+        self.assertEqual(3, self.edits().count(("PUT", failed)))
+
+    def test_get_page(self):
+        self.releases = set(mbid(i) for i in range(30))
+        result = musicbrainzngs.get_releases_in_collection("c", limit=10,
+                                                           offset=25)
+        self.assertEqual(30, result["collection"]["release-count"])
+        self.assertEqual([mbid(i) for i in range(25, 30)],
+                         [r["id"] for r in result["collection"]["release-list"]])
+
+    def test_iter(self):
+        self.releases = set(mbid(i) for i in range(250))
+        releases = musicbrainzngs.iter_releases_in_collection("c")
+        self.assertEqual([mbid(i) for i in range(250)],
+                         [release["id"] for release in releases])
+        self.assertEqual([(0, 100), (100, 100), (200, 100)],
+                         sorted((int(query.get("offset", ["0"])[0]),
+                                 int(query["limit"][0]))
+                                for _, _, query, _ in self.server.requests))
+
+    def test_iter_stops(self):
+        self.releases = set(mbid(i) for i in range(1000))
+        releases = musicbrainzngs.iter_releases_in_collection("c",
+                                                              page_size=10)
+        for i, release in zip(range(15), releases):
+            pass
+        releases.close()
+        time.sleep(0.2)
+        # The two pages that were read and the one fetched after them.
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_sync(self):
+        self.releases = set(mbid(i) for i in range(250))
+        wanted = [mbid(i) for i in range(200, 300)]
+        result = musicbrainzngs.sync_collection("c", wanted)
+        self.assertEqual(set(wanted), self.releases)
+        self.assertEqual(wanted[50:], result["added"]["succeeded"])
+        self.assertEqual([mbid(i) for i in range(200)],
+                         result["removed"]["succeeded"])
+        self.assertEqual([("DELETE", [mbid(i) for i in range(200)]),
+                          ("PUT", wanted[50:])], sorted(self.edits()))
+        # Three pages of releases were read.
+        self.assertEqual(3, len(self.server.requests) - 2)
+
+    def test_sync_unchanged(self):
+        self.releases = set(["a", "b"])
+        result = musicbrainzngs.sync_collection("c", ["b", "a"])
+        self.assertEqual([], result["added"]["succeeded"])
+        self.assertEqual([], result["removed"]["succeeded"])
+        self.assertEqual([], self.edits())
@@ -0,0 +1,64 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import crawler
+from test import _common
+
+RELEASE = "833d4c3a-2635-4b7a-83c4-4e560588f23a"
+ARTIST = "fbb941cc-6891-4c8f-8697-1e464aaa8c78"
+
+
+class EmbeddedEntitiesTest(unittest.TestCase):
+    def test_embedded(self):
+        data = {"id": "r",
+                "artist-credit": [{"artist": {"id": "a1"}}, " & ",
+                                  {"artist": {"id": "a2"}}],
+                "medium-list": [{"track-list": [
+                    {"recording": {"id": "rec", "artist-credit": [
+                        {"artist": {"id": "a1"}}]}}]}],
+                "work-relation-list": [{"type": "performance",
+                                        "work": {"id": "w"}}],
+                "release-group": {"id": "rg"}}
+        found = sorted((e, i) for e, i, d in
+                       crawler.embedded_entities(data))
+        self.assertEqual([("artist", "a1"), ("artist", "a1"),
+                          ("artist", "a2"), ("recording", "rec"),
+                          ("release-group", "rg"), ("work", "w")], found)
+
+
+class CrawlTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(CrawlTest, self).setUp()
+        fn = os.path.join(_common.DATA_DIR, "artist",
+                          "0e43fe9d-c472-4b62-be9e-55f971a023e1-aliases.xml")
+        with open(fn, "rb") as f:
+            self.server.responses["/ws/2/artist/" + ARTIST] = f.read()
+
+    def test_harvest(self):
+        follow = {"release": ["recordings", "artist-credits"],
+                  "artist": ["aliases"]}
+        found = list(crawler.crawl([("release", RELEASE)], follow, 1))
+        # Only the seed is fetched, everything else is harvested.
+        self.assertEqual(1, len(self.server.requests))
+        self.assertEqual(("release", RELEASE), found[0][:2])
+        keys = [(e, i) for e, i, d in found]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(21, len([k for k in keys if k[0] == "recording"]))
+        self.assertTrue(("artist", ARTIST) in keys)
+
+    def test_follow(self):
+        follow = {"release": ["recordings", "artist-credits"],
+                  "artist": ["aliases"]}
+        found = list(crawler.crawl([("release", RELEASE),
+                                    ("release", RELEASE)], follow, 2))
+        # The release, then the artist once, although it is credited on
+        # every track.
+        self.assertEqual(2, len(self.server.requests))
+        method, path, query, body = self.server.requests[1]
+        self.assertEqual("/ws/2/artist/" + ARTIST, path)
+        self.assertEqual(["aliases"], query["inc"])
+        artist = [d for e, i, d in found if (e, i) == ("artist", ARTIST)]
+        self.assertEqual(1, len(artist))
+        self.assertTrue("alias-list" in artist[0])
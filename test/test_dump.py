@@ -0,0 +1,112 @@
+import unittest
+import os
+import re
+import shutil
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import dump
+from musicbrainzngs import mbxml
+from test import _common
+
+RELEASE = "833d4c3a-2635-4b7a-83c4-4e560588f23a"
+ARTIST = "0e43fe9d-c472-4b62-be9e-55f971a023e1"
+MISSING = "212895ca-ee36-439a-a824-d2620cd10461"
+
+
+def _fixture(entity, name):
+    with open(os.path.join(_common.DATA_DIR, entity, name), "rb") as f:
+        return f.read()
+
+def _one_line(document):
+    line = b"".join(line.strip() for line in document.splitlines())
+    return re.sub(b"^<\\?xml[^>]*>", b"", line)
+
+def _element(document):
+    """Just the entity element of a web service document."""
+    line = _one_line(document)
+    return line[line.index(b">") + 1:line.rindex(b"</metadata>")]
+
+
+class DumpStoreTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(DumpStoreTest, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.release = _fixture("release",
+                                RELEASE + "-recordings+artist-credits.xml")
+        self.artist = _fixture("artist", ARTIST + "-aliases.xml")
+        with open(os.path.join(self.dir, "release"), "wb") as f:
+            f.write(b"\n" + _one_line(self.release) + b"\n")
+        with open(os.path.join(self.dir, "artist"), "wb") as f:
+            # A bare element, without <metadata>.
+            f.write(_element(self.artist) + b"\n")
+        self.store = dump.DumpStore(self.dir)
+
+    def tearDown(self):
+        self.store.close()
+        musicbrainzngs.set_local_store(None)
+        shutil.rmtree(self.dir)
+        super(DumpStoreTest, self).tearDown()
+
+    def test_lookup(self):
+        self.assertEqual(2, len(self.store))
+        self.assertEqual(mbxml.parse_message(self.release),
+                         self.store.lookup("release", RELEASE))
+        self.assertEqual(mbxml.parse_message(self.artist),
+                         self.store.lookup("artist", ARTIST.upper()))
+
+    def test_missing(self):
+        self.assertEqual(None, self.store.lookup("release", MISSING))
+        self.assertEqual(None, self.store.lookup("artist", RELEASE))
+        self.assertEqual(None, self.store.lookup("release", "not-an-mbid"))
+
+    def test_includes(self):
+        self.assertEqual(None, self.store.lookup("release", RELEASE,
+                                                 ["recordings"]))
+        with dump.DumpStore(self.dir, includes=["recordings",
+                                                "artist-credits"]) as store:
+            self.assertEqual(mbxml.parse_message(self.release),
+                             store.lookup("release", RELEASE,
+                                          ["recordings"]))
+            self.assertEqual(None, store.lookup("release", RELEASE,
+                                                ["recordings", "labels"]))
+
+    def test_index_reused(self):
+        mtime = os.stat(self.store.index_path).st_mtime
+        with dump.DumpStore(self.dir) as store:
+            self.assertEqual(mtime, os.stat(store.index_path).st_mtime)
+            self.assertEqual(2, len(store))
+
+    def test_index_rebuilt(self):
+        with open(os.path.join(self.dir, "artist"), "wb") as f:
+            f.write(b"")
+        with dump.DumpStore(self.dir) as store:
+            self.assertEqual(1, len(store))
+            self.assertEqual(None, store.lookup("artist", ARTIST))
+
+    def test_local_store(self):
+        store = dump.DumpStore(self.dir, includes=["recordings",
+                                                   "artist-credits"])
+        try:
+            musicbrainzngs.set_local_store(store)
+            release = musicbrainzngs.get_release_by_id(
+                    RELEASE, includes=["recordings", "artist-credits"])
+            self.assertEqual(RELEASE, release["release"]["id"])
+            self.assertEqual([], self.server.requests)
+
+            # Not in the dump: asked from the server.
+            release = musicbrainzngs.get_release_by_id(
+                    MISSING, includes=["recordings"])
+            self.assertEqual(MISSING, release["release"]["id"])
+            self.assertEqual(1, len(self.server.requests))
+
+            # Includes the dump doesn't have: asked from the server.
+            musicbrainzngs.set_local_store(self.store)
+            musicbrainzngs.get_release_by_id(
+                    RELEASE, includes=["recordings", "artist-credits"])
+            self.assertEqual(2, len(self.server.requests))
+            self.assertTrue(self.server.requests[1][1].startswith(
+                    "/ws/2/release/" + RELEASE))
+        finally:
+            store.close()
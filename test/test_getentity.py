@@ -8,10 +8,11 @@ import musicbrainzngs
 from test import _common
 
 
-class UrlTest(unittest.TestCase):
+class UrlTest(_common.SettingsTestCase):
     """ Test that the correct URL is generated when a search query is made """
 
     def setUp(self):
+        super(UrlTest, self).setUp()
         self.opener = _common.FakeOpener("<response/>")
         musicbrainzngs.compat.build_opener = lambda *args: self.opener
 
@@ -29,7 +30,7 @@ class UrlTest(unittest.TestCase):
 
         # More than one include
         musicbrainzngs.get_artist_by_id(artistid, ["recordings", "aliases"])
-        expected ="http://musicbrainz.org/ws/2/artist/952a4205-023d-4235-897c-6fdb6f58dfaa?inc=recordings+aliases"
+        expected ="http://musicbrainz.org/ws/2/artist/952a4205-023d-4235-897c-6fdb6f58dfaa?inc=aliases+recordings"
         self.assertEqual(expected, self.opener.get_url())
 
         # with valid filters
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+class ImportTest(unittest.TestCase):
+    def test_requests_not_imported(self):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        process = subprocess.Popen(
+                [sys.executable, "-c",
+                 "import sys, musicbrainzngs; "
+                 "print(sorted(m for m in sys.modules "
+                 "if m.split('.')[0] in ('requests', 'urllib3')))"],
+                stdout=subprocess.PIPE, env=env, cwd=ROOT)
+        out, _ = process.communicate()
+        self.assertEqual("[]", out.decode("utf-8").strip())
@@ -1,9 +1,13 @@
 import unittest
 import os
+import io
 import sys
+import xml.etree.ElementTree as ET
 sys.path.append(os.path.abspath(".."))
 from musicbrainzngs import mbxml
 
+NS = "http://musicbrainz.org/ns/mmd-2.0#"
+
 class MbXML(unittest.TestCase):
 
     def testMakeBarcode(self):
@@ -12,3 +16,102 @@ class MbXML(unittest.TestCase):
                     b'</ns0:release></ns0:release-list></ns0:metadata>')
         xml = mbxml.make_barcode_request({'trid':'12345'})
         self.assertEqual(expected, xml)
+
+    def testMakeBarcodeEmpty(self):
+        # The same as the ElementTree builder made before.
+        root = ET.Element("{%s}metadata" % NS)
+        rel_list = ET.SubElement(root, "{%s}release-list" % NS)
+        rel_xml = ET.SubElement(rel_list, "{%s}release" % NS)
+        bar_xml = ET.SubElement(rel_xml, "{%s}barcode" % NS)
+        rel_xml.set("{%s}id" % NS, "trid")
+        bar_xml.text = ""
+        expected = ET.tostring(root, "utf-8")
+        if expected.startswith(b"<?xml"):
+            expected = expected[expected.index(b"?>") + 2:].lstrip()
+        self.assertTrue(b"<ns0:barcode />" in expected)
+        self.assertEqual(expected, mbxml.make_barcode_request({'trid': ''}))
+
+    def testMakeTagEmpty(self):
+        expected = (b'<ns0:metadata xmlns:ns0="http://musicbrainz.org/ns/mmd-2.0#">'
+                    b'<ns0:recording-list />'
+                    b'<ns0:artist-list><ns0:artist ns0:id="a">'
+                    b'<ns0:user-tag-list><ns0:user-tag><ns0:name />'
+                    b'</ns0:user-tag></ns0:user-tag-list>'
+                    b'</ns0:artist></ns0:artist-list></ns0:metadata>')
+        self.assertEqual(expected, mbxml.make_tag_request({'a': ['']}, {}))
+
+    def testMakeTagEscapes(self):
+        expected = (b'<ns0:metadata xmlns:ns0="http://musicbrainz.org/ns/mmd-2.0#">'
+                    b'<ns0:recording-list />'
+                    b'<ns0:artist-list><ns0:artist ns0:id="a&quot;1">'
+                    b'<ns0:user-tag-list><ns0:user-tag><ns0:name>r&amp;b &lt;3'
+                    b'</ns0:name></ns0:user-tag><ns0:user-tag><ns0:name>\xc3\xa9'
+                    b'</ns0:name></ns0:user-tag></ns0:user-tag-list>'
+                    b'</ns0:artist></ns0:artist-list></ns0:metadata>')
+        e_acute = b'\xc3\xa9'.decode('utf-8')
+        xml = mbxml.make_tag_request({'a"1': ['r&b <3', e_acute]}, {})
+        self.assertEqual(expected, xml)
+
+    def testMakeIsrcSkipsEmpty(self):
+        expected = (b'<ns0:metadata xmlns:ns0="http://musicbrainz.org/ns/mmd-2.0#">'
+                    b'<ns0:recording-list><ns0:recording ns0:id="r">'
+                    b'<ns0:isrc-list ns0:count="2"><ns0:isrc ns0:id="I1" />'
+                    b'<ns0:isrc ns0:id="I2" /></ns0:isrc-list></ns0:recording>'
+                    b'</ns0:recording-list></ns0:metadata>')
+        xml = mbxml.make_isrc_request({'r': ['I1', 'I2'], 'e': []})
+        self.assertEqual(expected, xml)
+
+    def testWriteInChunks(self):
+        ratings = dict(("r%d" % i, i % 100) for i in range(500))
+        expected = mbxml.make_rating_request({}, ratings)
+
+        chunks = []
+        writer = mbxml._XmlWriter(chunks.append, chunk_size=100)
+        mbxml._write_entity_lists(writer, [("recording", ratings),
+                                           ("artist", {})],
+                                  mbxml._write_rating)
+        writer.close()
+        self.assertTrue(len(chunks) > 10)
+        self.assertEqual(expected, b"".join(chunks))
+
+        out = io.BytesIO()
+        self.assertEqual(None, mbxml.make_rating_request({}, ratings, out))
+        self.assertEqual(expected, out.getvalue())
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        self.fn = os.path.join(os.path.dirname(__file__), "data",
+                               "search-artist.xml")
+        mbxml.reset_profile()
+
+    def tearDown(self):
+        mbxml.disable_profiling()
+        mbxml.reset_profile()
+
+    def testDisabledByDefault(self):
+        mbxml.parse_message(open(self.fn))
+        self.assertEqual({}, mbxml.get_profile()["parsers"])
+
+    def testProfile(self):
+        plain = mbxml.parse_message(open(self.fn))
+        mbxml.enable_profiling()
+        profiled = mbxml.parse_message(open(self.fn))
+        mbxml.disable_profiling()
+        self.assertEqual(plain, profiled)
+
+        profile = mbxml.get_profile()
+        parsers = profile["parsers"]
+        self.assertEqual(1, parsers["parse_message"]["calls"])
+        self.assertEqual(25, parsers["parse_artist"]["calls"])
+        self.assertEqual(25, profile["elements"]["artist"])
+        for p in parsers.values():
+            self.assertTrue(p["selftime"] <= p["cumtime"] + 1e-9)
+        total_self = sum(p["selftime"] for p in parsers.values())
+        self.assertAlmostEqual(parsers["parse_message"]["cumtime"],
+                               total_self, places=3)
+        self.assertTrue(mbxml.format_profile().startswith("parser"))
+
+        # Nothing is recorded once profiling is off again.
+        mbxml.parse_message(open(self.fn))
+        self.assertEqual(1, mbxml.get_profile()["parsers"]
+                                               ["parse_message"]["calls"])
@@ -11,10 +11,11 @@ from musicbrainzngs import mbxml
 from test import _common
 
 
-class UrlTest(unittest.TestCase):
+class UrlTest(_common.SettingsTestCase):
     """ Test that the correct URL is generated when a search query is made """
 
     def setUp(self):
+        super(UrlTest, self).setUp()
         self.opener = _common.FakeOpener("<response/>")
         musicbrainzngs.compat.build_opener = lambda *args: self.opener
 
@@ -31,7 +32,7 @@ class UrlTest(unittest.TestCase):
 
         # more than one include
         musicbrainzngs.get_release_by_id("5e3524ca-b4a1-4e51-9ba5-63ea2de8f49b", includes=["artists", "recordings", "artist-credits"])
-        expected = "http://musicbrainz.org/ws/2/release/5e3524ca-b4a1-4e51-9ba5-63ea2de8f49b?inc=artists+recordings+artist-credits"
+        expected = "http://musicbrainz.org/ws/2/release/5e3524ca-b4a1-4e51-9ba5-63ea2de8f49b?inc=artist-credits+artists+recordings"
         self.assertEqual(expected, self.opener.get_url())
 
 
@@ -9,10 +9,11 @@ from musicbrainzngs import mbxml
 from test import _common
 
 
-class UrlTest(unittest.TestCase):
+class UrlTest(_common.SettingsTestCase):
     """ Test that the correct URL is generated when a search query is made """
 
     def setUp(self):
+        super(UrlTest, self).setUp()
         self.opener = _common.FakeOpener("<response/>")
         musicbrainzngs.compat.build_opener = lambda *args: self.opener
 
@@ -0,0 +1,114 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import metrics
+from test import _common
+
+
+class RegistryTest(unittest.TestCase):
+    def test_render_prometheus(self):
+        registry = metrics.Registry()
+        counter = registry.counter("reqs", "Requests.", ("status",))
+        histogram = registry.histogram("secs", "Seconds.", buckets=(0.1, 1))
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        expected = "\n".join([
+            '# HELP reqs Requests.',
+            '# TYPE reqs counter',
+            'reqs{status="200"} 3',
+            '# HELP secs Seconds.',
+            '# TYPE secs histogram',
+            'secs_bucket{le="0.1"} 1',
+            'secs_bucket{le="1"} 2',
+            'secs_bucket{le="+Inf"} 2',
+            'secs_sum 0.55',
+            'secs_count 2',
+        ]) + "\n"
+        self.assertEqual(expected, registry.render_prometheus())
+
+    def test_snapshot(self):
+        registry = metrics.Registry()
+        gauge = registry.gauge("g", "A gauge.", ("kind",))
+        gauge.inc(kind="a")
+        gauge.inc(kind="a")
+        gauge.dec(kind="a")
+        self.assertEqual({"g": [({"kind": "a"}, 1)]}, registry.snapshot())
+
+    def test_label_escaping(self):
+        registry = metrics.Registry()
+        registry.counter("c", "C.", ("name",)).inc(name='a"b')
+        self.assertTrue('c{name="a\\"b"} 1' in registry.render_prometheus())
+
+
+class RequestMetricsTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(RequestMetricsTest, self).setUp()
+        metrics.registry.clear()
+
+    def tearDown(self):
+        metrics.disable()
+        super(RequestMetricsTest, self).tearDown()
+
+    def test_disabled_by_default(self):
+        musicbrainzngs.search_labels("Waysafe")
+        snapshot = metrics.registry.snapshot()
+        self.assertEqual([], snapshot["musicbrainzngs_requests_total"])
+
+    def test_requests_counted(self):
+        metrics.enable()
+        musicbrainzngs.search_labels("Waysafe")
+        self.assertRaises(musicbrainzngs.ResponseError,
+                musicbrainzngs.get_label_by_id, "unknown")
+        snapshot = metrics.registry.snapshot()
+        self.assertEqual([({"entity": "label", "status": "200"}, 1),
+                          ({"entity": "label", "status": "404"}, 1)],
+                         snapshot["musicbrainzngs_requests_total"])
+        self.assertEqual([({}, 0)],
+                         snapshot["musicbrainzngs_requests_in_flight"])
+        text = metrics.registry.render_prometheus()
+        self.assertTrue('musicbrainzngs_parse_seconds_count{entity="label"} 1'
+                        in text)
+
+    def test_other_client(self):
+        metrics.enable()
+        client = musicbrainzngs.MusicBrainzClient(self.server.hostname)
+        client.set_useragent("test", "1")
+        client.set_rate_limit(10.0, 5)
+        client.search_labels("Waysafe")
+        snapshot = metrics.registry.snapshot()
+        self.assertEqual([({"entity": "label", "status": "200"}, 1)],
+                         snapshot["musicbrainzngs_requests_total"])
+        # The limiter gauge reports the rate limiter of the client given
+        # to enable(), not the module's (which allows one request).
+        metrics.enable(client)
+        snapshot = metrics.registry.snapshot()
+        self.assertEqual(4, round(
+                snapshot["musicbrainzngs_limiter_tokens"][0][1]))
+
+    def test_limiter_refills(self):
+        cop = _common.Timecop()
+        cop.install()
+        try:
+            client = musicbrainzngs.MusicBrainzClient(self.server.hostname)
+            client.set_useragent("test", "1")
+            client.set_rate_limit(1.0, 2)
+            client._send = musicbrainzngs.musicbrainz._rate_limit(
+                    lambda: None, client)
+            metrics.enable(client)
+            self.assertEqual(2, metrics._limiter_tokens())
+            client._send()
+            client._send()
+            self.assertEqual(0, metrics._limiter_tokens())
+            # The gauge counts what was earned while idle, up to the
+            # limit, and takes none of it.
+            cop.sleep(0.5)
+            self.assertEqual(1, metrics._limiter_tokens())
+            self.assertEqual(1, metrics._limiter_tokens())
+            cop.sleep(5)
+            self.assertEqual(2, metrics._limiter_tokens())
+        finally:
+            cop.restore()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs.cache import BloomFilter, MemoryCache
+from test import _common
+
+ARTIST = (b'<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+          b'<artist id="a"><name>A</name></artist></metadata>')
+
+
+class NotFoundTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(NotFoundTest, self).setUp()
+        self.server.lookup = lambda method, path, query: \
+            ARTIST if path.endswith("/a") else None
+
+    def tearDown(self):
+        musicbrainzngs.set_cache(None)
+        musicbrainzngs.set_missing_filter(None)
+        super(NotFoundTest, self).tearDown()
+
+    def test_error(self):
+        try:
+            musicbrainzngs.get_artist_by_id("b")
+        except musicbrainzngs.NotFoundError as exc:
+            self.assertTrue(isinstance(exc, musicbrainzngs.ResponseError))
+        else:
+            self.fail("no NotFoundError")
+
+    def test_not_cached_by_default(self):
+        musicbrainzngs.set_cache(MemoryCache())
+        for _ in range(2):
+            self.assertRaises(musicbrainzngs.NotFoundError,
+                              musicbrainzngs.get_artist_by_id, "b")
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_negative_ttl(self):
+        musicbrainzngs.set_cache(MemoryCache(ttl=60, negative_ttl=0.1))
+        for _ in range(2):
+            self.assertRaises(musicbrainzngs.NotFoundError,
+                              musicbrainzngs.get_artist_by_id, "b")
+            musicbrainzngs.get_artist_by_id("a")
+        self.assertEqual(2, len(self.server.requests))
+        time.sleep(0.15)
+        self.assertRaises(musicbrainzngs.NotFoundError,
+                          musicbrainzngs.get_artist_by_id, "b")
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_missing_filter(self):
+        missing = BloomFilter(capacity=100)
+        musicbrainzngs.set_missing_filter(missing)
+        for _ in range(2):
+            self.assertRaises(musicbrainzngs.NotFoundError,
+                              musicbrainzngs.get_artist_by_id, "b")
+            musicbrainzngs.get_artist_by_id("a")
+        self.assertEqual(3, len(self.server.requests))
+        self.assertTrue("artist/b" in missing)
+        self.assertFalse("artist/a" in missing)
+
+    def test_missing_filter_discid(self):
+        # A disc ID that isn't there yet may be submitted later.
+        missing = BloomFilter(capacity=100)
+        musicbrainzngs.set_missing_filter(missing)
+        for _ in range(2):
+            self.assertRaises(musicbrainzngs.NotFoundError,
+                              musicbrainzngs.get_releases_by_discid, "d")
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual(0, len(missing))
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_contains(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add("release/%d" % i)
+        # Strings that looked added already (false positives) are not counted.
+        self.assertTrue(980 < len(bloom) <= 1000)
+        self.assertTrue(all("release/%d" % i in bloom for i in range(1000)))
+        false = sum("artist/%d" % i in bloom for i in range(10000))
+        self.assertTrue(false < 300, false)
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "missing")
+            bloom = BloomFilter(capacity=100)
+            key = b"release/\xc3\xa9".decode("utf-8")
+            bloom.add(key)
+            bloom.save(path)
+            loaded = BloomFilter.load(path)
+            self.assertTrue(key in loaded)
+            self.assertFalse("release/x" in loaded)
+            self.assertEqual(1, len(loaded))
+            loaded.add("release/x")
+            self.assertTrue("release/x" in loaded)
+
+            with open(path, "wb") as f:
+                f.write(b"nonsense" * 4)
+            self.assertRaises(ValueError, BloomFilter.load, path)
+        finally:
+            shutil.rmtree(directory)
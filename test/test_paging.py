@@ -0,0 +1,87 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from test import _common
+
+
+class PagingTest(_common.FakeServerTestCase):
+    """Tests the iter_browse_* and iter_search_* generators against a
+    FakeServer."""
+
+    def setUp(self):
+        super(PagingTest, self).setUp()
+        self.server.responses["/ws/2/release/"] = \
+            lambda query: _common.release_list_page(query, 250)
+
+    def test_count_parsed(self):
+        res = musicbrainzngs.browse_releases(artist="a", limit=10)
+        self.assertEqual(250, res["release-count"])
+        self.assertEqual(10, len(res["release-list"]))
+
+    def test_all_pages(self):
+        releases = list(musicbrainzngs.iter_browse_releases(artist="a"))
+        self.assertEqual(["release-%d" % i for i in range(250)],
+                         [r["id"] for r in releases])
+        pages = [(q["limit"], q.get("offset")) for m, p, q, b
+                 in self.server.requests]
+        self.assertEqual([(["100"], None), (["100"], ["100"]),
+                          (["100"], ["200"])], pages)
+        self.assertEqual(["a"], self.server.requests[0][2]["artist"])
+
+    def test_stop_early(self):
+        releases = musicbrainzngs.iter_browse_releases(artist="a")
+        for i in range(10):
+            next(releases)
+        releases.close()
+        # The first page and at most one prefetched page.
+        self.assertTrue(len(self.server.requests) <= 2)
+
+    def test_search(self):
+        # search-artist.xml has 25 hits of 349, so every page is the
+        # same; stop after the first two.
+        artists = musicbrainzngs.iter_search_artists("Dynamo Go",
+                                                     page_size=25)
+        hits = [next(artists) for i in range(50)]
+        self.assertEqual(hits[:25], hits[25:])
+        offsets = [q.get("offset") for m, p, q, b in self.server.requests]
+        self.assertEqual([None, ["25"]], offsets[:2])
+
+    def test_error_raised(self):
+        self.server.unavailable_rate = 1.0
+        self.assertRaises(musicbrainzngs.ResponseError, list,
+                          musicbrainzngs.iter_browse_releases(artist="a"))
+
+
+class ParallelPagingTest(_common.FakeServerTestCase):
+    """Tests fetching browse pages concurrently."""
+    server_options = {"latency": 0.05}
+
+    def setUp(self):
+        super(ParallelPagingTest, self).setUp()
+        self.server.responses["/ws/2/release/"] = \
+            lambda query: _common.release_list_page(query, 1000)
+
+    def test_in_order(self):
+        releases = musicbrainzngs.iter_browse_releases(artist="a",
+                                                       concurrency=4)
+        self.assertEqual(["release-%d" % i for i in range(1000)],
+                         [r["id"] for r in releases])
+        self.assertEqual(10, len(self.server.requests))
+        self.assertTrue(self.server.max_in_flight > 1)
+        self.assertTrue(self.server.max_in_flight <= 4)
+
+    def test_sequential_by_default(self):
+        list(musicbrainzngs.iter_browse_releases(artist="a"))
+        self.assertEqual(1, self.server.max_in_flight)
+
+    def test_short_pages(self):
+        # A server that returns fewer entities than asked for.
+        self.server.responses["/ws/2/release/"] = \
+            lambda query: _common.release_list_page(
+                dict(query, limit=["30"]), 100)
+        releases = musicbrainzngs.iter_browse_releases(artist="a",
+                                                       concurrency=3)
+        self.assertEqual(["release-%d" % i for i in range(100)],
+                         [r["id"] for r in releases])
@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import planner
+from test import _common
+
+ARTIST = "fbb941cc-6891-4c8f-8697-1e464aaa8c78"
+
+
+def artist_with_releases(total):
+    releases = "".join('<release id="release-%d"><title>Release %d</title>'
+                       '</release>' % (i, i)
+                       for i in range(min(total, planner.LOOKUP_LIST_LIMIT)))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+            '<artist id="%s"><name>Artist</name>'
+            '<release-list count="%d">%s</release-list></artist>'
+            '</metadata>' % (ARTIST, total, releases)).encode("utf-8")
+
+def release(query):
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+            '<release id="release-x"><title>Release</title></release>'
+            '</metadata>').encode("utf-8")
+
+
+class ChooseTest(unittest.TestCase):
+    def test_lookup_list(self):
+        listed = [{"id": str(i)} for i in range(10)]
+        self.assertEqual(("lookup-list", 0),
+                         planner.choose("artist", "releases", ["media"],
+                                        listed, 10))
+
+    def test_browse_beats_lookups(self):
+        self.assertEqual(("browse", 10),
+                         planner.choose("artist", "releases", ["recordings"],
+                                        [{}] * 25, 1000))
+
+    def test_lookup_each(self):
+        listed = [{"id": str(i)} for i in range(3)]
+        self.assertEqual(("lookup-each", 3),
+                         planner.choose("artist", "releases", ["isrcs"],
+                                        listed, 3))
+        self.assertEqual(("lookup-each", 1010),
+                         planner.choose("artist", "releases", ["isrcs"],
+                                        [{}] * 25, 1000))
+
+    def test_impossible(self):
+        self.assertRaises(musicbrainzngs.UsageError, planner.choose,
+                          "work", "releases", [])
+
+
+class FetchTest(_common.FakeServerTestCase):
+    def serve(self, total):
+        self.server.responses["/ws/2/artist/" + ARTIST] = \
+                artist_with_releases(total)
+        self.server.responses["/ws/2/release/"] = \
+                lambda query: _common.release_list_page(query, total)
+        for i in range(total):
+            self.server.responses["/ws/2/release/release-%d" % i] = release
+
+    def test_from_lookup(self):
+        self.serve(10)
+        artist, plan = planner.fetch("artist", ARTIST,
+                                     want={"releases": ["media"]})
+        self.assertEqual(1, plan.requests)
+        self.assertEqual([("releases", "lookup-list", 0)], plan.choices)
+        self.assertEqual(["media", "releases"],
+                         sorted(self.server.requests[0][2]["inc"][0]
+                                .split(" ")))
+        self.assertEqual(10, len(artist["release-list"]))
+
+    def test_browse(self):
+        self.serve(250)
+        artist, plan = planner.fetch("artist", ARTIST,
+                                     want={"releases": ["recordings"]})
+        self.assertEqual("Artist", artist["name"])
+        self.assertEqual(["get_artist_by_id"] + ["browse_releases"] * 3,
+                         [step["function"] for step in plan])
+        self.assertEqual(4, len(self.server.requests))
+        self.assertEqual(250, artist["release-count"])
+        self.assertEqual(["release-%d" % i for i in range(250)],
+                         [r["id"] for r in artist["release-list"]])
+
+    def test_lookup_each(self):
+        self.serve(3)
+        artist, plan = planner.fetch("artist", ARTIST,
+                                     want={"releases": ["isrcs"]})
+        self.assertEqual(["get_artist_by_id"] + ["get_release_by_id"] * 3,
+                         [step["function"] for step in plan])
+        self.assertEqual(3, artist["release-count"])
+        self.assertTrue("get_release_by_id(id='release-2', "
+                        "includes=['isrcs'])" in str(plan))
@@ -6,6 +6,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 import musicbrainzngs
 from musicbrainzngs import musicbrainz
 from test._common import Timecop
+from test import bench_ratelimit
 
 
 class RateLimitArgumentTest(unittest.TestCase):
@@ -72,6 +73,39 @@ class RateLimitingTest(unittest.TestCase):
         time2 = time.time()
         self.assertAlmostEqual(time1, time2)
 
+class TryAcquireTest(unittest.TestCase):
+    def setUp(self):
+        self.cop = Timecop()
+        self.cop.install()
+        self.client = musicbrainzngs.MusicBrainzClient()
+        self.func = musicbrainz._rate_limit(lambda: None, self.client)
+
+    def tearDown(self):
+        self.cop.restore()
+
+    def test_only_idle_requests(self):
+        """ Only requests no other call uses are handed out """
+        self.assertTrue(self.func.try_acquire())
+        self.assertFalse(self.func.try_acquire())
+        time.sleep(1.0)
+        self.assertTrue(self.func.try_acquire())
+        time1 = time.time()
+        self.func()
+        self.assertTrue(time.time() - time1 >= 1.0)
+
+    def test_batch_must_be_idle(self):
+        """ With several requests per interval, all must be unused """
+        self.client.set_rate_limit(1.0, 3)
+        self.func()
+        self.assertFalse(self.func.try_acquire())
+        time.sleep(0.4)
+        self.assertTrue(self.func.try_acquire())
+
+    def test_disabled(self):
+        self.client.set_rate_limit(False)
+        self.assertTrue(self.func.try_acquire())
+        self.assertTrue(self.func.try_acquire())
+
 class BatchedRateLimitingTest(unittest.TestCase):
     def setUp(self):
         musicbrainzngs.set_rate_limit(3, 3)
@@ -131,3 +165,45 @@ class NoRateLimitingTest(unittest.TestCase):
         self.func()
         time2 = time.time()
         self.assertAlmostEqual(time1, time2)
+
+class FractionalRateLimitingTest(unittest.TestCase):
+    """ Intervals other than one second should delay by the right amount """
+    def setUp(self):
+        musicbrainzngs.set_rate_limit(0.1, 5)
+
+        self.cop = Timecop()
+        self.cop.install()
+
+        @musicbrainz._rate_limit
+        def limited():
+            pass
+        self.func = limited
+
+    def tearDown(self):
+        musicbrainzngs.set_rate_limit(1, 1)
+
+        self.cop.restore()
+
+    def test_overage_query_delay(self):
+        for i in range(5):
+            self.func()
+        time1 = time.time()
+        self.func()
+        time2 = time.time()
+        self.assertAlmostEqual(0.02, time2 - time1, places=3)
+
+class ContendedRateLimitingTest(unittest.TestCase):
+    """ The achieved rate with many threads calling at once must stay
+        close to (and never above) the configured rate. Runs in real time.
+    """
+    def tearDown(self):
+        musicbrainzngs.set_rate_limit(1, 1)
+
+    def test_achieved_rate(self):
+        for threads in (1, 8):
+            result = bench_ratelimit.contention(threads, 60, 0.1, 5)
+            configured = result["configured_rate"]
+            self.assertTrue(result["achieved_rate"] <= configured * 1.02,
+                            result)
+            self.assertTrue(result["achieved_rate"] >= configured * 0.8,
+                            result)
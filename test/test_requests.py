@@ -70,3 +70,99 @@ class MethodTest(unittest.TestCase):
     def test_get(self):
         musicbrainz._do_mb_query("artist", 1234, [], [])
         self.assertEqual("GET", self.opener.request.get_method())
+
+
+class FakeServerTest(_common.FakeServerTestCase):
+    """Runs requests through the real transport against a local
+    FakeServer."""
+
+    def test_lookup(self):
+        res = musicbrainzngs.get_release_by_id(
+                "a81f3c15-2f36-47c7-9b0f-f684a8b0530f", ["recordings"])
+        self.assertEqual("Bored Bored", res["release"]["title"])
+        method, path, query, body = self.server.requests[-1]
+        self.assertEqual("GET", method)
+        self.assertEqual(["recordings"], query["inc"])
+
+    def test_search(self):
+        res = musicbrainzngs.search_artists("Dynamo Go")
+        self.assertEqual(25, len(res["artist-list"]))
+
+    def test_not_found(self):
+        self.assertRaises(musicbrainzngs.ResponseError,
+                musicbrainzngs.get_artist_by_id, "unknown")
+
+    def test_unavailable(self):
+        self.server.unavailable_rate = 1.0
+        self.assertRaises(musicbrainzngs.ResponseError,
+                musicbrainzngs.search_artists, "Dynamo Go")
+
+
+class FakeServerTestCaseTest(unittest.TestCase):
+    def test_settings_restored(self):
+        class Case(_common.FakeServerTestCase):
+            def runTest(self):
+                musicbrainzngs.set_rate_limit(0.5, 7)
+                musicbrainzngs.search_artists("Dynamo Go")
+
+        def state():
+            return ([getattr(musicbrainz, name) for name in _common._SETTINGS],
+                    musicbrainz._send.remaining_requests,
+                    musicbrainz._send.last_call)
+        before = state()
+        result = unittest.TestResult()
+        Case().run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(before, state())
+
+
+class ListenerTest(_common.FakeServerTestCase):
+    """Tests request listeners and the response cache."""
+
+    def setUp(self):
+        super(ListenerTest, self).setUp()
+        self.events = []
+        musicbrainzngs.add_request_listener(self.listener)
+
+    def tearDown(self):
+        musicbrainzngs.remove_request_listener(self.listener)
+        musicbrainzngs.set_cache(None)
+        super(ListenerTest, self).tearDown()
+
+    def listener(self, event, info):
+        self.events.append((event, dict(info)))
+
+    def test_events(self):
+        musicbrainzngs.get_release_group_by_id(
+                "f52bc6a1-c848-49e6-85de-f8f53459a624")
+        self.assertEqual(["start", "end"], [e[0] for e in self.events])
+        info = self.events[-1][1]
+        self.assertEqual("release-group", info["entity"])
+        self.assertEqual(200, info["status"])
+        self.assertEqual(None, info["cache"])
+        self.assertEqual(None, info["error"])
+        self.assertTrue(info["bytes"] > 0)
+        for key in ("ttfb", "transfer_time", "parse_time", "elapsed"):
+            self.assertTrue(info[key] >= 0.0)
+
+    def test_error(self):
+        self.assertRaises(musicbrainzngs.ResponseError,
+                musicbrainzngs.get_artist_by_id, "unknown")
+        info = self.events[-1][1]
+        self.assertEqual(404, info["status"])
+        self.assertTrue(isinstance(info["error"],
+                                   musicbrainzngs.ResponseError))
+
+    def test_removed_listener(self):
+        musicbrainzngs.remove_request_listener(self.listener)
+        musicbrainzngs.search_labels("Waysafe")
+        self.assertEqual([], self.events)
+
+    def test_cache(self):
+        musicbrainzngs.set_cache(musicbrainzngs.MemoryCache())
+        first = musicbrainzngs.search_labels("Waysafe")
+        second = musicbrainzngs.search_labels("Waysafe")
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(self.server.requests))
+        caching = [e[1]["cache"] for e in self.events if e[0] == "end"]
+        self.assertEqual(["miss", "hit"], caching)
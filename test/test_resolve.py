@@ -0,0 +1,65 @@
+import unittest
+import os
+import re
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import musicbrainz
+from test import _common
+
+RELEASE = ('<?xml version="1.0" encoding="UTF-8"?>'
+           '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+           '<release id="%s"><title>Merged</title></release></metadata>')
+
+
+def search_page(query, known):
+    """Answer a reid:(...) search with the IDs in `known`."""
+    ids = re.findall(r"[0-9a-z\\-]{10,}", query["query"][0])
+    ids = [i.replace("\\", "") for i in ids]
+    releases = "".join('<release id="%s"><title>%s</title></release>'
+                       % (i, i) for i in ids if i in known)
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#" '
+            'xmlns:ext="http://musicbrainz.org/ns/ext#-2.0">'
+            '<release-list count="%d" offset="0">%s</release-list>'
+            '</metadata>' % (len(ids), releases)).encode("utf-8")
+
+
+class ResolveIdsTest(_common.FakeServerTestCase):
+    def setUp(self):
+        self.ids = ["00000000-0000-0000-0000-%012d" % i for i in range(250)]
+        known = set(self.ids[:-2])
+        super(ResolveIdsTest, self).setUp()
+        self.server.responses["/ws/2/release/"] = \
+            lambda query: search_page(query, known)
+        merged = self.ids[-1]
+        self.server.responses["/ws/2/release/" + merged] = \
+            (RELEASE % "11111111-0000-0000-0000-000000000000").encode("utf-8")
+
+    def test_resolve(self):
+        result = musicbrainzngs.resolve_ids("release", self.ids + self.ids[:3])
+        self.assertEqual(set(self.ids), set(result))
+        self.assertEqual(self.ids[0], result[self.ids[0]]["title"])
+        # Not found by search or lookup.
+        self.assertEqual(None, result[self.ids[-2]])
+        # Found by lookup only.
+        self.assertEqual("Merged", result[self.ids[-1]]["title"])
+
+        searches = [q for m, p, q, b in self.server.requests
+                    if p == "/ws/2/release/"]
+        self.assertEqual(3, len(searches))
+        self.assertEqual(["100"], searches[0]["limit"])
+        self.assertTrue(searches[0]["query"][0].startswith(
+            "reid:(00000000\\-0000"))
+        self.assertEqual(5, len(self.server.requests))
+
+    def test_query_length(self):
+        queries = list(musicbrainz._id_queries("reid", self.ids, 500))
+        self.assertEqual(self.ids, sum([batch for q, batch in queries], []))
+        for query, batch in queries:
+            self.assertTrue(len(musicbrainzngs.compat.quote_plus(query))
+                            <= 500)
+
+    def test_invalid_entity(self):
+        self.assertRaises(musicbrainzngs.UsageError,
+                          musicbrainzngs.resolve_ids, "url", self.ids)
@@ -0,0 +1,145 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import dump
+from musicbrainzngs import searchindex
+from test import _common
+
+
+def _fixture(name):
+    with open(os.path.join(_common.DATA_DIR, name), "rb") as f:
+        return f.read()
+
+
+class ParseQueryTest(unittest.TestCase):
+    def test_search_functions(self):
+        self.assertEqual([("artist", "dynamo go", False, False),
+                          ("country", "gb", False, False)],
+                         searchindex.parse_query(
+                             "artist:(dynamo go) country:(gb)"))
+        self.assertEqual([("release", "pop-music", True, True),
+                          ("arid", "x", True, True)],
+                         searchindex.parse_query(
+                             'release:"pop\\-music" AND arid:"x"'))
+        self.assertEqual([(None, "affordable", False, False),
+                          (None, "pop music", True, False)],
+                         searchindex.parse_query('affordable "pop music"'))
+
+    def test_analyze(self):
+        name = b"Sigur R\xc3\xb3s".decode("utf-8")
+        self.assertEqual(["sigur", "ros"],
+                         searchindex.analyze("artist", name))
+        self.assertEqual(["sigur", b"r\xc3\xb3s".decode("utf-8")],
+                         searchindex.analyze("artistaccent", name))
+        self.assertEqual(["0e43fe9d-c472-4b62-be9e-55f971a023e1"],
+                         searchindex.analyze(
+                             "arid", "0E43FE9D-C472-4B62-BE9E-55F971A023E1"))
+
+
+class SearchIndexTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(SearchIndexTest, self).setUp()
+        self.index = searchindex.SearchIndex()
+        for entity in ("artist", "recording", "release"):
+            self.assertEqual(25, self.index.add(
+                    _fixture("search-%s.xml" % entity)))
+
+    def tearDown(self):
+        self.index.close()
+        musicbrainzngs.set_search_index(None)
+        super(SearchIndexTest, self).tearDown()
+
+    def test_search(self):
+        result = self.index.search("artist", "artist:(dynamo go)")
+        artists = result["artist-list"]
+        self.assertEqual("Dynamo Go", artists[0]["name"])
+        self.assertEqual("100", artists[0]["ext:score"])
+        self.assertTrue(int(artists[1]["ext:score"]) < 100)
+        self.assertEqual(len(artists), result["artist-count"])
+        self.assertTrue(all("dynamo" in a["name"].lower() or
+                            "go" in a["name"].lower() for a in artists))
+
+    def test_strict(self):
+        result = self.index.search("release",
+                                   'release:"affordable pop music"')
+        self.assertEqual(["Affordable Pop Music"],
+                         [r["title"] for r in result["release-list"]])
+        result = self.index.search(
+                "release", 'release:"pop music" AND country:"xx"')
+        self.assertEqual([], result["release-list"])
+
+    def test_resolve_ids(self):
+        ids = ["ae8106f8-6ec6-476e-a7b3-56cb1d06dd53",
+               "e94757ff-2655-4690-b369-4012beba6114"]
+        query, _ = next(musicbrainzngs.musicbrainz._id_queries(
+                "reid", ids, 8000))
+        result = self.index.search("release", query)
+        self.assertEqual(sorted(ids),
+                         sorted(r["id"] for r in result["release-list"]))
+
+        musicbrainzngs.set_search_index(self.index, prefer=True)
+        resolved = musicbrainzngs.resolve_ids("release", ids)
+        self.assertEqual(ids, [resolved[id]["id"] for id in ids])
+
+    def test_paging(self):
+        first = self.index.search("release", "release:(pop)", limit=2)
+        rest = self.index.search("release", "release:(pop)", offset=2)
+        self.assertEqual(2, len(first["release-list"]))
+        self.assertEqual(first["release-count"],
+                         2 + len(rest["release-list"]))
+
+    def test_add_dump(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, "artist"), "wb") as f:
+                f.write(b'<artist id="0e43fe9d-c472-4b62-be9e-55f971a023e1">'
+                        b'<name>Sergei Prokofiev</name><alias-list>'
+                        b'<alias>Prokofjew</alias></alias-list></artist>\n')
+            with dump.DumpStore(directory) as store:
+                self.assertEqual(1, self.index.add_dump(store))
+            result = self.index.search("artist", "prokofjew")
+            self.assertEqual("Sergei Prokofiev",
+                             result["artist-list"][0]["name"])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_unsupported(self):
+        self.assertEqual(None, self.index.search("annotation", "x"))
+
+    def test_fallback(self):
+        # Nothing listens there any more.
+        self.server.stop()
+        self.assertRaises(musicbrainzngs.NetworkError,
+                          musicbrainzngs.search_artists, "dynamo")
+        musicbrainzngs.set_search_index(self.index)
+        result = musicbrainzngs.search_artists(artist="dynamo go")
+        self.assertEqual("Dynamo Go", result["artist-list"][0]["name"])
+
+    def test_learns_responses(self):
+        index = searchindex.SearchIndex()
+        try:
+            musicbrainzngs.set_search_index(index)
+            musicbrainzngs.get_artist_by_id(
+                    "0e43fe9d-c472-4b62-be9e-55f971a023e1", ["aliases"])
+            self.assertEqual(1, len(index))
+
+            # A busy server is like one that can't be reached.
+            self.server.responses["/ws/2/artist/"] = lambda query: 503
+            result = musicbrainzngs.search_artists("prokofiev")
+            self.assertEqual("0e43fe9d-c472-4b62-be9e-55f971a023e1",
+                             result["artist-list"][0]["id"])
+            self.assertEqual(2, len(self.server.requests))
+        finally:
+            index.close()
+
+    def test_prefer(self):
+        musicbrainzngs.set_search_index(self.index, prefer=True)
+        # No server is involved at all.
+        result = musicbrainzngs.search_recordings("thief of hearts",
+                                                  strict=True)
+        self.assertEqual("Thief of Hearts",
+                         result["recording-list"][0]["title"])
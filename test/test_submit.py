@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from test import _common
+
+OK = (b'<?xml version="1.0" encoding="UTF-8"?>'
+      b'<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+      b'<message><text>OK</text></message></metadata>')
+
+
+class ChunkedSubmitTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(ChunkedSubmitTest, self).setUp()
+        self.calls = 0
+        self.fail = set()
+        self.server.responses["/ws/2/recording"] = self.respond
+        self.server.responses["/ws/2/tag"] = self.respond
+        musicbrainzngs.auth("user", "password")
+        self.isrcs = dict(("recording-%03d" % i, "GBAAA%07d" % i)
+                          for i in range(250))
+
+    def tearDown(self):
+        musicbrainzngs.auth("", "")
+        super(ChunkedSubmitTest, self).tearDown()
+
+    def respond(self, query):
+        # The n-th request fails (with a 503) if n is in self.fail.
+        self.calls += 1
+        return 503 if self.calls in self.fail else OK
+
+    def bodies(self):
+        return [body for method, path, query, body in self.server.requests]
+
+    def test_single_request(self):
+        result = musicbrainzngs.submit_isrcs(self.isrcs)
+        self.assertEqual({"message": {"text": "OK"}}, result)
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_chunks(self):
+        summary = musicbrainzngs.submit_isrcs(self.isrcs, batch_size=100)
+        self.assertEqual(sorted(self.isrcs), sorted(summary["succeeded"]))
+        self.assertEqual({}, summary["failed"])
+        self.assertEqual([100, 100, 50], [body.count(b"<ns0:recording ")
+                                          for body in self.bodies()])
+
+    def test_retry(self):
+        self.fail = set([2])
+        summary = musicbrainzngs.submit_isrcs(self.isrcs, batch_size=100)
+        self.assertEqual(250, len(summary["succeeded"]))
+        self.assertEqual(4, len(self.server.requests))
+        self.assertEqual(self.bodies()[1], self.bodies()[2])
+
+    def test_failed_chunk(self):
+        # The second chunk fails three times, as do its retries.
+        self.fail = set([2, 3, 4])
+        summary = musicbrainzngs.submit_isrcs(self.isrcs, batch_size=100)
+        failed = sorted(self.isrcs)[100:200]
+        self.assertEqual(failed, sorted(summary["failed"]))
+        self.assertTrue(isinstance(summary["failed"][failed[0]],
+                                   musicbrainzngs.ResponseError))
+        self.assertEqual(150, len(summary["succeeded"]))
+        self.assertEqual(5, len(self.server.requests))
+
+    def test_client_error_not_retried(self):
+        self.server.responses["/ws/2/recording"] = lambda query: 400
+        summary = musicbrainzngs.submit_isrcs(self.isrcs, batch_size=100)
+        self.assertEqual(250, len(summary["failed"]))
+        self.assertEqual(400, summary["failed"]["recording-000"].code)
+        # Each chunk was sent once.
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_concurrency(self):
+        summary = musicbrainzngs.submit_isrcs(self.isrcs, batch_size=10,
+                                              concurrency=4)
+        self.assertEqual(250, len(summary["succeeded"]))
+        self.assertEqual(25, len(self.server.requests))
+
+    def test_tags(self):
+        artist_tags = {"artist-1": ["rock"], "artist-2": ["jazz"]}
+        recording_tags = {"recording-1": ["live"]}
+        summary = musicbrainzngs.submit_tags(artist_tags, recording_tags,
+                                             batch_size=2)
+        self.assertEqual(["artist-1", "artist-2", "recording-1"],
+                         sorted(summary["succeeded"]))
+        first, second = self.bodies()
+        self.assertTrue(b"artist-1" in first and b"artist-2" in first)
+        self.assertTrue(b"recording-1" in second)
@@ -0,0 +1,124 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import submitqueue
+from test import _common
+
+OK = (b'<?xml version="1.0" encoding="UTF-8"?>'
+      b'<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+      b'<message><text>OK</text></message></metadata>')
+
+
+class SubmissionQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.server = _common.FakeServer().start()
+        self.fail = False
+        self.server.responses["/ws/2/tag"] = self.respond
+        self.server.responses["/ws/2/rating"] = self.respond
+        self.client = musicbrainzngs.MusicBrainzClient(self.server.hostname)
+        self.client.set_useragent("test", "1")
+        self.client.set_rate_limit(False)
+        self.client.auth("user", "password")
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "edits.sqlite")
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def respond(self, query):
+        return 503 if self.fail else OK
+
+    def open(self, **kwargs):
+        kwargs.setdefault("max_age", 3600)
+        return submitqueue.SubmissionQueue(self.path, client=self.client,
+                                           **kwargs)
+
+    def bodies(self, path):
+        return [body for method, p, query, body in self.server.requests
+                if p == path]
+
+    def wait_for_requests(self, count):
+        deadline = time.time() + 5
+        while len(self.server.requests) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_merge(self):
+        queue = self.open()
+        queue.add_tags("recording", "r1", ["rock", "pop"])
+        queue.add_tags("recording", "r1", ["pop", "jazz"])
+        queue.set_rating("artist", "a1", 20)
+        queue.set_rating("artist", "a1", 80)
+        self.assertEqual(4, len(queue))
+        self.assertEqual([], self.server.requests)
+
+        summary = queue.flush()
+        self.assertEqual(["a1", "r1"], sorted(summary["succeeded"]))
+        self.assertEqual(0, len(queue))
+        tags, = self.bodies("/ws/2/tag")
+        self.assertEqual(3, tags.count(b"<ns0:user-tag>"))
+        for tag in (b"rock", b"pop", b"jazz"):
+            self.assertTrue(b"<ns0:name>" + tag + b"</ns0:name>" in tags)
+        ratings, = self.bodies("/ws/2/rating")
+        self.assertTrue(b"<ns0:user-rating>80</ns0:user-rating>" in ratings)
+        self.assertFalse(b">20<" in ratings)
+        queue.close()
+
+    def test_size_trigger(self):
+        queue = self.open(max_edits=3)
+        queue.add_tags("artist", "a1", ["rock"])
+        queue.add_tags("artist", "a2", ["rock"])
+        time.sleep(0.1)
+        self.assertEqual([], self.server.requests)
+        queue.add_tags("artist", "a3", ["rock"])
+        self.wait_for_requests(1)
+        self.assertEqual(3, self.bodies("/ws/2/tag")[0].count(b"<ns0:artist "))
+        queue.close()
+
+    def test_time_trigger(self):
+        queue = self.open(max_age=0.2)
+        queue.set_rating("recording", "r1", 60)
+        self.wait_for_requests(1)
+        self.assertEqual(1, len(self.bodies("/ws/2/rating")))
+        queue.close()
+
+    def test_replay(self):
+        queue = self.open()
+        queue.add_tags("recording", "r1", ["rock"])
+        queue.set_rating("recording", "r1", 40)
+        # Stop without submitting, as a crash would.
+        queue.close(flush=False)
+        self.assertEqual([], self.server.requests)
+
+        queue = self.open()
+        self.wait_for_requests(2)
+        self.assertEqual(1, len(self.bodies("/ws/2/tag")))
+        self.assertEqual(1, len(self.bodies("/ws/2/rating")))
+        queue.close()
+
+    def test_failed_edits_stay(self):
+        queue = self.open(retry_delay=3600)
+        queue.add_tags("artist", "a1", ["rock"])
+        self.fail = True
+        summary = queue.flush()
+        self.assertEqual(["a1"], list(summary["failed"]))
+        self.assertEqual(1, len(queue))
+        self.fail = False
+        queue.close()
+        # Three tries of the failed request, then one that succeeded.
+        self.assertEqual(4, len(self.bodies("/ws/2/tag")))
+
+        queue = self.open()
+        self.assertEqual(0, len(queue))
+        queue.close()
+
+    def test_invalid_entity(self):
+        queue = self.open()
+        self.assertRaises(musicbrainzngs.UsageError, queue.add_tags,
+                          "release", "r1", ["rock"])
+        queue.close()
@@ -0,0 +1,92 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import musicbrainzngs
+from musicbrainzngs import musicbrainz
+from musicbrainzngs.cache import MemoryCache
+from test import _common
+
+
+class ValidationTest(unittest.TestCase):
+    def setUp(self):
+        musicbrainz._filter_params.clear()
+        musicbrainz._include_args.clear()
+
+    def test_invalid_arguments_raise_every_time(self):
+        for _ in range(2):
+            self.assertRaises(musicbrainzngs.InvalidIncludeError,
+                              musicbrainz._do_mb_query, "artist", "x",
+                              ["nonsense"])
+            self.assertRaises(musicbrainzngs.InvalidFilterError,
+                              musicbrainz._check_filter_and_make_params,
+                              "artist", ["releases"], ["nonsense"])
+            self.assertRaises(musicbrainzngs.InvalidFilterError,
+                              musicbrainz._check_filter_and_make_params,
+                              "artist", [], ["official"])
+            self.assertRaises(musicbrainzngs.InvalidFilterError,
+                              musicbrainz._check_filter_and_make_params,
+                              "artist", ["releases"], [1])
+        self.assertEqual({}, musicbrainz._filter_params)
+        self.assertEqual({}, musicbrainz._include_args)
+
+    def test_params_are_copies(self):
+        params = musicbrainz._check_filter_and_make_params(
+                "artist", ["releases"], "official", ["album", "ep"])
+        self.assertEqual({"status": "official", "type": "album|ep"}, params)
+        params["limit"] = 10
+        self.assertEqual({"status": "official", "type": "album|ep"},
+                         musicbrainz._check_filter_and_make_params(
+                             "artist", ["releases"], "official",
+                             ["album", "ep"]))
+        self.assertEqual(1, len(musicbrainz._filter_params))
+
+    def test_memo_size(self):
+        for i in range(musicbrainz._MEMO_SIZE + 10):
+            musicbrainz._remember(musicbrainz._include_args, i, None)
+        self.assertTrue(len(musicbrainz._include_args)
+                        <= musicbrainz._MEMO_SIZE)
+
+    def test_escaping(self):
+        self.assertEqual(r'AC\/DC \(live\)',
+                         musicbrainz._escape_lucene("AC/DC (live)"))
+
+
+class CanonicalRequestTest(_common.FakeServerTestCase):
+    def setUp(self):
+        super(CanonicalRequestTest, self).setUp()
+        self.server.lookup = lambda method, path, query: b"<metadata/>"
+
+    def tearDown(self):
+        musicbrainzngs.set_cache(None)
+        super(CanonicalRequestTest, self).tearDown()
+
+    def queries(self):
+        return [query for _, _, query, _ in self.server.requests]
+
+    def test_includes_and_filters(self):
+        musicbrainzngs.get_artist_by_id("a", ["releases", "aliases"],
+                                        release_status="Official",
+                                        release_type=["ep", "album"])
+        musicbrainzngs.get_artist_by_id("a", ["aliases", "releases"],
+                                        release_status=["official"],
+                                        release_type=["album", "EP", "ep"])
+        first, second = self.queries()
+        self.assertEqual(first, second)
+        self.assertEqual({"inc": ["aliases releases"],
+                          "status": ["official"], "type": ["album|ep"]},
+                         first)
+
+    def test_search_fields(self):
+        musicbrainzngs.search_releases(artist="Led  Zeppelin", release="IV")
+        musicbrainzngs.search_releases(release=" IV", artist="led zeppelin")
+        first, second = self.queries()
+        self.assertEqual(first, second)
+        self.assertEqual(["artist:(led zeppelin) release:(iv)"],
+                         first["query"])
+
+    def test_cache_hit(self):
+        musicbrainzngs.set_cache(MemoryCache())
+        musicbrainzngs.search_recordings(recording="x", artist="y", limit=5)
+        musicbrainzngs.search_recordings(artist="y", recording="x", limit=5)
+        self.assertEqual(1, len(self.server.requests))